@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: Contributors to the Ansible project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from ansible.errors import AnsibleActionFail
+from ansible.module_utils._text import to_bytes, to_native
+from ansible.module_utils.common.validation import check_type_int, check_type_path
+from ansible.plugins.action import ActionBase
+from ansible.utils.display import Display
+
+display = Display()
+
+# Module options identifying the cluster and the requested information.
+# The cluster itself is not identified, as that requires connecting to it,
+# so results are cached per inventory host and these options
+CACHE_KEY_OPTIONS = (
+    'login_host',
+    'login_port',
+    'login_user',
+    'login_db',
+    'login_unix_socket',
+    'login_region',
+    'gather_subset',
+    'statements_limit',
+    'statements_order_by',
+    'hot_ranges_limit',
+    'hot_ranges_min_qps',
+    'sizes_databases',
+    'as_of_system_time',
+    'timings',
+)
+
+DEFAULT_CACHE_DIR = '~/.ansible/cache/cockroachdb_info'
+DEFAULT_CACHE_MAX_ENTRIES = 100
+
+
+def get_cache_key(host, args):
+    """Get a cache key for the result of the module.
+
+    Args:
+        host (str) -- inventory host the module runs on,
+            as login_host can be relative to it, e.g. localhost
+        args (dict) -- module arguments
+
+    Return a hex digest identifying the cluster and the requested information.
+    """
+    identity = [host]
+    for option in CACHE_KEY_OPTIONS:
+        val = args.get(option)
+        if option in ('login_host', 'gather_subset') and isinstance(val, list):
+            # The order of hosts and subsets does not change the result
+            val = sorted(val)
+
+        identity.append(val)
+
+    return hashlib.sha256(to_bytes(json.dumps(identity, sort_keys=True))).hexdigest()
+
+
+def read_cache(cache_dir, key, ttl):
+    """Read a cached result.
+
+    Args:
+        cache_dir (str) -- cache directory
+        key (str) -- key returned by get_cache_key
+        ttl (int) -- number of seconds a cached result is valid
+
+    Return the cached result or None if it is missing or expired.
+    """
+    path = os.path.join(cache_dir, key)
+    try:
+        with open(path, 'rb') as f:
+            entry = json.loads(f.read())
+    except (IOError, OSError, ValueError):
+        return None
+
+    if time.time() - entry.get('timestamp', 0) > ttl:
+        return None
+
+    return entry.get('result')
+
+
+def write_cache(cache_dir, key, result, max_entries):
+    """Write a result to the cache evicting the oldest entries
+    if the number of entries exceeds max_entries.
+
+    Args:
+        cache_dir (str) -- cache directory
+        key (str) -- key returned by get_cache_key
+        result (dict) -- result of the module
+        max_entries (int) -- maximum number of entries in the cache
+    """
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir, 0o700)
+
+    # Write to a temporary file first, so that concurrent
+    # readers never see a partially written entry
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp', dir=cache_dir)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(to_bytes(json.dumps(dict(timestamp=time.time(), result=result))))
+
+    os.rename(tmp_path, os.path.join(cache_dir, key))
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.startswith('.'):
+            continue
+
+        try:
+            entries.append((os.path.getmtime(os.path.join(cache_dir, name)), name))
+        except OSError:
+            # Removed by a concurrent writer
+            continue
+
+    entries.sort()
+    for dummy, name in entries[:max(len(entries) - max_entries, 0)]:
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except OSError:
+            pass
+
+
+class ActionModule(ActionBase):
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp
+
+        args = self._task.args
+
+        try:
+            ttl = check_type_int(args.get('cache_ttl') or 0)
+            max_entries = check_type_int(args.get('cache_max_entries') or DEFAULT_CACHE_MAX_ENTRIES)
+            cache_dir = check_type_path(args.get('cache_dir') or DEFAULT_CACHE_DIR)
+        except TypeError as e:
+            raise AnsibleActionFail(to_native(e))
+
+        if ttl <= 0:
+            result.update(self._execute_module(task_vars=task_vars))
+            result['cache_hit'] = False
+            return result
+
+        host = self._task.delegate_to or task_vars.get('inventory_hostname')
+        key = get_cache_key(host, args)
+
+        cached = read_cache(cache_dir, key, ttl)
+        if cached is not None:
+            result.update(cached)
+            result['cache_hit'] = True
+            return result
+
+        result.update(self._execute_module(task_vars=task_vars))
+        result['cache_hit'] = False
+
+        if not result.get('failed'):
+            try:
+                write_cache(cache_dir, key, result, max_entries)
+            except (IOError, OSError) as e:
+                display.warning('Cannot write the result to the cache '
+                                'in %s: %s' % (cache_dir, to_native(e)))
+
+        return result
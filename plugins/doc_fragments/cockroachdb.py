@@ -28,8 +28,39 @@ options:
   login_host:
     description:
       - Host running the database.
+      - Can be a list of hosts of the cluster, each of them
+        optionally followed by a port, for example, C(node1:26258).
+        The port of hosts without it is taken from I(login_port).
+      - If the list contains several hosts, the module connects
+        to one of them according to I(login_host_selection) and
+        falls back to the next host if the connection fails.
+        The host the module connected to is returned in C(connected_host).
+    type: list
+    elements: str
+    default: [localhost]
+
+  login_host_selection:
+    description:
+      - Determines the order in which hosts from I(login_host) are tried.
+      - If C(latency), the hosts are probed in parallel by opening
+        a TCP connection to them and the host with the lowest latency
+        is tried first. Unreachable hosts are tried last.
+      - If C(order), the hosts are tried in the order they are listed.
+      - Has no effect when I(login_host) contains a single host.
+    type: str
+    choices: [latency, order]
+    default: latency
+    version_added: '0.4.0'
+
+  login_region:
+    description:
+      - Preferred cluster region of the host to connect to when
+        I(login_host) contains several hosts.
+      - The first host located in the region is used.
+        If none of the available hosts is located in the region,
+        the first available host is used and a warning is shown.
     type: str
-    default: localhost
+    version_added: '0.4.0'
 
   login_unix_socket:
     description:
@@ -42,6 +73,29 @@ options:
     type: int
     default: 26257
 
+  connect_timeout:
+    description:
+      - Maximum number of seconds to wait for a connection.
+      - Also used as the timeout of probing hosts when I(login_host)
+        contains several hosts. In this case, it defaults to C(2).
+    type: int
+    version_added: '0.4.0'
+
+  timings:
+    description:
+      - If C(true), the time the module spent connecting to the database,
+        executing queries, fetching rows and converting them
+        is returned in C(timings) in milliseconds together with
+        the numbers of fetched rows and transferred bytes.
+      - The connection time includes the TLS handshake.
+      - Client-side cursors receive all the rows of a query when it is executed,
+        so the fetch time is mostly spent on the network only with server-side cursors.
+      - The numbers of bytes are measured on Linux only and include the TLS overhead.
+        On other systems and for Unix domain sockets they are C(null).
+    type: bool
+    default: false
+    version_added: '0.4.0'
+
   ssl_mode:
     description:
       - Determines whether or with what priority a secure SSL TCP/IP
@@ -10,6 +10,16 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
+import random
+import re
+import socket
+import struct
+import threading
+import time
+
+from contextlib import contextmanager
+from timeit import default_timer
+
 psycopg2 = None
 try:
     import psycopg2
@@ -24,6 +34,30 @@ from ansible.module_utils._text import to_native
 from ansible.module_utils.six import iteritems
 from ansible.module_utils.compat.version import LooseVersion
 
+# SQLSTATE of errors returned by CockroachDB
+# when a transaction must be retried by the client
+RETRY_ERROR_CODE = '40001'
+
+# Seconds to wait for a TCP connection when probing hosts
+# if the connect_timeout option is not set
+DEFAULT_PROBE_TIMEOUT = 2
+
+# Size of struct tcp_info on Linux 4.1 and later, and the offset
+# of its tcpi_bytes_acked and tcpi_bytes_received fields
+TCP_INFO_SIZE = 136
+TCP_INFO_BYTES_OFFSET = 120
+
+# Values of the as_of_system_time option passed to CockroachDB as is,
+# other values are passed as string literals
+AS_OF_SYSTEM_TIME_FUNCTIONS = ('follower_read_timestamp()', 'experimental_follower_read_timestamp()')
+
+# First keywords of statements that do not write and
+# can be run in transactions reading as of a system time
+READ_ONLY_STATEMENTS = ('SELECT', 'SHOW', 'WITH', 'VALUES', 'TABLE', 'EXPLAIN')
+
+# First keyword of a statement preceded by comments and parentheses
+STATEMENT_KEYWORD_RE = re.compile(r'^(?:\s+|--[^\n]*|/\*.*?\*/|\()*(\w+)', re.DOTALL)
+
 
 def common_argument_spec():
     """
@@ -35,9 +69,13 @@ def common_argument_spec():
         login_db=dict(type='str'),
         login_user=dict(type='str', default='root'),
         login_password=dict(type='str', no_log=True),
-        login_host=dict(type='str', default='localhost'),
+        login_host=dict(type='list', elements='str', default=['localhost']),
+        login_host_selection=dict(type='str', choices=['latency', 'order'], default='latency'),
+        login_region=dict(type='str'),
         login_unix_socket=dict(type='path'),
         login_port=dict(type='int', default=26257),
+        connect_timeout=dict(type='int'),
+        timings=dict(type='bool', default=False),
         ssl_mode=dict(
             type='str',
             default='prefer',
@@ -66,15 +104,434 @@ def ensure_required_libs(module):
         module.fail_json(msg=missing_required_lib('psycopg2'))
 
 
+def parse_host(host, default_port):
+    """Split a host string into a host name and a port.
+
+    Args:
+        host (str) -- host in the "host", "host:port", "[ipv6]"
+            or "[ipv6]:port" format
+        default_port (int) -- port to use if the host string does not contain it
+
+    Return a (host, port) tuple.
+    """
+    if host.startswith('['):
+        end = host.find(']')
+        name, rest = host[1:end], host[end + 1:]
+        port = int(rest[1:]) if rest.startswith(':') else default_port
+        return name, port
+
+    if host.count(':') == 1:
+        name, port = host.split(':')
+        return name, int(port)
+
+    return host, default_port
+
+
+def probe_host(host, port, timeout):
+    """Measure the time it takes to open a TCP connection to a host.
+
+    Args:
+        host (str) -- host name or address
+        port (int) -- port
+        timeout (float) -- connection timeout in seconds
+
+    Return the time in seconds or None if the host is unreachable.
+    """
+    start = default_timer()
+    try:
+        sock = socket.create_connection((host, port), timeout)
+    except (socket.error, socket.timeout):
+        return None
+
+    latency = default_timer() - start
+    sock.close()
+    return latency
+
+
+def probe_hosts(hosts, timeout):
+    """Probe hosts in parallel.
+
+    Args:
+        hosts (list) -- list of (host, port) tuples
+        timeout (float) -- connection timeout in seconds
+
+    Return a list of latencies returned by probe_host in the same order as hosts.
+    """
+    latencies = [None] * len(hosts)
+
+    def probe(i, host, port):
+        latencies[i] = probe_host(host, port, timeout)
+
+    threads = [threading.Thread(target=probe, args=(i, host, port))
+               for i, (host, port) in enumerate(hosts)]
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    return latencies
+
+
+def order_hosts_by_latency(hosts, latencies):
+    """Order hosts by latency.
+
+    Unreachable hosts are put at the end of the list in their original order,
+    so that they can still be tried if all the other hosts fail.
+
+    Args:
+        hosts (list) -- list of (host, port) tuples
+        latencies (list) -- list of latencies returned by probe_hosts
+
+    Return the ordered list of hosts.
+    """
+    reachable = sorted((latency, i) for i, latency in enumerate(latencies) if latency is not None)
+    unreachable = [i for i, latency in enumerate(latencies) if latency is None]
+
+    return [hosts[i] for dummy, i in reachable] + [hosts[i] for i in unreachable]
+
+
+def is_retry_error(e):
+    """Check if an exception is a transaction retry error.
+
+    Args:
+        e (Exception) -- exception to check
+
+    Return True if the transaction must be retried, False otherwise.
+    """
+    return getattr(e, 'pgcode', None) == RETRY_ERROR_CODE
+
+
+def get_as_of_system_time(cursor, value):
+    """Get an AS OF SYSTEM TIME clause for a value of the as_of_system_time option.
+
+    Args:
+        cursor (cursor) -- cursor used to quote the value
+        value (str) -- follower_read_timestamp(), an interval, for example, -10s,
+            or a timestamp
+
+    Return the clause to append to BEGIN or SET TRANSACTION.
+    """
+    if value.strip().lower() in AS_OF_SYSTEM_TIME_FUNCTIONS:
+        return 'AS OF SYSTEM TIME %s' % value.strip().lower()
+
+    return to_native(cursor.mogrify('AS OF SYSTEM TIME %s', (value,)))
+
+
+def is_read_only_statement(query):
+    """Check if a statement only reads data judging by its first keyword.
+
+    Writes hidden in statements starting with the keywords,
+    for example, in WITH clauses, are rejected by CockroachDB
+    in transactions reading as of a system time.
+
+    Args:
+        query (str) -- statement to check
+
+    Return True if the statement is read-only, False otherwise.
+    """
+    match = STATEMENT_KEYWORD_RE.match(query)
+    return match is not None and match.group(1).upper() in READ_ONLY_STATEMENTS
+
+
+def get_retry_delay(attempt, base_delay=0.1, max_delay=5.0):
+    """Get a delay in seconds before the next attempt to run a transaction.
+
+    Uses exponential backoff with full jitter, so that transactions
+    contending with each other do not retry at the same time.
+
+    Args:
+        attempt (int) -- number of the retry, starting from 1
+
+    Kwargs:
+        base_delay (float) -- maximum delay before the first retry (default 0.1)
+        max_delay (float) -- upper bound of the delay (default 5.0)
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+def get_socket_bytes(fd):
+    """Get the numbers of bytes sent and received through a TCP socket.
+
+    Uses the TCP_INFO socket option, so it is supported only on Linux 4.1
+    and later. The numbers include the overhead of TLS if it is used.
+
+    Args:
+        fd (int) -- file descriptor of the socket
+
+    Return a tuple (sent, received) or None if the numbers cannot be determined,
+    for example, for Unix domain sockets.
+    """
+    tcp_info = getattr(socket, 'TCP_INFO', None)
+    if tcp_info is None:
+        return None
+
+    try:
+        sock = socket.fromfd(fd, socket.AF_INET, socket.SOCK_STREAM)
+    except (socket.error, ValueError):
+        return None
+
+    try:
+        info = sock.getsockopt(socket.IPPROTO_TCP, tcp_info, TCP_INFO_SIZE)
+    except socket.error:
+        return None
+    finally:
+        sock.close()
+
+    if len(info) < TCP_INFO_SIZE:
+        return None
+
+    acked, received = struct.unpack_from('=QQ', info, TCP_INFO_BYTES_OFFSET)
+    # The acknowledged SYN is counted as a byte
+    return max(acked - 1, 0), received
+
+
+class Timings():
+    """Time spent by a module in the phases of its work,
+    together with the numbers of fetched rows and transferred bytes.
+
+    Times are exclusive: when a phase is measured within another one,
+    for example, rows are fetched while they are converted,
+    its time is not counted in the outer phase.
+    Phases measured by several threads at once are summed up.
+
+    Kwargs:
+        enabled (bool) -- if False, nothing is measured,
+            so there is no overhead (default True)
+    """
+    PHASES = ('connect', 'execute', 'fetch', 'convert')
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.start = default_timer()
+        self.phases = dict((phase, 0.0) for phase in self.PHASES)
+        self.rows = 0
+        self.connections = 0
+        # Numbers of bytes (sent, received) by connection ids
+        self.socket_bytes = {}
+        self.lock = threading.Lock()
+        # Stacks of the phases measured by every thread
+        self.local = threading.local()
+
+    @contextmanager
+    def measure(self, phase):
+        """Measure the time of a phase executing the with statement body."""
+        if not self.enabled:
+            yield
+            return
+
+        stack = self.__get_stack()
+
+        # Start time and time of nested phases
+        frame = [default_timer(), 0.0]
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            stack.pop()
+            elapsed = default_timer() - frame[0]
+            if stack:
+                stack[-1][1] += elapsed
+
+            with self.lock:
+                self.phases[phase] = self.phases.get(phase, 0.0) + elapsed - frame[1]
+
+    def __get_stack(self):
+        """Get the stack of the phases measured by the current thread."""
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+
+        return stack
+
+    def timed(self, func, phase):
+        """Wrap a function to measure its calls as a phase."""
+        if not self.enabled:
+            return func
+
+        def wrapper(*args, **kwargs):
+            with self.measure(phase):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    def iterate(self, iterable, phase):
+        """Wrap an iterable to measure getting every item as a phase."""
+        if not self.enabled:
+            return iterable
+
+        def generate():
+            # It's called for every row, so measure's logic is inlined
+            # and the time is added once at the end to keep the overhead low
+            stack = self.__get_stack()
+            items = iter(iterable)
+            total = 0.0
+            try:
+                while True:
+                    frame = [default_timer(), 0.0]
+                    stack.append(frame)
+                    try:
+                        item = next(items, self)
+                    finally:
+                        stack.pop()
+                        elapsed = default_timer() - frame[0]
+                        if stack:
+                            stack[-1][1] += elapsed
+
+                        total += elapsed - frame[1]
+
+                    if item is self:
+                        return
+
+                    yield item
+
+            finally:
+                with self.lock:
+                    self.phases[phase] = self.phases.get(phase, 0.0) + total
+
+        return generate()
+
+    def add_rows(self, count):
+        with self.lock:
+            self.rows += count
+
+    def add_connection(self, connection):
+        with self.lock:
+            self.connections += 1
+
+        self.sample(connection)
+
+    def sample(self, connection):
+        """Update the numbers of bytes transferred through a connection."""
+        try:
+            socket_bytes = get_socket_bytes(connection.fileno())
+        except Exception:
+            return
+
+        if socket_bytes is not None:
+            with self.lock:
+                self.socket_bytes[id(connection)] = socket_bytes
+
+    def cursor_factory(self, base):
+        """Get a subclass of a psycopg2 cursor class measuring execution and fetching."""
+        return type('Timed%s' % base.__name__, (TimedCursorMixin, base), dict(timings=self))
+
+    def as_dict(self):
+        """Return a dictionary of the times in milliseconds and the counters."""
+        with self.lock:
+            result = dict(('%s_ms' % phase, round(seconds * 1000, 3))
+                          for phase, seconds in iteritems(self.phases))
+            result.update(
+                total_ms=round((default_timer() - self.start) * 1000, 3),
+                rows=self.rows,
+                connections=self.connections,
+                bytes_sent=None,
+                bytes_received=None,
+            )
+
+            if self.socket_bytes:
+                result['bytes_sent'] = sum(sent for sent, received in self.socket_bytes.values())
+                result['bytes_received'] = sum(received for sent, received in self.socket_bytes.values())
+
+        return result
+
+
+class TimedCursorMixin():
+    """Mixin of psycopg2 cursor classes measuring execution and fetching
+    of rows in the Timings object set as the timings attribute.
+    """
+    timings = None
+
+    def execute(self, query, vars=None):
+        try:
+            with self.timings.measure('execute'):
+                return super(TimedCursorMixin, self).execute(query, vars)
+        finally:
+            self.timings.sample(self.connection)
+
+    def executemany(self, query, vars_list):
+        try:
+            with self.timings.measure('execute'):
+                return super(TimedCursorMixin, self).executemany(query, vars_list)
+        finally:
+            self.timings.sample(self.connection)
+
+    def fetchone(self):
+        with self.timings.measure('fetch'):
+            row = super(TimedCursorMixin, self).fetchone()
+
+        if row is not None:
+            self.timings.add_rows(1)
+
+        return row
+
+    def fetchmany(self, size=None):
+        with self.timings.measure('fetch'):
+            rows = super(TimedCursorMixin, self).fetchmany(size)
+
+        self.timings.add_rows(len(rows))
+        self.timings.sample(self.connection)
+        return rows
+
+    def fetchall(self):
+        with self.timings.measure('fetch'):
+            rows = super(TimedCursorMixin, self).fetchall()
+
+        self.timings.add_rows(len(rows))
+        self.timings.sample(self.connection)
+        return rows
+
+    def __iter__(self):
+        count = 0
+        try:
+            for row in self.timings.iterate(self.__iter_rows(), 'fetch'):
+                count += 1
+                yield row
+
+        finally:
+            # Also runs when the iteration is stopped early
+            self.timings.add_rows(count)
+            self.timings.sample(self.connection)
+
+    def __iter_rows(self):
+        """Iterate over rows calling the next method of the base class.
+
+        The __iter__ method of psycopg2 cursors returns the cursor itself,
+        so iterating over it would call the __iter__ method of the mixin again.
+        """
+        base = super(TimedCursorMixin, self)
+        next_row = getattr(base, '__next__', None) or base.next
+        while True:
+            try:
+                row = next_row()
+            except StopIteration:
+                return
+
+            yield row
+
+
 class CockroachDBServer():
     """Class for working with CockroachDB.
 
     Args:
         module (AnsibleModule) -- object of ansible.module_utils.basic.AnsibleModule class
+
+    Kwargs:
+        timings (Timings) -- object to measure the work in, shared by objects
+            connecting to the server in several threads. If not passed,
+            a new one is created, enabled by the timings module option (default None)
     """
-    def __init__(self, module):
+    def __init__(self, module, timings=None):
         self.module = module
         self.connection = None
+        # Host the connection was established to in the "host:port" format
+        self.host = None
+        # Parameters the connection was established with
+        self.conn_params = None
+        if timings is None:
+            timings = Timings(enabled=module.params.get('timings', False))
+
+        self.timings = timings
         ensure_required_libs(self.module)
 
     def connect(self, conn_params, autocommit=False, fail_on_conn=True, rows_type='dict'):
@@ -82,6 +539,10 @@ class CockroachDBServer():
 
         Return psycopg2 connection object.
 
+        If the host connection parameter is a list, connects
+        to the first available host of the list ordered according
+        to the login_host_selection module option.
+
         Args:
             conn_params (dict) -- dictionary with connection parameters
 
@@ -96,13 +557,27 @@ class CockroachDBServer():
         else:
             cursor_factory = None
 
+        if self.timings.enabled:
+            cursor_factory = self.timings.cursor_factory(cursor_factory or psycopg2.extensions.cursor)
+
         try:
-            self.connection = psycopg2.connect(cursor_factory=cursor_factory, **conn_params)
-            if autocommit:
-                if LooseVersion(psycopg2.__version__) >= LooseVersion('2.4.2'):
-                    self.connection.set_session(autocommit=True)
+            with self.timings.measure('connect'):
+                if isinstance(conn_params.get('host'), list):
+                    self.connection = self.__connect_to_any(conn_params, cursor_factory)
                 else:
-                    self.connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                    self.connection = psycopg2.connect(cursor_factory=cursor_factory, **conn_params)
+                    self.host = '%s:%s' % (conn_params.get('host', 'localhost'),
+                                           conn_params.get('port', 26257))
+                    self.conn_params = conn_params
+
+                if autocommit:
+                    if LooseVersion(psycopg2.__version__) >= LooseVersion('2.4.2'):
+                        self.connection.set_session(autocommit=True)
+                    else:
+                        self.connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+
+            if self.timings.enabled:
+                self.timings.add_connection(self.connection)
 
         except Exception as e:
             if fail_on_conn:
@@ -113,6 +588,135 @@ class CockroachDBServer():
 
         return self.connection
 
+    def __connect_to_any(self, conn_params, cursor_factory):
+        """Connect to one of several hosts.
+
+        With the latency selection, the hosts are probed in parallel
+        and tried starting from the one with the lowest latency,
+        otherwise they are tried in the passed order.
+        If the login_region module option is set, the first host
+        located in that region is preferred.
+
+        Return psycopg2 connection object.
+
+        Args:
+            conn_params (dict) -- dictionary with connection parameters,
+                the host parameter is a list of hosts
+            cursor_factory (class) -- cursor class to pass to psycopg2.connect
+        """
+        params = self.module.params
+        default_port = conn_params.get('port', 26257)
+        hosts = [parse_host(host, default_port) for host in conn_params['host']]
+
+        if params.get('login_host_selection', 'latency') == 'latency':
+            timeout = params.get('connect_timeout') or DEFAULT_PROBE_TIMEOUT
+            hosts = order_hosts_by_latency(hosts, probe_hosts(hosts, timeout))
+
+        region = params.get('login_region')
+        fallback = None
+        errors = []
+
+        for host, port in hosts:
+            try:
+                connection = psycopg2.connect(cursor_factory=cursor_factory,
+                                              **dict(conn_params, host=host, port=port))
+            except Exception as e:
+                errors.append('%s:%s: %s' % (host, port, to_native(e).strip()))
+                continue
+
+            if not region or self.__get_region(connection) == region:
+                if fallback is not None:
+                    fallback[0].close()
+
+                self.host = '%s:%s' % (host, port)
+                self.conn_params = dict(conn_params, host=host, port=port)
+                return connection
+
+            if fallback is None:
+                fallback = (connection, host, port)
+            else:
+                connection.close()
+
+        if fallback is not None:
+            connection, host, port = fallback
+            self.host = '%s:%s' % (host, port)
+            self.conn_params = dict(conn_params, host=host, port=port)
+            self.module.warn('No available host in the %s region, '
+                             'connected to %s' % (region, self.host))
+            return connection
+
+        raise Exception('all the hosts are unavailable: %s' % '; '.join(errors))
+
+    def __get_region(self, connection):
+        """Get the region of the node a connection is established to.
+
+        Return the region name or None if it cannot be determined.
+        """
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT crdb_internal.locality_value('region')")
+            region = cursor.fetchone()[0]
+            cursor.close()
+        except Exception:
+            return None
+        finally:
+            # The query opens a transaction, so end it to let callers
+            # enable autocommit or start their own transaction
+            try:
+                connection.rollback()
+            except Exception:
+                pass
+
+        return region
+
+    def run_transaction(self, func, max_retries=0, max_time=None):
+        """Run a function retrying it on transaction retry errors (SQLSTATE 40001).
+
+        Before every retry, the connection is rolled back and the function
+        is called again after a delay, so the function must do the whole
+        work of the transaction including its commit.
+
+        Return a tuple (
+            result -- value returned by func
+            retries (int) -- number of retries made
+        )
+
+        Args:
+            func (function) -- function to run, it's called without arguments
+
+        Kwargs:
+            max_retries (int) -- maximum number of retries (default 0)
+            max_time (float) -- maximum number of seconds all the attempts
+                can take, unlimited if None (default None)
+        """
+        start = default_timer()
+        retries = 0
+
+        while True:
+            try:
+                return func(), retries
+
+            except Exception as e:
+                if not is_retry_error(e):
+                    raise
+
+                error = to_native(e)
+
+            try:
+                self.connection.rollback()
+            except Exception as e:
+                self.module.fail_json(msg="unable to roll back transaction: %s" % to_native(e),
+                                      retries=retries)
+
+            delay = get_retry_delay(retries + 1)
+            if retries >= max_retries or (max_time is not None and
+                                          default_timer() - start + delay > max_time):
+                self.module.fail_json(msg="transaction failed after %s attempt(s): %s" % (retries + 1, error),
+                                      retries=retries)
+
+            time.sleep(delay)
+            retries += 1
+
 
 def get_params_map():
     """Get params map for mapping collection-related module options
@@ -130,6 +734,7 @@ def get_params_map():
         'ssl_root_cert': 'sslrootcert',
         'ssl_cert': 'sslcert',
         'ssl_key': 'sslkey',
+        'connect_timeout': 'connect_timeout',
     }
 
 
@@ -148,6 +753,20 @@ def get_conn_params(params_dict):
     kw = dict((params_map[k], v) for (k, v) in iteritems(params_dict)
               if k in params_map and v != '' and v is not None)
 
+    # The host can be a list of hosts. A single host is passed
+    # to psycopg2 as is, several hosts are handled by CockroachDBServer.connect
+    if isinstance(kw.get('host'), list):
+        if len(kw['host']) > 1:
+            return kw
+
+        if kw['host']:
+            host, port = parse_host(kw['host'][0], None)
+            kw['host'] = host
+            if port is not None:
+                kw['port'] = port
+        else:
+            del kw['host']
+
     # If a login_unix_socket is specified, incorporate it here.
     is_localhost = False
     if 'host' not in kw or kw['host'] in (None, 'localhost', '127.0.0.1'):
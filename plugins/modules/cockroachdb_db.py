@@ -20,22 +20,127 @@ author:
 extends_documentation_fragment:
   - community.cockroachdb.cockroachdb
 notes:
-  - Supports C(check_mode).
+  - Supports C(check_mode). In check mode, the statements that would
+    be executed are returned in I(planned_statements).
+  - On CockroachDB 22.1, I(placement=restricted) requires the
+    C(sql.defaults.multiregion_placement_policy.enabled) cluster setting
+    to be enabled.
 options:
   name:
-    description: Database name to create, modify or delete.
+    description:
+    - Database name to create, modify or delete.
+    - Mutually exclusive with I(databases).
+    - Either I(name) or I(databases) is required.
     type: str
-    required: yes
   state:
     description:
     - If C(present), creates if it does not exist or modifies it.
     - If C(absent), deletes the database.
+    - Used for the items of I(databases) that have no I(state).
     type: str
     choices: [absent, present]
     default: present
   owner:
-    description: Database owner.
+    description:
+    - Database owner.
+    - Mutually exclusive with I(databases).
+    type: str
+  primary_region:
+    description:
+    - Primary region of the database.
+    - Setting it makes the database multi-region.
+    - Mutually exclusive with I(databases).
+    type: str
+    version_added: '0.4.0'
+  regions:
+    description:
+    - All the regions of the database. The regions not in the list
+      are dropped from the database.
+    - I(primary_region) is added to the list if it is missing.
+    - If an empty list is passed and I(primary_region) is not,
+      all the regions are dropped and the database stops being multi-region.
+    - If not passed, the regions are not changed except for adding I(primary_region).
+    - Mutually exclusive with I(databases).
+    type: list
+    elements: str
+    version_added: '0.4.0'
+  survival_goal:
+    description:
+    - Failures the database must survive.
+    - C(region) requires at least three regions.
+    - Mutually exclusive with I(databases).
+    type: str
+    choices: [zone, region]
+    version_added: '0.4.0'
+  placement:
+    description:
+    - Replica placement policy of the database.
+    - C(restricted) keeps the replicas of global and regional tables in their home regions
+      and is incompatible with I(survival_goal=region).
+    - Requires CockroachDB 22.1 or later.
+    - Mutually exclusive with I(databases).
     type: str
+    choices: [default, restricted]
+    version_added: '0.4.0'
+  wait:
+    description:
+    - Wait for the jobs started by the executed statements,
+      such as schema changes, to finish.
+    - The jobs are found in C(SHOW JOBS) by the time they are created,
+      the user, and the database name in their description.
+    - Garbage collection jobs of dropped data are not waited for,
+      as they wait for the C(gc.ttlseconds) zone setting to expire.
+    - The module fails if any of the jobs fails or is canceled.
+    type: bool
+    default: false
+    version_added: '0.4.0'
+  wait_timeout:
+    description:
+    - Maximum number of seconds to wait for the jobs when I(wait=true).
+    - The jobs are polled with an exponential backoff
+      from half a second up to 10 seconds between the polls.
+    type: int
+    default: 300
+    version_added: '0.4.0'
+  databases:
+    description:
+    - List of databases to create, modify or delete.
+    - The list of existing databases is fetched once, and all the changes
+      are made over the same connection in the order of the list.
+    - Mutually exclusive with I(name) and I(owner).
+    type: list
+    elements: dict
+    version_added: '0.4.0'
+    suboptions:
+      name:
+        description: Database name to create, modify or delete.
+        type: str
+        required: yes
+      state:
+        description:
+        - If C(present), creates if it does not exist or modifies it.
+        - If C(absent), deletes the database.
+        - If not passed, the value of the I(state) option is used.
+        type: str
+        choices: [absent, present]
+      owner:
+        description: Database owner.
+        type: str
+      primary_region:
+        description: Primary region of the database, see the I(primary_region) option.
+        type: str
+      regions:
+        description: All the regions of the database, see the I(regions) option.
+        type: list
+        elements: str
+      survival_goal:
+        description: Failures the database must survive, see the I(survival_goal) option.
+        type: str
+        choices: [zone, region]
+      placement:
+        description: Replica placement policy of the database, see the I(placement) option.
+        type: str
+        choices: [default, restricted]
 '''
 
 EXAMPLES = r'''
@@ -64,9 +169,114 @@ EXAMPLES = r'''
     login_db: acme
     name: test_db
     owner: test_user
+
+- name: Make test_db survive region failures in three regions
+  community.cockroachdb.cockroachdb_db:
+    login_host: 192.168.0.10
+    login_db: acme
+    name: test_db
+    primary_region: us-east1
+    regions:
+    - us-east1
+    - us-west1
+    - europe-west1
+    survival_goal: region
+
+- name: Show the statements needed to move test_db to us-west1
+  community.cockroachdb.cockroachdb_db:
+    login_host: 192.168.0.10
+    login_db: acme
+    name: test_db
+    primary_region: us-west1
+  check_mode: true
+  register: result
+
+- name: Drop a large database and wait for the schema change jobs up to 10 minutes
+  community.cockroachdb.cockroachdb_db:
+    login_host: 192.168.0.10
+    login_db: acme
+    name: test_db
+    state: absent
+    wait: true
+    wait_timeout: 600
+
+- name: Create tenant databases and drop an obsolete one in one run
+  community.cockroachdb.cockroachdb_db:
+    login_host: 192.168.0.10
+    login_db: acme
+    databases:
+    - name: tenant_1
+      owner: tenant_1_user
+    - name: tenant_2
+      owner: tenant_2_user
+    - name: tenant_old
+      state: absent
 '''
 
-RETURN = r'''#'''
+RETURN = r'''
+connected_host:
+  description:
+    - Host the module connected to in the C(host:port) format.
+  returned: always
+  type: str
+  sample: 'node1:26257'
+  version_added: '0.4.0'
+executed_statements:
+  description:
+    - List of statements executed by the module.
+  returned: always
+  type: list
+  sample: ['CREATE DATABASE "test_db"']
+planned_statements:
+  description:
+    - List of statements executed by the module or, in check mode,
+      the statements that would be executed in the order of execution.
+  returned: always
+  type: list
+  sample: ['ALTER DATABASE "test_db" ADD REGION "us-west1"',
+           'ALTER DATABASE "test_db" SET PRIMARY REGION "us-west1"']
+  version_added: '0.4.0'
+jobs:
+  description:
+    - Jobs waited for when I(wait=true).
+    - I(elapsed) is the number of seconds from the creation of a job
+      till it finished.
+  returned: if I(wait=true) and not in check mode
+  type: list
+  elements: dict
+  sample: [{"job_id": 784221069514326017, "job_type": "SCHEMA CHANGE",
+            "status": "succeeded", "fraction_completed": 1.0,
+            "error": "", "elapsed": 12.304}]
+  version_added: '0.4.0'
+databases:
+  description:
+    - Whether each database was changed and the statements executed
+      and planned for it, by database names.
+    - With I(wait=true), also the jobs waited for, in I(jobs).
+  returned: always
+  type: dict
+  sample: {
+    "tenant_1": {"changed": true, "executed_statements": ['CREATE DATABASE "tenant_1"'],
+                 "planned_statements": ['CREATE DATABASE "tenant_1"']},
+    "tenant_2": {"changed": false, "executed_statements": [], "planned_statements": []}
+  }
+  version_added: '0.4.0'
+timings:
+  description:
+    - Time in milliseconds the module spent in the phases of its work
+      and the numbers of fetched rows and transferred bytes.
+    - Waiting for jobs is included only in C(total_ms).
+  returned: if I(timings=true)
+  type: dict
+  sample: {"connect_ms": 8.412, "execute_ms": 35.18, "fetch_ms": 0.094, "convert_ms": 0.0,
+           "total_ms": 51.337, "rows": 4, "connections": 1, "bytes_sent": 412, "bytes_received": 2270}
+  version_added: '0.4.0'
+'''
+
+import re
+import time
+
+from timeit import default_timer
 
 from ansible.module_utils.basic import AnsibleModule
 
@@ -77,69 +287,331 @@ from ansible_collections.community.cockroachdb.plugins.module_utils.cockroachdb
 )
 
 executed_statements = []
+planned_statements = []
+
+# Options of the module setting multi-region configuration of databases
+REGION_OPTIONS = ('primary_region', 'regions', 'survival_goal', 'placement')
+
+# Jobs created since a timestamp by the current user for a database.
+# GC jobs are skipped as they wait for the GC TTL of the dropped data
+FIND_JOBS_QUERY = (
+    "SELECT job_id FROM [SHOW JOBS] "
+    "WHERE created >= %s AND user_name = current_user() "
+    "AND job_type != 'SCHEMA CHANGE GC' AND description ~ %s "
+    "ORDER BY job_id"
+)
+
+# Characters of identifiers not needing quotes
+IDENTIFIER_CHARS = 'A-Za-z0-9_$'
+
+JOBS_QUERY = (
+    "SELECT job_id, job_type, status, fraction_completed, error, "
+    "EXTRACT(epoch FROM coalesce(finished, now()::TIMESTAMP) - created)::FLOAT AS elapsed "
+    "FROM [SHOW JOBS] WHERE job_id = ANY(%s) ORDER BY job_id"
+)
+
+FINISHED_JOB_STATUSES = ('succeeded', 'failed', 'canceled')
+
+# Delays between polls of jobs in seconds
+WAIT_INITIAL_DELAY = 0.5
+WAIT_MAX_DELAY = 10
+
+
+def fetch_catalog(cursor, placement=False):
+    """Fetch the list of databases.
+
+    Args:
+        cursor (psycopg2.Cursor) - cursor returning rows as dictionaries
+
+    Kwargs:
+        placement (bool) - also fetch the placement policies of the databases
+            to the placement key of the rows, it requires CockroachDB 22.1 or later
+
+    Return a dictionary of rows returned by SHOW DATABASES by database names.
+    """
+    cursor.execute('SHOW DATABASES')
+    catalog = dict((d['database_name'], d) for d in cursor.fetchall())
+
+    if placement:
+        cursor.execute('SELECT name, placement_policy FROM crdb_internal.databases')
+        for d in cursor.fetchall():
+            if d['name'] in catalog:
+                catalog[d['name']]['placement'] = (d['placement_policy'] or 'default').lower()
+
+    return catalog
+
+
+def get_name_pattern(name):
+    """Get a regular expression matching a database name in job descriptions.
+
+    Statements are formatted in job descriptions by the server, which quotes
+    the name only if needed, so the pattern matches both the quoted name
+    and the bare one not being a part of a longer identifier,
+    for example, tenant_1 does not match tenant_10.
+
+    Args:
+        name (str) - database name
+
+    Return a regular expression of the syntax of the ~ operator.
+    """
+    def escape(val):
+        return re.sub(r'([\\.+*?()|\[\]{}^$])', r'\\\1', val)
+
+    quoted = '"%s"' % name.replace('"', '""')
+    boundary = '[^%s"]' % IDENTIFIER_CHARS
+    return '(^|%s)(%s|%s)(%s|$)' % (boundary, escape(quoted), escape(name), boundary)
+
+
+def find_jobs(cursor, name, since):
+    """Find jobs started for a database.
+
+    Args:
+        cursor (psycopg2.Cursor) - cursor returning rows as dictionaries
+        name (str) - database name
+        since (datetime) - server timestamp taken before the statements were executed
+
+    Return a list of job IDs.
+    """
+    cursor.execute(FIND_JOBS_QUERY, (since, get_name_pattern(name)))
+    return [row['job_id'] for row in cursor.fetchall()]
+
+
+def wait_for_jobs(module, cursor, job_ids, timeout):
+    """Poll jobs with an exponential backoff until all of them are finished.
+
+    The module fails if a job has not succeeded or the timeout expires.
+
+    Args:
+        module (AnsibleModule) - AnsibleModule class object
+        cursor (psycopg2.Cursor) - cursor returning rows as dictionaries
+        job_ids (list) - IDs of jobs to wait for
+        timeout (int) - maximum number of seconds to wait
+
+    Return a list of the finished jobs.
+    """
+    if not job_ids:
+        return []
+
+    start = default_timer()
+    delay = WAIT_INITIAL_DELAY
+
+    while True:
+        cursor.execute(JOBS_QUERY, (job_ids,))
+        # Rows of DictCursor are lists, which would be returned without the keys
+        jobs = [dict(job) for job in cursor.fetchall()]
+
+        if all(job['status'] in FINISHED_JOB_STATUSES for job in jobs):
+            break
+
+        elapsed = default_timer() - start
+        if elapsed >= timeout:
+            module.fail_json(msg='Timed out after %s seconds waiting for jobs to finish' % timeout,
+                             jobs=jobs)
+
+        time.sleep(min(delay, timeout - elapsed))
+        delay = min(delay * 2, WAIT_MAX_DELAY)
+
+    for job in jobs:
+        if job['status'] != 'succeeded':
+            module.fail_json(msg='Job %s is %s: %s' % (job['job_id'], job['status'], job['error']),
+                             jobs=jobs)
+
+    return jobs
 
 
 class CockroachDBDatabase():
-    def __init__(self, module, cursor, name):
+    def __init__(self, module, cursor, name, catalog=None):
         self.module = module
         self.cursor = cursor
         self.name = name
+        # Statements executed for this database
+        self.executed_statements = []
+        # Statements executed or, in check mode, to be executed
+        self.planned_statements = []
         # Defaults
         self.exists = False
         self.primary_region = None
         self.regions = []
         self.survive_failure = None
+        self.placement = None
         self.owner = None
         # Update the above by fetching
         # the info from the database
-        self.fetch_info()
-
-    def fetch_info(self):
-        self.cursor.execute('SHOW DATABASES')
-        res = self.cursor.fetchall()
-        for d in res:
-            if d['database_name'] == self.name:
-                self.exists = True
-                self.owner = d['owner']
-                self.primary_region = d['primary_region']
-                self.regions = d['regions']
-                self.survive_failure = d['survival_goal']
-
-    def create(self):
-        if self.module.check_mode:
-            return
-
+        # unless a catalog returned by fetch_catalog is passed
+        self.fetch_info(catalog)
+
+    def fetch_info(self, catalog=None):
+        if catalog is None:
+            catalog = fetch_catalog(self.cursor)
+
+        d = catalog.get(self.name)
+        if d is not None:
+            self.exists = True
+            self.owner = d['owner']
+            self.primary_region = d['primary_region']
+            self.regions = d['regions']
+            self.survive_failure = d['survival_goal']
+            self.placement = d.get('placement')
+
+    def create(self, owner=None, primary_region=None, regions=None,
+               survival_goal=None, placement=None):
         query = 'CREATE DATABASE "%s"' % self.name
 
-        self.cursor.execute(query)
-        executed_statements.append(query)
+        if primary_region:
+            query += ' PRIMARY REGION "%s"' % primary_region
 
-        if self.module.params['owner']:
-            self.__change_owner(self.module.params['owner'])
+            other_regions = [r for r in regions or [] if r != primary_region]
+            if other_regions:
+                query += ' REGIONS %s' % ', '.join('"%s"' % r for r in [primary_region] + other_regions)
 
-    def drop(self):
-        if self.module.check_mode:
-            return True
+            if survival_goal:
+                query += ' SURVIVE %s FAILURE' % survival_goal.upper()
+
+            if placement:
+                query += ' PLACEMENT %s' % placement.upper()
 
+        elif regions or survival_goal or placement:
+            self.module.fail_json(msg='primary_region is required to create '
+                                      'multi-region database "%s"' % self.name)
+
+        self.__execute(query)
+
+        if owner:
+            self.__change_owner(owner)
+
+    def drop(self):
         query = 'DROP DATABASE "%s"' % self.name
-        self.cursor.execute(query)
-        executed_statements.append(query)
+        self.__execute(query)
 
-    def modify(self, owner):
+    def modify(self, owner, primary_region=None, regions=None,
+               survival_goal=None, placement=None):
         changed = False
 
         # Change owner
-        if owner:
-            if self.module.check_mode:
-                return True
+        if owner and owner != self.owner:
             self.__change_owner(owner)
             changed = True
 
+        # Change multi-region configuration
+        for query in self.get_region_plan(primary_region, regions, survival_goal, placement):
+            self.__execute(query)
+            changed = True
+
         return changed
 
+    def get_region_plan(self, primary_region=None, regions=None,
+                        survival_goal=None, placement=None):
+        """Get statements changing the multi-region configuration of the database.
+
+        The statements are ordered so that every one of them is valid
+        when it's executed: regions are added before the primary region is moved
+        to them and before the region survival goal is set, the zone survival goal
+        is set before regions are dropped, and the primary region is dropped last.
+
+        Kwargs:
+            primary_region (str) - primary region
+            regions (list) - all the regions of the database, the primary region
+                is added if missing, an empty list makes the database non-multi-region
+            survival_goal (str) - zone or region
+            placement (str) - default or restricted
+
+        Return a list of statements, empty if nothing needs to be changed.
+        """
+        query = 'ALTER DATABASE "%s" ' % self.name
+        plan = []
+
+        current = list(self.regions or [])
+        target = current if regions is None else list(regions)
+        if primary_region and primary_region not in target:
+            target = target + [primary_region]
+
+        new_primary = primary_region or self.primary_region
+
+        if target and new_primary not in target:
+            if new_primary is None:
+                msg = 'primary_region is required to add regions to database "%s"'
+            else:
+                msg = 'primary_region is required to drop the primary region of database "%s"'
+            self.module.fail_json(msg=msg % self.name)
+
+        if not target and (survival_goal == 'region' or placement == 'restricted'):
+            self.module.fail_json(msg='survival_goal=region and placement=restricted require '
+                                      'database "%s" to have regions' % self.name)
+
+        # Regions cannot be dropped while the database survives region failures
+        if not target and self.survive_failure == 'region':
+            survival_goal = 'zone'
+
+        if 0 < len(target) < 3 and (survival_goal or self.survive_failure) == 'region':
+            self.module.fail_json(msg='survival_goal=region requires database "%s" '
+                                      'to have at least 3 regions' % self.name)
+
+        # Make the database multi-region
+        if self.primary_region is None and new_primary:
+            plan.append(query + 'SET PRIMARY REGION "%s"' % new_primary)
+            current.append(new_primary)
+
+        for region in target:
+            if region not in current:
+                plan.append(query + 'ADD REGION "%s"' % region)
+
+        if self.primary_region and new_primary != self.primary_region:
+            plan.append(query + 'SET PRIMARY REGION "%s"' % new_primary)
+
+        # Restricted placement is incompatible with the region survival goal
+        if placement == 'default' and (self.placement or 'default') != 'default':
+            plan.append(query + 'PLACEMENT DEFAULT')
+
+        if survival_goal and survival_goal != (self.survive_failure or 'zone'):
+            plan.append(query + 'SURVIVE %s FAILURE' % survival_goal.upper())
+
+        for region in self.regions or []:
+            if region not in target and region != new_primary:
+                plan.append(query + 'DROP REGION "%s"' % region)
+
+        # The primary region can be dropped only when it's the last one
+        if not target and self.primary_region:
+            plan.append(query + 'DROP REGION "%s"' % self.primary_region)
+
+        if placement == 'restricted' and (self.placement or 'default') != 'restricted':
+            plan.append(query + 'PLACEMENT RESTRICTED')
+
+        return plan
+
+    def ensure(self, state, owner=None, **region_options):
+        """Bring the database to the state passed.
+
+        The region_options are passed to the create and modify methods.
+
+        Return True if the database was changed, False otherwise.
+        """
+        if state == 'present':
+            if not self.exists:
+                self.create(owner, **region_options)
+                return True
+
+            return self.modify(owner, **region_options)
+
+        # When state is absent
+        if self.exists:
+            self.drop()
+            return True
+
+        return False
+
     def __change_owner(self, new_owner):
         query = 'ALTER DATABASE "%s" OWNER TO %s' % (self.name, new_owner)
+        self.__execute(query)
+
+    def __execute(self, query):
+        self.planned_statements.append(query)
+        planned_statements.append(query)
+
+        if self.module.check_mode:
+            return
+
         self.cursor.execute(query)
+        self.executed_statements.append(query)
         executed_statements.append(query)
 
 
@@ -151,9 +623,24 @@ def main():
 
     # Then we add arguments specific to this module
     argument_spec.update(
-        name=dict(type='str', required=True),
+        name=dict(type='str'),
         state=dict(type='str', choices=['absent', 'present'], default='present'),
         owner=dict(type='str'),
+        primary_region=dict(type='str'),
+        regions=dict(type='list', elements='str'),
+        survival_goal=dict(type='str', choices=['zone', 'region']),
+        placement=dict(type='str', choices=['default', 'restricted']),
+        wait=dict(type='bool', default=False),
+        wait_timeout=dict(type='int', default=300),
+        databases=dict(type='list', elements='dict', options=dict(
+            name=dict(type='str', required=True),
+            state=dict(type='str', choices=['absent', 'present']),
+            owner=dict(type='str'),
+            primary_region=dict(type='str'),
+            regions=dict(type='list', elements='str'),
+            survival_goal=dict(type='str', choices=['zone', 'region']),
+            placement=dict(type='str', choices=['default', 'restricted']),
+        )),
     )
 
     # Instantiate an object of module class
@@ -163,6 +650,9 @@ def main():
     # we can gracefully fail when we need, and, at the end, we can return values to users)
     module = AnsibleModule(
         argument_spec=argument_spec,
+        mutually_exclusive=[('name', 'databases'), ('owner', 'databases')] + [
+            (option, 'databases') for option in REGION_OPTIONS],
+        required_one_of=[('name', 'databases')],
         supports_check_mode=True,
     )
 
@@ -170,9 +660,22 @@ def main():
     name = module.params['name']
     state = module.params['state']
     owner = module.params['owner']
+    specs = module.params['databases']
+    wait = module.params['wait'] and not module.check_mode
+
+    if specs is None:
+        specs = [dict(name=name, state=state, owner=owner)]
+        for option in REGION_OPTIONS:
+            specs[0][option] = module.params[option]
+
+    names = [spec['name'] for spec in specs]
+    duplicates = sorted(set(n for n in names if names.count(n) > 1))
+    if duplicates:
+        module.fail_json(msg='Databases are passed more than once: %s' % ', '.join(duplicates))
 
     # Set defaults
     changed = False
+    databases = {}
 
     # Connect to DB, get cursor
     cockroachdb = CockroachDBServer(module)
@@ -181,21 +684,42 @@ def main():
                                autocommit=True, rows_type='dict')
     cursor = conn.cursor()
 
-    # Instantiate the main object of the module
-    database = CockroachDBDatabase(module, cursor, name)
+    # Fetch the list of databases once for all of them
+    catalog = fetch_catalog(cursor, placement=any(spec['placement'] for spec in specs))
+
+    # Take the server time to find jobs started since then
+    if wait:
+        cursor.execute('SELECT now() AS now')
+        since = cursor.fetchone()['now']
 
     # Do job
-    if state == 'present':
-        if not database.exists:
-            database.create()
-            changed = True
-        else:
-            changed = database.modify(owner)
-    else:
-        # When state is absent
-        if database.exists:
-            database.drop()
-            changed = True
+    for spec in specs:
+        # Instantiate the main object of the module
+        database = CockroachDBDatabase(module, cursor, spec['name'], catalog)
+
+        region_options = dict((option, spec[option]) for option in REGION_OPTIONS)
+
+        db_changed = database.ensure(spec['state'] or state, spec['owner'], **region_options)
+        changed = changed or db_changed
+
+        databases[spec['name']] = dict(
+            changed=db_changed,
+            executed_statements=database.executed_statements,
+            planned_statements=database.planned_statements,
+        )
+
+    if wait:
+        job_ids = {}
+        for db_name, result in databases.items():
+            if result['changed']:
+                job_ids[db_name] = find_jobs(cursor, db_name, since)
+
+        # Wait for the jobs of all the databases at once
+        jobs = wait_for_jobs(module, cursor, sorted(set(i for ids in job_ids.values() for i in ids)),
+                             module.params['wait_timeout'])
+
+        for db_name, result in databases.items():
+            result['jobs'] = [job for job in jobs if job['job_id'] in job_ids.get(db_name, [])]
 
     # Close cursor and conn
     cursor.close()
@@ -205,8 +729,17 @@ def main():
     kw = dict(
         changed=changed,
         executed_statements=executed_statements,
+        planned_statements=planned_statements,
+        databases=databases,
+        connected_host=cockroachdb.host,
     )
 
+    if wait:
+        kw['jobs'] = jobs
+
+    if module.params['timings']:
+        kw['timings'] = cockroachdb.timings.as_dict()
+
     # Return values and exit
     module.exit_json(**kw)
 
@@ -26,6 +26,133 @@ extends_documentation_fragment:
 
 notes:
   - Supports C(check_mode).
+  - The I(cache_ttl), I(cache_dir), and I(cache_max_entries) options
+    are handled by the action plugin of the module on the controller.
+
+options:
+  gather_subset:
+    description:
+      - Subsets of information to collect.
+      - Possible values are C(version), C(databases), C(users),
+        C(settings), C(regions), and C(all) which stands for all of them.
+      - The C(nodes), C(statements), C(hot_ranges), and C(sizes) subsets
+        are not included in C(all) and are collected only when passed explicitly.
+      - The C(statements) subset reads contention events collected
+        from every node of the cluster.
+      - The C(hot_ranges) subset requires CockroachDB 22.1 or later.
+      - The C(sizes) subset reads statistics of every range of the tables,
+        which can take a while on large clusters. It requires CockroachDB
+        earlier than 23.1, where ranges no longer belong to single tables.
+      - A subset prefixed with C(!) is not collected, for example,
+        C(!settings). If only such subsets are passed, everything
+        but them is collected.
+    type: list
+    elements: str
+    default: [all]
+    version_added: '0.4.0'
+
+  parallelism:
+    description:
+      - Number of subsets of information to collect concurrently.
+      - Each concurrent worker uses its own connection to the host
+        the module connected to first.
+      - If a worker cannot connect, the subsets are collected
+        by the other workers and a warning is shown.
+    type: int
+    default: 1
+    version_added: '0.4.0'
+
+  statements_limit:
+    description:
+      - Number of statement fingerprints and indexes with contention
+        returned in the C(statements) subset.
+    type: int
+    default: 10
+    version_added: '0.4.0'
+
+  statements_order_by:
+    description:
+      - Metric to rank statement fingerprints by in the C(statements) subset.
+      - The ranking is done on the server, so only I(statements_limit)
+        rows are returned.
+    type: str
+    choices: [total_latency, mean_latency, rows_read, contention_time]
+    default: total_latency
+    version_added: '0.4.0'
+
+  hot_ranges_limit:
+    description:
+      - Maximum number of ranges returned in the C(hot_ranges) subset.
+    type: int
+    default: 10
+    version_added: '0.4.0'
+
+  hot_ranges_min_qps:
+    description:
+      - Only ranges serving at least this number of queries per second
+        are returned in the C(hot_ranges) subset.
+    type: float
+    default: 0
+    version_added: '0.4.0'
+
+  sizes_databases:
+    description:
+      - Databases to collect the C(sizes) subset for.
+      - If not passed, sizes of all the databases are collected.
+    type: list
+    elements: str
+    version_added: '0.4.0'
+
+  as_of_system_time:
+    description:
+      - Read the C(databases) and C(users) subsets, which come from
+        the system catalog, as of a past time, so that the nearest replica
+        can serve the reads instead of the leaseholder.
+      - C(follower_read_timestamp()) reads data as of the most recent time
+        followers are guaranteed to serve. Other values are passed as strings,
+        for example, an interval like C(-10s) or a timestamp
+        like C(2021-08-01 10:00:00).
+      - Each of the subsets is read in a read-only transaction started
+        with C(BEGIN AS OF SYSTEM TIME). The other subsets are collected
+        from the state of the nodes and are read as usual.
+    type: str
+    version_added: '0.4.0'
+
+  cache_ttl:
+    description:
+      - Number of seconds the result of the module is cached on the controller.
+      - Within this time, the module returns the cached result instead
+        of connecting to the cluster when it is run on the same host with
+        the same I(login_host), I(login_port), I(login_user), I(login_db),
+        I(login_unix_socket), I(login_region), I(gather_subset),
+        I(statements_limit), I(statements_order_by), I(hot_ranges_limit),
+        I(hot_ranges_min_qps), I(sizes_databases), and I(as_of_system_time) options.
+        The order of hosts in I(login_host) and of subsets in I(gather_subset)
+        does not matter.
+      - Results are cached per inventory host, not per cluster, as identifying
+        the cluster requires connecting to it. Hosts connecting to the same
+        cluster do not share cached results, and a result cached for a cluster
+        is returned for another one reached with the same host and options.
+      - Caching is disabled if C(0).
+      - Failed results are not cached.
+    type: int
+    default: 0
+    version_added: '0.4.0'
+
+  cache_dir:
+    description:
+      - Directory on the controller to keep cached results in.
+    type: path
+    default: ~/.ansible/cache/cockroachdb_info
+    version_added: '0.4.0'
+
+  cache_max_entries:
+    description:
+      - Maximum number of results kept in I(cache_dir).
+      - When the number is exceeded, the oldest results are removed.
+    type: int
+    default: 100
+    version_added: '0.4.0'
 '''
 
 EXAMPLES = r'''
@@ -54,31 +181,367 @@ EXAMPLES = r'''
   ansible.builtin.debug:
     var: result
     verbosity: 2
+
+- name: Fetch information about databases and users only
+  community.cockroachdb.cockroachdb_info:
+    gather_subset:
+    - databases
+    - users
+  register: result
+
+- name: Fetch all information except cluster settings
+  community.cockroachdb.cockroachdb_info:
+    gather_subset: '!settings'
+  register: result
+
+- name: Fetch 5 statement fingerprints with the highest contention time
+  community.cockroachdb.cockroachdb_info:
+    gather_subset: statements
+    statements_limit: 5
+    statements_order_by: contention_time
+  register: result
+
+- name: Fetch up to 20 ranges serving more than 500 queries per second
+  community.cockroachdb.cockroachdb_info:
+    gather_subset: hot_ranges
+    hot_ranges_limit: 20
+    hot_ranges_min_qps: 500
+  register: result
+
+- name: Fetch sizes of tables in the acme and bank databases
+  community.cockroachdb.cockroachdb_info:
+    gather_subset: sizes
+    sizes_databases:
+    - acme
+    - bank
+  register: result
+
+- name: Fetch information over 3 concurrent connections
+  community.cockroachdb.cockroachdb_info:
+    parallelism: 3
+  register: result
+
+- name: Fetch databases and users from the nearest replicas
+  community.cockroachdb.cockroachdb_info:
+    gather_subset:
+    - databases
+    - users
+    as_of_system_time: follower_read_timestamp()
+  register: result
+
+- name: Fetch information reusing the result cached within the last 10 minutes
+  community.cockroachdb.cockroachdb_info:
+    cache_ttl: 600
+  register: result
 '''
 
-RETURN = r''' # '''
+RETURN = r'''
+connected_host:
+  description:
+    - Host the module connected to in the C(host:port) format.
+  returned: always
+  type: str
+  sample: 'node1:26257'
+  version_added: '0.4.0'
+
+subset_timings:
+  description:
+    - Time in milliseconds it took to collect each subset of information.
+  returned: always
+  type: dict
+  sample: {"version": 1.205, "databases": 12.811, "users": 3.407}
+  version_added: '0.4.0'
+
+statements:
+  description:
+    - Statistics of the node the module connected to on the statement
+      fingerprints ranked by I(statements_order_by) in C(fingerprints),
+      and on the indexes with the highest cumulative contention time
+      across the cluster in C(contention).
+    - Statements of internal applications are not included.
+    - Latencies and contention time are in seconds.
+  returned: if the C(statements) subset is collected
+  type: dict
+  sample: {
+    "fingerprints": {
+      "UPDATE accounts SET balance = balance + _ WHERE id = _": {
+        "count": 1200, "total_latency": 3.52, "mean_latency": 0.00293,
+        "rows_read": 1200.0, "contention_time": 0.84
+      }
+    },
+    "contention": {
+      "bank.accounts@primary": {
+        "num_contention_events": 37, "contention_time": 1.93
+      }
+    }
+  }
+  version_added: '0.4.0'
+
+nodes:
+  description:
+    - Liveness, store capacity in bytes, and load of the cluster nodes by node IDs.
+    - Capacity, range, lease, and load figures are summed over the stores of a node.
+    - I(queries_per_second) and I(writes_per_second) are the averages
+      the cluster keeps for load-based rebalancing.
+  returned: if the C(nodes) subset is collected
+  type: dict
+  sample: {
+    "1": {
+      "address": "node1:26257", "locality": "region=us-east1,zone=us-east1-b",
+      "server_version": "21.1", "is_live": true, "draining": false,
+      "membership": "active", "stores": 1, "capacity": 107374182400,
+      "available": 96636764160, "used": 524288000, "ranges": 52, "leases": 18,
+      "queries_per_second": 13.4, "writes_per_second": 2.1
+    }
+  }
+  version_added: '0.4.0'
+
+hot_ranges:
+  description:
+    - Ranges with the highest number of queries per second by range IDs.
+    - I(leaseholder) is the ID of the node holding the lease of the range,
+      and I(replicas) are the IDs of the nodes holding its replicas.
+    - Since CockroachDB 23.1, a range can span several tables,
+      so I(database_name), I(table_name), and I(index_name) are lists.
+  returned: if the C(hot_ranges) subset is collected
+  type: dict
+  sample: {
+    "73": {
+      "qps": 1520.4, "database_name": "bank", "table_name": "accounts",
+      "index_name": "primary", "leaseholder": 2, "replicas": [1, 2, 3]
+    }
+  }
+  version_added: '0.4.0'
+
+sizes:
+  description:
+    - Sizes of databases and their tables by database names.
+    - Tables are keyed by their names qualified with the schema names.
+    - I(bytes) is the approximate size of all the versions of the data
+      in bytes, I(live_bytes) is the size of the live data in bytes,
+      I(rows) is the row count estimated by table statistics,
+      and I(ranges) is the number of ranges.
+    - Table figures are aggregated on the server. Database figures are
+      the sums of the figures of the tables.
+    - I(rows) of a table is C(null) if the table has no statistics.
+  returned: if the C(sizes) subset is collected
+  type: dict
+  sample: {
+    "bank": {
+      "bytes": 52428800, "live_bytes": 41943040, "rows": 100000, "ranges": 3,
+      "tables": {
+        "public.accounts": {
+          "bytes": 52428800, "live_bytes": 41943040, "rows": 100000, "ranges": 3
+        }
+      }
+    }
+  }
+  version_added: '0.4.0'
+
+cache_hit:
+  description:
+    - Whether the result was taken from the cache on the controller.
+  returned: always
+  type: bool
+  sample: false
+  version_added: '0.4.0'
+
+timings:
+  description:
+    - Time in milliseconds the module spent in the phases of its work
+      and the numbers of fetched rows and transferred bytes.
+    - With I(parallelism), times and counters of all the connections are summed up,
+      so the times can exceed C(total_ms).
+    - C(convert_ms) is the time spent on building the returned information from rows.
+  returned: if I(timings=true)
+  type: dict
+  sample: {"connect_ms": 8.412, "execute_ms": 61.005, "fetch_ms": 0.311, "convert_ms": 1.027,
+           "total_ms": 79.914, "rows": 352, "connections": 1, "bytes_sent": 913, "bytes_received": 48305}
+  version_added: '0.4.0'
+'''
+
+import threading
+
+from timeit import default_timer
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils._text import to_native
+from ansible.module_utils.six.moves import queue
 
 from ansible_collections.community.cockroachdb.plugins.module_utils.cockroachdb import (
     common_argument_spec,
     CockroachDBServer,
+    get_as_of_system_time,
     get_conn_params,
 )
 
 
-def exec_query(module, cursor, query):
+# Nodes with their liveness and figures of their stores summed up,
+# so that a row per node is returned
+NODES_QUERY = (
+    "SELECT n.node_id, n.address, n.locality, n.server_version, n.is_live, "
+    "l.draining, l.membership, "
+    "count(s.store_id)::INT AS stores, "
+    "sum(s.capacity)::INT AS capacity, "
+    "sum(s.available)::INT AS available, "
+    "sum(s.used)::INT AS used, "
+    "sum(s.range_count)::INT AS ranges, "
+    "sum(s.lease_count)::INT AS leases, "
+    "sum((s.metrics->>'rebalancing.queriespersecond')::FLOAT) AS queries_per_second, "
+    "sum(s.writes_per_second) AS writes_per_second "
+    "FROM crdb_internal.gossip_nodes AS n "
+    "LEFT JOIN crdb_internal.gossip_liveness AS l ON l.node_id = n.node_id "
+    "LEFT JOIN crdb_internal.kv_store_status AS s ON s.node_id = n.node_id "
+    "GROUP BY n.node_id, n.address, n.locality, n.server_version, n.is_live, "
+    "l.draining, l.membership "
+    "ORDER BY n.node_id"
+)
+
+# Arguments of the get_info function for subsets of information
+# that can be collected by it. The version subset is collected
+# by the get_server_version function
+INFO_QUERIES = {
+    'databases': ('SHOW DATABASES WITH COMMENT', 'database_name',
+                  ['comment', 'owner', 'primary_region', 'regions', 'survival_goal']),
+    'users': ('SHOW USERS', 'username', ['member_of', 'options']),
+    'settings': ('SHOW ALL CLUSTER SETTINGS', 'variable', ['value', 'setting_type']),
+    'regions': ('SHOW REGIONS FROM CLUSTER', 'region', ['zones']),
+    'nodes': (NODES_QUERY, 'node_id',
+              ['address', 'locality', 'server_version', 'is_live', 'draining', 'membership',
+               'stores', 'capacity', 'available', 'used', 'ranges', 'leases',
+               'queries_per_second', 'writes_per_second']),
+}
+
+# Statement fingerprints aggregated across applications and ranked
+# by the column passed as the statements_order_by option.
+# The statistics are kept per node, so the query returns them
+# for the node the module connected to
+STATEMENTS_QUERY = (
+    "SELECT key AS fingerprint, "
+    "sum(count)::INT AS count, "
+    "sum(service_lat_avg * count::FLOAT) AS total_latency, "
+    "sum(service_lat_avg * count::FLOAT) / sum(count::FLOAT) AS mean_latency, "
+    "sum(rows_read_avg * count::FLOAT) AS rows_read, "
+    "coalesce(sum(contention_time_avg * count::FLOAT), 0) AS contention_time "
+    "FROM crdb_internal.node_statement_statistics "
+    "WHERE application_name NOT LIKE '$ internal%%%%' "
+    "GROUP BY key ORDER BY %s DESC LIMIT %%s"
+)
+
+STATEMENTS_FIELDS = ['count', 'total_latency', 'mean_latency', 'rows_read', 'contention_time']
+
+# Indexes ranked by cumulative contention time. The table has a row
+# per contending transaction, so per index values are repeated
+CONTENTION_QUERY = (
+    "SELECT concat(t.database_name, '.', t.name, '@', i.index_name) AS name, "
+    "max(c.num_contention_events) AS num_contention_events, "
+    "EXTRACT(epoch FROM max(c.cumulative_contention_time))::FLOAT AS contention_time "
+    "FROM crdb_internal.cluster_contention_events AS c "
+    "LEFT JOIN crdb_internal.tables AS t ON t.table_id = c.table_id "
+    "LEFT JOIN crdb_internal.table_indexes AS i "
+    "ON i.descriptor_id = c.table_id AND i.index_id = c.index_id "
+    "GROUP BY c.table_id, c.index_id, t.database_name, t.name, i.index_name "
+    "ORDER BY contention_time DESC LIMIT %s"
+)
+
+CONTENTION_FIELDS = ['num_contention_events', 'contention_time']
+
+# Ranges ranked by QPS. Hot ranges are reported by every store
+# holding a replica, so the row with the highest QPS is taken for a range.
+# SHOW HOT RANGES returns their tables, indexes, and leaseholders itself,
+# so crdb_internal.ranges computing leaseholders of all the ranges is not read
+HOT_RANGES_QUERY = (
+    "SELECT * FROM (SELECT DISTINCT ON (range_id) * FROM [SHOW HOT RANGES] "
+    "ORDER BY range_id, qps DESC) AS h "
+    "WHERE qps >= %s ORDER BY qps DESC LIMIT %s"
+)
+
+# Fields of the hot_ranges subset and the SHOW HOT RANGES columns
+# they are taken from, the columns were renamed in CockroachDB 23.1
+HOT_RANGES_FIELDS = [
+    ('qps', ['qps']),
+    ('database_name', ['database_name', 'databases']),
+    ('table_name', ['table_name', 'tables']),
+    ('index_name', ['index_name', 'indexes']),
+    ('leaseholder', ['leaseholder_node_id', 'leaseholder']),
+    ('replicas', ['replica_node_ids', 'replicas']),
+]
+
+# Sizes of tables aggregated from MVCC statistics of their ranges.
+# The placeholder is for an optional filter by database names.
+# It is applied to the ranges before their statistics are computed,
+# as crdb_internal.range_stats() is evaluated for every range it gets
+SIZES_QUERY = (
+    "SELECT t.database_name, t.schema_name, t.name AS table_name, "
+    "sum((r.stats->>'key_bytes')::INT + (r.stats->>'val_bytes')::INT)::INT AS bytes, "
+    "sum((r.stats->>'live_bytes')::INT)::INT AS live_bytes, "
+    "max(s.estimated_row_count) AS rows, "
+    "count(r.range_id)::INT AS ranges "
+    "FROM (SELECT range_id, table_id, crdb_internal.range_stats(start_key) AS stats "
+    "FROM crdb_internal.ranges_no_leases%s) AS r "
+    "JOIN crdb_internal.tables AS t ON t.table_id = r.table_id "
+    "LEFT JOIN crdb_internal.table_row_statistics AS s ON s.table_id = r.table_id "
+    "WHERE t.state = 'PUBLIC' "
+    "GROUP BY t.database_name, t.schema_name, t.name "
+    "ORDER BY t.database_name, t.schema_name, t.name"
+)
+
+SIZES_FIELDS = ['bytes', 'live_bytes', 'rows', 'ranges']
+
+# CockroachDB 23.1 removed table_id from crdb_internal.ranges_no_leases
+# as a range can hold several tables since then
+SIZES_UNSUPPORTED_VERSION = (23, 1)
+
+# Subsets read from the system catalog, which can be read
+# as of a system time when the as_of_system_time option is passed
+AS_OF_SYSTEM_TIME_SUBSETS = ['databases', 'users']
+
+# Subsets of information in the order they are collected
+ALL_SUBSETS = ['version', 'databases', 'users', 'settings', 'regions']
+
+# Subsets that are not included in "all" as they are expensive to collect
+# or not supported by all the server versions, in the order they are collected
+OPT_IN_SUBSETS = ['nodes', 'statements', 'hot_ranges', 'sizes']
+
+
+class WorkerError(Exception):
+    """Raised by WorkerModule.fail_json."""
+    pass
+
+
+class WorkerModule():
+    """Wrapper of an Ansible module object to pass to functions run in worker threads.
+
+    Calling fail_json in a thread would exit only the thread,
+    so the fail_json method of the wrapper raises WorkerError instead
+    and lets the main thread fail. Other attributes are taken from the module.
+    """
+    def __init__(self, module):
+        self.module = module
+
+    def fail_json(self, msg, **kwargs):
+        raise WorkerError(msg)
+
+    def __getattr__(self, name):
+        return getattr(self.module, name)
+
+
+def exec_query(module, cursor, query, args=None):
     """Execute a query and return a dict of fetched rows.
 
     The module argument is an Ansible module object.
     Within this function it's used to tell Ansible
     that we want the task to fail and show a user a certain error message.
+
+    The args argument is a tuple of query arguments if the query has placeholders.
     """
     res = None
 
     try:
-        cursor.execute(query)
+        if args is None:
+            cursor.execute(query)
+        else:
+            cursor.execute(query, args)
     except Exception as e:
         module.fail_json('Failed to execute query "%s": %s' % (query, to_native(e)))
 
@@ -91,6 +554,32 @@ def exec_query(module, cursor, query):
     return res
 
 
+def get_info_as_of_system_time(module, cursor, value, *args):
+    """Get info from a server in a transaction reading as of a system time.
+
+    Args:
+        module (AnsibleModule) - AnsibleModule class object
+        cursor (psycopg2.Cursor) - psycopg2.Cursor class object
+        value (string) - value of the as_of_system_time option
+        args - arguments of the get_info function following the cursor
+
+    Return a dictionary containing info.
+    """
+    try:
+        cursor.execute('BEGIN %s' % get_as_of_system_time(cursor, value))
+    except Exception as e:
+        module.fail_json('Failed to read as of system time "%s": %s' % (value, to_native(e)))
+
+    info = get_info(module, cursor, *args)
+
+    try:
+        cursor.execute('COMMIT')
+    except Exception as e:
+        module.fail_json('Failed to commit transaction: %s' % to_native(e))
+
+    return info
+
+
 def extract_server_ver(ver_str):
     """Take version string and return version dictionary.
 
@@ -146,7 +635,7 @@ def get_server_version(module, cursor):
     return v_info
 
 
-def get_info(module, cursor, query, root_key, fields):
+def get_info(module, cursor, query, root_key, fields, args=None):
     """Get info from a server.
 
     As the rows returned by exec_query are a list of dictionaries,
@@ -165,9 +654,12 @@ def get_info(module, cursor, query, root_key, fields):
         fields (list) - list of strings that represents fields
             we wanna get
 
+    Kwargs:
+        args (tuple) - query arguments to pass to the exec_query function
+
     Return a dictionary containing info.
     """
-    res = exec_query(module, cursor, query)
+    res = exec_query(module, cursor, query, args)
 
     if not res:
         return {}
@@ -184,9 +676,278 @@ def get_info(module, cursor, query, root_key, fields):
     return info
 
 
+def get_statements_info(module, cursor, limit, order_by):
+    """Get statistics on top statement fingerprints and contention.
+
+    Args:
+        module (AnsibleModule) - AnsibleModule class object
+        cursor (psycopg2.Cursor) - psycopg2.Cursor class object
+        limit (int) - number of fingerprints and indexes to return
+        order_by (string) - column of STATEMENTS_QUERY to rank fingerprints by
+
+    Return a dictionary containing info.
+    """
+    return {
+        'fingerprints': get_info(module, cursor, STATEMENTS_QUERY % order_by,
+                                 'fingerprint', STATEMENTS_FIELDS, (limit,)),
+        'contention': get_info(module, cursor, CONTENTION_QUERY,
+                               'name', CONTENTION_FIELDS, (limit,)),
+    }
+
+
+def get_hot_ranges_info(module, cursor, min_qps, limit):
+    """Get ranges with the highest number of queries per second.
+
+    Args:
+        module (AnsibleModule) - AnsibleModule class object
+        cursor (psycopg2.Cursor) - psycopg2.Cursor class object
+        min_qps (float) - minimum QPS of returned ranges
+        limit (int) - maximum number of returned ranges
+
+    Return a dictionary containing info.
+    """
+    res = exec_query(module, cursor, HOT_RANGES_QUERY, (min_qps, limit))
+
+    info = {}
+    for row in res:
+        hot_range = {}
+        for field, columns in HOT_RANGES_FIELDS:
+            for column in columns:
+                if column in row:
+                    hot_range[field] = row[column]
+                    break
+
+        info[row['range_id']] = hot_range
+
+    return info
+
+
+def get_sizes_info(module, cursor, databases=None):
+    """Get sizes of databases and their tables.
+
+    Args:
+        module (AnsibleModule) - AnsibleModule class object
+        cursor (psycopg2.Cursor) - psycopg2.Cursor class object
+
+    Kwargs:
+        databases (list) - names of databases to get sizes of,
+            all the databases if not passed
+
+    Return a dictionary containing info.
+    """
+    version = get_server_version(module, cursor)
+    if (version['year'], version['release']) >= SIZES_UNSUPPORTED_VERSION:
+        module.fail_json(msg='The sizes subset requires CockroachDB earlier than %s.%s, '
+                             'the server version is %s.%s.%s' % (SIZES_UNSUPPORTED_VERSION +
+                                                                 (version['year'], version['release'],
+                                                                  version['patch'])))
+
+    if databases:
+        res = exec_query(module, cursor,
+                         SIZES_QUERY % (' WHERE table_id IN (SELECT table_id '
+                                        'FROM crdb_internal.tables '
+                                        'WHERE database_name = ANY(%s))'),
+                         (databases,))
+    else:
+        res = exec_query(module, cursor, SIZES_QUERY % '')
+
+    info = {}
+    for row in res:
+        database = info.setdefault(row['database_name'], {'tables': {}})
+
+        table = {}
+        for field in SIZES_FIELDS:
+            table[field] = row[field]
+            database[field] = database.get(field, 0) + (row[field] or 0)
+
+        database['tables']['%s.%s' % (row['schema_name'], row['table_name'])] = table
+
+    return info
+
+
+def get_subsets(module, gather_subset):
+    """Get subsets of information to collect.
+
+    The gather_subset argument is a list of subset names,
+    where "all" stands for all the subsets but OPT_IN_SUBSETS
+    and names prefixed with "!" are excluded. If only excluded
+    subsets are passed, all the other subsets are included.
+
+    The module argument is an Ansible module object.
+    Within this function it's used to tell Ansible
+    that we want the task to fail and show a user a certain error message.
+
+    Return a list of subset names in the order they should be collected.
+    """
+    known_subsets = ALL_SUBSETS + OPT_IN_SUBSETS
+    include = set()
+    exclude = set()
+
+    for item in gather_subset:
+        excluded = item.startswith('!')
+        name = item[1:] if excluded else item
+
+        if name == 'all':
+            names = ALL_SUBSETS
+        elif name in known_subsets:
+            names = [name]
+        else:
+            module.fail_json(msg='Unknown subset "%s", possible values '
+                                 'are: %s' % (name, ', '.join(['all'] + known_subsets)))
+
+        if excluded:
+            exclude.update(names)
+        else:
+            include.update(names)
+
+    if not include:
+        include.update(ALL_SUBSETS)
+
+    return [name for name in known_subsets if name in include and name not in exclude]
+
+
+def get_subset_info(module, cursor, subset):
+    """Collect a subset of information.
+
+    The module argument is an Ansible module object.
+    Within this function it's used to tell Ansible
+    that we want the task to fail and show a user a certain error message.
+
+    Return a dictionary containing info.
+    """
+    if subset == 'version':
+        return get_server_version(module, cursor)
+
+    if subset == 'statements':
+        return get_statements_info(module, cursor, module.params['statements_limit'],
+                                   module.params['statements_order_by'])
+
+    if subset == 'hot_ranges':
+        return get_hot_ranges_info(module, cursor, module.params['hot_ranges_min_qps'],
+                                   module.params['hot_ranges_limit'])
+
+    if subset == 'sizes':
+        return get_sizes_info(module, cursor, module.params['sizes_databases'])
+
+    query, root_key, fields = INFO_QUERIES[subset]
+    if subset in AS_OF_SYSTEM_TIME_SUBSETS and module.params['as_of_system_time']:
+        return get_info_as_of_system_time(module, cursor, module.params['as_of_system_time'],
+                                          query, root_key, fields)
+
+    return get_info(module, cursor, query, root_key, fields)
+
+
+def collect_subsets(module, cockroachdb, subsets, parallelism=1):
+    """Collect subsets of information.
+
+    With parallelism greater than 1, the subsets are collected by worker threads.
+    The first worker uses the connection of the cockroachdb object,
+    the others open their own connections to the same host.
+
+    Args:
+        module (AnsibleModule) - AnsibleModule class object
+        cockroachdb (CockroachDBServer) - connected CockroachDBServer class object
+        subsets (list) - subset names returned by get_subsets
+
+    Kwargs:
+        parallelism (int) - maximum number of worker threads (default 1)
+
+    Return a tuple (
+        info (dict) - collected info by subset names
+        timings (dict) - time in milliseconds it took to collect each subset
+    )
+    """
+    results = {}
+
+    def collect(module, cursor, subset):
+        start = default_timer()
+        with cockroachdb.timings.measure('convert'):
+            info = get_subset_info(module, cursor, subset)
+
+        results[subset] = (info, round((default_timer() - start) * 1000, 3))
+
+    workers = min(parallelism, len(subsets))
+    if workers < 2:
+        cursor = cockroachdb.connection.cursor()
+        for subset in subsets:
+            collect(module, cursor, subset)
+
+        cursor.close()
+
+    else:
+        pending = queue.Queue()
+        for subset in subsets:
+            pending.put(subset)
+
+        errors = []
+
+        def work(connection):
+            worker_module = WorkerModule(module)
+            own_connection = connection is None
+            try:
+                if own_connection:
+                    connection = CockroachDBServer(worker_module, timings=cockroachdb.timings).connect(
+                        conn_params=cockroachdb.conn_params, autocommit=True, fail_on_conn=False)
+                    if connection is None:
+                        # The other workers will do the job
+                        return
+
+                cursor = connection.cursor()
+                while True:
+                    try:
+                        subset = pending.get_nowait()
+                    except queue.Empty:
+                        break
+
+                    collect(worker_module, cursor, subset)
+
+                cursor.close()
+
+            except WorkerError as e:
+                errors.append(to_native(e))
+
+            finally:
+                if own_connection and connection is not None:
+                    connection.close()
+
+        threads = [threading.Thread(target=work, args=(cockroachdb.connection if i == 0 else None,))
+                   for i in range(workers)]
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            module.fail_json(msg=errors[0])
+
+    info = {}
+    timings = {}
+    for subset in subsets:
+        info[subset], timings[subset] = results[subset]
+
+    return info, timings
+
+
 def main():
     # Set up arguments
     argument_spec = common_argument_spec()
+    argument_spec.update(
+        gather_subset=dict(type='list', elements='str', default=['all']),
+        parallelism=dict(type='int', default=1),
+        statements_limit=dict(type='int', default=10),
+        statements_order_by=dict(type='str', default='total_latency',
+                                 choices=['total_latency', 'mean_latency',
+                                          'rows_read', 'contention_time']),
+        hot_ranges_limit=dict(type='int', default=10),
+        hot_ranges_min_qps=dict(type='float', default=0),
+        sizes_databases=dict(type='list', elements='str'),
+        as_of_system_time=dict(type='str'),
+        # Handled by the action plugin
+        cache_ttl=dict(type='int', default=0),
+        cache_dir=dict(type='path', default='~/.ansible/cache/cockroachdb_info'),
+        cache_max_entries=dict(type='int', default=100),
+    )
 
     # Instantiate an object of module class
     module = AnsibleModule(
@@ -194,36 +955,36 @@ def main():
         supports_check_mode=True,
     )
 
-    # Connect to DB, get cursor
+    subsets = get_subsets(module, module.params['gather_subset'])
+    parallelism = module.params['parallelism']
+
+    if parallelism < 1:
+        module.fail_json(msg='parallelism must be greater than 0')
+
+    if module.params['statements_limit'] < 1:
+        module.fail_json(msg='statements_limit must be greater than 0')
+
+    if module.params['hot_ranges_limit'] < 1:
+        module.fail_json(msg='hot_ranges_limit must be greater than 0')
+
+    # Connect to DB
     cockroachdb = CockroachDBServer(module)
 
     conn = cockroachdb.connect(conn_params=get_conn_params(module.params),
                                autocommit=True)
-    cursor = conn.cursor()
 
     # Dictionary that will contain server information.
     # We will return it to users at the end
-    server_info = {}
-
-    # Collect info
-    server_info['version'] = get_server_version(module, cursor)
-    server_info['databases'] = get_info(module, cursor,
-                                        'SHOW DATABASES WITH COMMENT',
-                                        'database_name',
-                                        ['comment', 'owner', 'primary_region',
-                                         'regions', 'survival_goal'])
-    server_info['users'] = get_info(module, cursor, 'SHOW USERS', 'username',
-                                    ['member_of', 'options'])
-    server_info['settings'] = get_info(module, cursor, 'SHOW ALL CLUSTER SETTINGS',
-                                       'variable', ['value', 'setting_type'])
-    server_info['regions'] = get_info(module, cursor, 'SHOW REGIONS FROM CLUSTER',
-                                      'region', ['zones'])
-
-    # Close cursor and conn
-    cursor.close()
+    server_info, timings = collect_subsets(module, cockroachdb, subsets, parallelism)
+
+    # Close conn
     conn.close()
 
-    module.exit_json(changed=False, **server_info)
+    if module.params['timings']:
+        server_info['timings'] = cockroachdb.timings.as_dict()
+
+    module.exit_json(changed=False, connected_host=cockroachdb.host,
+                     subset_timings=timings, **server_info)
 
 
 if __name__ == '__main__':
@@ -26,6 +26,10 @@ extends_documentation_fragment:
 
 notes:
   - Does not support C(check_mode).
+  - Values of the C(numeric) type are returned as floats, values of the C(interval),
+    C(uuid) and C(inet) types as strings, and values of the C(bytea) type
+    as strings in the hex format, for example, C(\x616263).
+    Arrays of these types are converted element-wise.
 
 options:
   query:
@@ -47,14 +51,282 @@ options:
       - Mutually exclusive with I(positional_args).
     type: dict
 
+  args_list:
+    description:
+      - List of sets of arguments to run I(query) with one by one
+        over the same connection.
+      - Each element is a list of positional arguments or
+        a dictionary of named arguments depending on the placeholders
+        used in I(query).
+      - I(query) is prepared with C(PREPARE) once and executed with
+        C(EXECUTE) for every element, so it is parsed and planned only once.
+        Up to 16 prepared statements are kept on the connection, the least
+        recently used one is deallocated when more are needed.
+      - Rows returned by all the executions are returned in C(query_result),
+        I(rowcount) contains the total number of affected rows.
+      - Mutually exclusive with I(positional_args), I(named_args), I(rows),
+        I(rows_file) and I(queries). Cannot be used with I(server_side_cursor),
+        I(output_file) or I(explain).
+    type: list
+    elements: raw
+    version_added: '0.4.0'
+
   rows_type:
     description:
       - If set to C(tuple), rows in the I(query_result)
         return value will be of the tuple type.
+      - If set to C(columnar), rows in I(query_result) are lists of values
+        and the names and types of the columns are returned once in C(columns),
+        which makes the result of wide or long queries much smaller than
+        with dictionaries repeating the column names in every row.
       - Returns dictionaries by default.
     type: str
-    choices: [dict, tuple]
+    choices: [dict, tuple, columnar]
     default: dict
+
+  server_side_cursor:
+    description:
+      - If C(true), the query is run through a server-side named cursor
+        and rows are fetched from the server in chunks of I(fetch_size) rows.
+      - Use it for big C(SELECT) result sets to keep memory consumption
+        on the managed host bounded.
+      - The query is run inside a transaction which is committed after
+        all the rows are fetched.
+      - Only C(SELECT) and C(VALUES) queries can be used with this option.
+      - Requires CockroachDB 22.1 or later.
+    type: bool
+    default: false
+    version_added: '0.4.0'
+
+  fetch_size:
+    description:
+      - Number of rows to fetch from the server at once
+        when I(server_side_cursor=true).
+    type: int
+    default: 1000
+    version_added: '0.4.0'
+
+  max_rows:
+    description:
+      - Maximum number of rows to return in I(query_result).
+      - The rest of the rows are not fetched.
+      - By default, all the rows are returned.
+    type: int
+    version_added: '0.4.0'
+
+  output_file:
+    description:
+      - Path to a file on the managed host to write fetched rows to
+        instead of returning them in I(query_result).
+      - Rows are written to the file as they are fetched from the cursor,
+        so use it together with I(server_side_cursor=true) to keep memory
+        consumption bounded for big result sets.
+      - The file is overwritten if it exists.
+      - Only queries returning rows can be used with this option.
+    type: path
+    version_added: '0.4.0'
+
+  output_format:
+    description:
+      - Format of I(output_file).
+      - If C(csv), the first line of the file contains column names.
+        Booleans are written as C(true) and C(false), C(bytea) values
+        in hex, and JSON and array values as JSON.
+      - If C(jsonl), each line of the file contains one row represented
+        as a JSON object or, when I(rows_type=tuple) or I(rows_type=columnar),
+        as a JSON array.
+    type: str
+    choices: [csv, jsonl]
+    default: jsonl
+    version_added: '0.4.0'
+
+  rows:
+    description:
+      - List of rows to insert using I(query) in batches of I(batch_size) rows.
+      - I(query) must contain a single C(%s) placeholder in place of
+        the C(VALUES) list, for example, C(INSERT INTO acme (id, story) VALUES %s).
+        Each batch is sent as one multi-row C(INSERT) or C(UPSERT) statement.
+      - Rows can be lists or dictionaries. The keys of dictionaries
+        must follow the order of columns in I(query).
+      - Every batch is committed separately unless I(transaction=true).
+      - Mutually exclusive with I(rows_file), I(positional_args), I(named_args)
+        and I(output_file).
+    type: list
+    elements: raw
+    version_added: '0.4.0'
+
+  rows_file:
+    description:
+      - Path to a file on the managed host containing rows to insert
+        the same way as with I(rows).
+      - The file is read as the batches are sent, so it is never loaded
+        into memory completely.
+      - Mutually exclusive with I(rows), I(positional_args), I(named_args)
+        and I(output_file).
+    type: path
+    version_added: '0.4.0'
+
+  rows_file_format:
+    description:
+      - Format of I(rows_file).
+      - If C(csv), the first line of the file must contain column names,
+        each of the following lines is turned into a dictionary.
+      - If C(jsonl), each line of the file must contain
+        a JSON array or a JSON object.
+    type: str
+    choices: [csv, jsonl]
+    default: jsonl
+    version_added: '0.4.0'
+
+  rows_file_null:
+    description:
+      - String representing C(NULL) in I(rows_file) when I(rows_file_format=csv),
+        fields equal to it are inserted as C(NULL).
+      - If not specified, CSV files cannot express C(NULL) and empty fields
+        are inserted as empty strings. Pass an empty string to insert them as C(NULL).
+      - Has no effect with I(rows_file_format=jsonl), where C(null) is used.
+    type: str
+    version_added: '0.4.0'
+
+  batch_size:
+    description:
+      - Number of rows from I(rows) or I(rows_file) to send in one statement.
+    type: int
+    default: 1000
+    version_added: '0.4.0'
+
+  queries:
+    description:
+      - List of queries to run one by one over the same connection.
+      - Mutually exclusive with I(query), I(positional_args), I(named_args),
+        I(rows), I(rows_file) and I(output_file).
+    type: list
+    elements: dict
+    version_added: '0.4.0'
+    suboptions:
+      query:
+        description:
+          - SQL query to run.
+        type: str
+        required: true
+      positional_args:
+        description:
+          - List of values to be passed as positional arguments to the query.
+          - Mutually exclusive with I(named_args).
+        type: list
+        elements: raw
+      named_args:
+        description:
+          - Dictionary of key-value arguments to pass to the query.
+          - Mutually exclusive with I(positional_args).
+        type: dict
+      args_list:
+        description:
+          - List of sets of arguments to run the query with
+            using a prepared statement, see the top-level I(args_list).
+          - Mutually exclusive with I(positional_args) and I(named_args).
+        type: list
+        elements: raw
+        version_added: '0.4.0'
+
+  transaction:
+    description:
+      - If C(true), everything the module runs is run in a single transaction
+        which is committed only if all the statements succeed.
+    type: bool
+    default: false
+    version_added: '0.4.0'
+
+  continue_on_error:
+    description:
+      - If C(true), a failure of a query from I(queries) does not stop
+        the module, the error is reported in I(results) and the next query is run.
+      - When I(transaction=true), the changes made by the failed query
+        are rolled back using a savepoint, the rest of the transaction is committed.
+    type: bool
+    default: false
+    version_added: '0.4.0'
+
+  max_retries:
+    description:
+      - Maximum number of times to retry the transaction when CockroachDB
+        returns a transaction retry error (SQLSTATE C(40001)),
+        for example, because of contention with other transactions.
+      - Before every retry, the transaction is rolled back and the module waits
+        for a random delay growing exponentially with the number of the retry.
+        Then the whole transaction is run again from the beginning.
+      - When I(queries), I(rows) or I(rows_file) is used,
+        requires I(transaction=true).
+      - By default, the module fails on the first retry error.
+    type: int
+    default: 0
+    version_added: '0.4.0'
+
+  retry_max_time:
+    description:
+      - Maximum number of seconds all the attempts to run
+        the transaction can take when I(max_retries) is specified.
+      - The module fails if the next retry would exceed this time.
+    type: float
+    default: 60
+    version_added: '0.4.0'
+
+  explain:
+    description:
+      - Capture the plan of I(query) and return it with its statistics in C(explain).
+      - If C(plan), the plan is captured with C(EXPLAIN) without executing the query,
+        then the query is run as usual and its rows are returned in C(query_result).
+      - If C(analyze), the query is executed by C(EXPLAIN ANALYZE) collecting
+        execution statistics. The query is executed only once, its changes are applied,
+        but its rows are not returned, so C(query_result) is empty,
+        and C(statusmessage) and C(rowcount) are C(null).
+      - If C(analyze_distsql), C(EXPLAIN ANALYZE (DISTSQL)) is used, which also returns
+        URLs of diagrams of the distributed execution.
+      - Cannot be used with I(queries), I(rows) or I(rows_file).
+        C(analyze) and C(analyze_distsql) cannot be used with
+        I(server_side_cursor) or I(output_file).
+    type: str
+    choices: [plan, analyze, analyze_distsql]
+    version_added: '0.4.0'
+
+  as_of_system_time:
+    description:
+      - Read data as of a past time, so that the nearest replica
+        can serve the reads instead of the leaseholder.
+      - C(follower_read_timestamp()) reads data as of the most recent time
+        followers are guaranteed to serve. Other values are passed as strings,
+        for example, an interval like C(-10s) or a timestamp
+        like C(2021-08-01 10:00:00).
+      - Everything the module runs is run in a single read-only transaction
+        started with C(SET TRANSACTION AS OF SYSTEM TIME).
+      - Bounded-staleness functions like C(with_max_staleness()) cannot be used
+        as CockroachDB supports them only in single-statement implicit transactions.
+      - I(query) and the queries from I(queries) must start with C(SELECT), C(SHOW),
+        C(WITH), C(VALUES), C(TABLE), or C(EXPLAIN). Writes in them are rejected
+        by CockroachDB. Cannot be used with I(rows) or I(rows_file).
+    type: str
+    version_added: '0.4.0'
+
+  return_query:
+    description:
+      - If C(true), executed queries containing substituted arguments
+        are returned in C(query) and in the C(query) keys of C(results).
+      - If C(false), they are C(null), which reduces the size of the result
+        when queries get large arguments.
+      - The arguments are substituted only once in any case and
+        the resulting statement is sent to the server as is.
+    type: bool
+    default: true
+    version_added: '0.4.0'
+
+  query_max_length:
+    description:
+      - Maximum number of characters of returned queries.
+      - Longer queries are truncated and C(...) is appended to them.
+      - C(0) means no limit, so queries are returned in full by default.
+    type: int
+    default: 0
+    version_added: '0.4.0'
 '''
 
 EXAMPLES = r'''
@@ -97,12 +369,112 @@ EXAMPLES = r'''
     named_args:
       id_val: 1
       story_val: test
+
+- name: Fetch first 10000 rows of a big table in chunks of 500 rows
+  community.cockroachdb.cockroachdb_query:
+    login_db: test_db
+    query: SELECT * FROM big_table
+    server_side_cursor: true
+    fetch_size: 500
+    max_rows: 10000
+
+- name: Export a big table to a CSV file on the managed host
+  community.cockroachdb.cockroachdb_query:
+    login_db: test_db
+    query: SELECT * FROM big_table
+    server_side_cursor: true
+    output_file: /tmp/big_table.csv
+    output_format: csv
+  register: result
+
+- name: Insert rows in batches of 2 rows
+  community.cockroachdb.cockroachdb_query:
+    login_db: test_db
+    query: INSERT INTO test (id, story) VALUES %s
+    batch_size: 2
+    rows:
+    - [1, first]
+    - [2, second]
+    - id: 3
+      story: third
+
+- name: Upsert rows from a CSV file on the managed host
+  community.cockroachdb.cockroachdb_query:
+    login_db: test_db
+    query: UPSERT INTO test (id, story) VALUES %s
+    rows_file: /tmp/test.csv
+    rows_file_format: csv
+    batch_size: 5000
+
+- name: Run query on the nearest available node of the cluster
+  community.cockroachdb.cockroachdb_query:
+    login_host:
+    - node1.example.com
+    - node2.example.com
+    - node3.example.com:26258
+    login_db: acme
+    query: SELECT count(*) FROM test
+  register: result
+
+- name: Run several queries in one transaction
+  community.cockroachdb.cockroachdb_query:
+    login_db: test_db
+    transaction: true
+    queries:
+    - query: CREATE TABLE accounts (id INT PRIMARY KEY, balance DECIMAL)
+    - query: INSERT INTO accounts (id, balance) VALUES (%s, %s)
+      positional_args:
+      - 1
+      - 1000.50
+    - query: SELECT * FROM accounts WHERE id = %(id)s
+      named_args:
+        id: 1
+
+- name: Transfer money retrying the transaction up to 10 times under contention
+  community.cockroachdb.cockroachdb_query:
+    login_db: test_db
+    transaction: true
+    max_retries: 10
+    queries:
+    - query: UPDATE accounts SET balance = balance - 100 WHERE id = 1
+    - query: UPDATE accounts SET balance = balance + 100 WHERE id = 2
+  register: result
+
+- name: Update several accounts preparing the statement once
+  community.cockroachdb.cockroachdb_query:
+    login_db: test_db
+    query: UPDATE accounts SET balance = %(balance)s WHERE id = %(id)s
+    args_list:
+    - id: 1
+      balance: 900.50
+    - id: 2
+      balance: 1100.50
+  register: result
+
+- name: Run a report reading from the nearest replicas
+  community.cockroachdb.cockroachdb_query:
+    login_db: acme
+    query: SELECT region, count(*) FROM orders GROUP BY region
+    as_of_system_time: follower_read_timestamp()
+
+- name: Run a report collecting its execution statistics
+  community.cockroachdb.cockroachdb_query:
+    login_db: acme
+    query: SELECT region, sum(amount) FROM orders WHERE created_at > now() - INTERVAL '1 day' GROUP BY region
+    explain: analyze
+  register: report
+
+- name: Fail if the report started to scan whole tables
+  ansible.builtin.assert:
+    that:
+      - report.explain.full_scans == []
 '''
 
 RETURN = r'''
 query:
     description:
     - Executed query containing substituted arguments.
+    - Truncated to I(query_max_length) characters if it is set, C(null) if I(return_query=false).
     returned: always
     type: str
     sample: 'SELECT * FROM bar'
@@ -118,6 +490,8 @@ query_result:
   description:
     - List of dicts representing returned rows.
       When the I(rows_type) option is set to C(tuple), it will consist of tuples.
+      When it is set to C(columnar), it will consist of lists of values
+      in the order of C(columns).
   returned: always
   type: list
   elements: dict
@@ -129,13 +503,184 @@ rowcount:
   returned: changed
   type: int
   sample: 5
+
+columns:
+  description:
+    - Names and types of the columns returned by the query
+      when I(rows_type=columnar).
+    - Types are names of PostgreSQL types, C(null) for types unknown to the module.
+    - When I(queries) is used, the dictionaries of I(results)
+      contain the columns of the queries, this value contains
+      the columns of the last query.
+    - Empty if the query returns no rows.
+  returned: when I(rows_type=columnar)
+  type: list
+  elements: dict
+  sample: [{"name": "id", "type": "int8"}, {"name": "balance", "type": "numeric"}]
+  version_added: '0.4.0'
+
+output_file:
+  description:
+    - Path to the file the rows were written to.
+  returned: when I(output_file) is specified
+  type: str
+  sample: '/tmp/big_table.csv'
+  version_added: '0.4.0'
+
+output_rows:
+  description:
+    - Number of rows written to I(output_file).
+  returned: when I(output_file) is specified
+  type: int
+  sample: 10000
+  version_added: '0.4.0'
+
+output_size:
+  description:
+    - Size of I(output_file) in bytes.
+  returned: when I(output_file) is specified
+  type: int
+  sample: 1048576
+  version_added: '0.4.0'
+
+checksum:
+  description:
+    - SHA1 checksum of I(output_file).
+  returned: when I(output_file) is specified
+  type: str
+  sample: '6e642bb8dd5c2e027bf21dd923337cbb4214f827'
+  version_added: '0.4.0'
+
+batches:
+  description:
+    - List of dictionaries describing the batches sent
+      when I(rows) or I(rows_file) is specified.
+    - Each dictionary contains the number of rows sent in the batch (C(rows)),
+      the number of affected rows (C(rowcount)) and
+      the time it took to execute the batch in milliseconds (C(duration_ms)).
+    - I(rowcount) contains the total number of affected rows in this case.
+  returned: when I(rows) or I(rows_file) is specified
+  type: list
+  elements: dict
+  sample: [{"rows": 2, "rowcount": 2, "duration_ms": 3.112}, {"rows": 1, "rowcount": 1, "duration_ms": 1.507}]
+  version_added: '0.4.0'
+
+results:
+  description:
+    - List of dictionaries describing the queries run when I(queries) is specified.
+    - Each dictionary contains the C(query), C(statusmessage), C(rowcount)
+      and C(query_result) values of the query as well as the time it took
+      to execute the query in milliseconds (C(duration_ms)).
+      With I(rows_type=columnar), it also contains C(columns).
+      Failed queries have the C(error) key containing the error message.
+    - The I(query), I(statusmessage), I(rowcount) and I(query_result)
+      return values contain the values of the last query in this case.
+  returned: when I(queries) is specified
+  type: list
+  elements: dict
+  sample: [{"query": "SELECT 1", "statusmessage": "SELECT 1", "rowcount": 1, "query_result": [{"?column?": 1}], "duration_ms": 0.871}]
+  version_added: '0.4.0'
+
+executions:
+  description:
+    - List of dictionaries describing the executions of the prepared statement
+      when I(args_list) is specified, one per element of I(args_list).
+    - Each dictionary contains the C(statusmessage) and C(rowcount) of the execution
+      and the time it took in milliseconds (C(duration_ms)).
+    - When I(args_list) is used in I(queries), the dictionaries
+      of I(results) contain this key.
+  returned: when I(args_list) is specified
+  type: list
+  elements: dict
+  sample: [{"statusmessage": "UPDATE 1", "rowcount": 1, "duration_ms": 1.204}]
+  version_added: '0.4.0'
+
+execution_stats:
+  description:
+    - Aggregate timing of the executions when I(args_list) is specified.
+    - C(prepared) is C(false) if the statement was prepared earlier
+      over the same connection. C(prepare_ms) is the time it took to prepare it.
+    - C(count) is the number of executions, C(total_ms), C(min_ms), C(mean_ms)
+      and C(max_ms) are computed from their C(duration_ms).
+    - When I(args_list) is used in I(queries), the dictionaries
+      of I(results) contain this key.
+  returned: when I(args_list) is specified
+  type: dict
+  sample: {"prepared": true, "prepare_ms": 2.731, "count": 2, "total_ms": 2.51,
+           "min_ms": 1.204, "mean_ms": 1.255, "max_ms": 1.306}
+  version_added: '0.4.0'
+
+connected_host:
+  description:
+    - Host the module connected to in the C(host:port) format.
+  returned: always
+  type: str
+  sample: 'node1:26257'
+  version_added: '0.4.0'
+
+retries:
+  description:
+    - Number of times the transaction was retried
+      because of transaction retry errors.
+  returned: always
+  type: int
+  sample: 2
+  version_added: '0.4.0'
+
+explain:
+  description:
+    - Plan of I(query) and its statistics captured according to I(explain).
+    - C(plan) contains the lines of the plan and C(diagram_urls)
+      the URLs of the diagrams returned with I(explain=analyze_distsql).
+    - C(full_scans) contains the indexes scanned fully, C(nodes) the IDs of the nodes
+      and C(regions) the regions the query was executed on.
+    - The other statistics are C(null) with I(explain=plan) and when CockroachDB
+      does not return them. C(total_latency_ms) is the sum of C(planning_time_ms)
+      and C(execution_time_ms). C(rows_read) and C(bytes_read) are read from the storage layer.
+      C(network_bytes) and C(network_messages) are sent between nodes.
+  returned: when I(explain) is specified
+  type: dict
+  sample: {"mode": "analyze", "distribution": "full", "vectorized": true,
+           "planning_time_ms": 0.325, "execution_time_ms": 2.1, "total_latency_ms": 2.425,
+           "rows_read": 1000, "bytes_read": 41984, "network_bytes": 0, "network_messages": 0,
+           "max_memory_bytes": 20480, "full_scans": ["orders@primary"], "nodes": [1],
+           "regions": [], "diagram_urls": [],
+           "plan": ["planning time: 325\u00b5s", "execution time: 2.1ms", "distribution: full", "..."]}
+  version_added: '0.4.0'
+
+timings:
+  description:
+    - Time in milliseconds the module spent in the phases of its work
+      and the numbers of fetched rows and transferred bytes.
+    - C(convert_ms) is the time spent on converting values to types supported
+      by Ansible and building C(query_result). With I(output_file),
+      the time spent on writing the file is returned in C(write_ms).
+    - Retried transactions are included.
+  returned: if I(timings=true)
+  type: dict
+  sample: {"connect_ms": 8.412, "execute_ms": 3.208, "fetch_ms": 44.718, "convert_ms": 12.04,
+           "total_ms": 70.53, "rows": 10000, "connections": 1, "bytes_sent": 506, "bytes_received": 218094}
+  version_added: '0.4.0'
 '''
 
+import binascii
+import csv
 import datetime
 import decimal
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+
+from collections import OrderedDict
+from itertools import chain, islice
+from timeit import default_timer
 
 try:
     from psycopg2 import ProgrammingError as Psycopg2ProgrammingError
+    from psycopg2.extras import execute_values
 except ImportError:
     # it is needed for checking 'no result to fetch' in main(),
     # psycopg2 availability will be checked by connect_to_db() into
@@ -143,17 +688,75 @@ except ImportError:
     pass
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils._text import to_native
-from ansible.module_utils.six import iteritems
+from ansible.module_utils._text import to_bytes, to_native
+from ansible.module_utils.six import PY3, iteritems
 
 from ansible_collections.community.cockroachdb.plugins.module_utils.cockroachdb import (
     common_argument_spec,
     CockroachDBServer,
+    get_as_of_system_time,
     get_conn_params,
+    is_read_only_statement,
+    is_retry_error,
 )
 
 TYPES_NEED_TO_CONVERT = (decimal.Decimal, datetime.timedelta)
 
+# Types of bytea values written to output_file, str is bytes on Python 2
+BINARY_TYPES = (bytes, bytearray, memoryview) if PY3 else (bytearray, memoryview)
+
+# Name of a server-side cursor used when server_side_cursor=true
+SERVER_SIDE_CURSOR_NAME = 'ansible_cockroachdb_query'
+
+# Name of a savepoint used when transaction=true and continue_on_error=true
+QUERIES_SAVEPOINT_NAME = 'ansible_cockroachdb_query'
+
+# Size of a buffer used when writing rows to output_file
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+# Prefix of names of prepared statements used with args_list
+PREPARED_STATEMENT_PREFIX = 'ansible_cockroachdb_query_'
+
+# Maximum number of prepared statements kept on the connection,
+# the least recently used one is deallocated when it is exceeded
+PREPARED_STATEMENTS_CACHE_SIZE = 16
+
+# Placeholders of psycopg2 and escaped percent signs
+PLACEHOLDER_RE = re.compile(r'%(?:\((\w+)\))?s|%%')
+
+# Statements prepended to the query by the explain option
+EXPLAIN_STATEMENTS = {
+    'plan': 'EXPLAIN ',
+    'analyze': 'EXPLAIN ANALYZE ',
+    'analyze_distsql': 'EXPLAIN ANALYZE (DISTSQL) ',
+}
+
+# Characters drawing the plan tree before the lines of operators
+EXPLAIN_TREE_CHARS = u' \u2502\u2514\u251c\u2500'
+
+# Durations in the Go format, for example, 1m2.5s or 345\u00b5s (microseconds)
+DURATION_RE = re.compile(u'([0-9.]+)(ns|us|\u00b5s|\u03bcs|ms|s|m|h)')
+DURATION_UNITS_MS = {
+    'ns': 0.000001,
+    'us': 0.001,
+    u'\u00b5s': 0.001,
+    u'\u03bcs': 0.001,
+    'ms': 1,
+    's': 1000,
+    'm': 60 * 1000,
+    'h': 60 * 60 * 1000,
+}
+
+# Sizes, for example, 24 B or 1.5 MiB
+SIZE_RE = re.compile(r'([\d.]+) ?(B|KiB|MiB|GiB|TiB|PiB)\b')
+SIZE_UNITS = ['B', 'KiB', 'MiB', 'GiB', 'TiB', 'PiB']
+
+# Rows and bytes read, for example, "3 (24 B)" or "3 (24 B, 1 gRPC calls)"
+ROWS_READ_RE = re.compile(r'^([\d,]+) \(([^,)]+)')
+
+# Network usage, for example, "1.2 KiB (4 messages)"
+NETWORK_USAGE_RE = re.compile(r'^([^(]+) \(([\d,]+) messages?\)')
+
 
 def convert_to_supported(val):
     """Convert unsupported type to appropriate.
@@ -172,14 +775,156 @@ def convert_to_supported(val):
     return val  # By default returns the same value
 
 
-def fetch_from_cursor_dict(cursor):
+def convert_bytes(val):
+    """Convert a bytea value to its hex representation, e.g. '\\x616263'."""
+    return '\\x' + to_native(binascii.hexlify(val))
+
+
+def array_converter(convert):
+    """Return a function applying convert to every element of a (multidimensional) array."""
+    def convert_array(val):
+        return [convert_array(v) if isinstance(v, list) else
+                (convert(v) if v is not None else None) for v in val]
+
+    return convert_array
+
+
+# Converters of values Ansible cannot serialize indexed by type OIDs.
+# Values of other types, including json and jsonb which psycopg2
+# decodes into Python objects by itself, are returned as is.
+CONVERTERS = {
+    1700: float,  # numeric
+    1186: str,  # interval
+    17: convert_bytes,  # bytea
+    2950: to_native,  # uuid
+    869: to_native,  # inet
+    1231: array_converter(float),  # numeric[]
+    1187: array_converter(str),  # interval[]
+    1001: array_converter(convert_bytes),  # bytea[]
+    2951: array_converter(to_native),  # uuid[]
+    1041: array_converter(to_native),  # inet[]
+}
+
+
+# Names of PostgreSQL types returned in columns by type OIDs
+TYPE_NAMES = {
+    16: 'bool',
+    17: 'bytea',
+    20: 'int8',
+    21: 'int2',
+    23: 'int4',
+    25: 'text',
+    26: 'oid',
+    114: 'json',
+    700: 'float4',
+    701: 'float8',
+    869: 'inet',
+    1000: '_bool',
+    1001: '_bytea',
+    1005: '_int2',
+    1007: '_int4',
+    1009: '_text',
+    1016: '_int8',
+    1021: '_float4',
+    1022: '_float8',
+    1041: '_inet',
+    1043: 'varchar',
+    1082: 'date',
+    1083: 'time',
+    1114: 'timestamp',
+    1115: '_timestamp',
+    1182: '_date',
+    1184: 'timestamptz',
+    1185: '_timestamptz',
+    1186: 'interval',
+    1187: '_interval',
+    1231: '_numeric',
+    1560: 'bit',
+    1562: 'varbit',
+    1700: 'numeric',
+    2950: 'uuid',
+    2951: '_uuid',
+    3802: 'jsonb',
+}
+
+
+def get_columns(description):
+    """Get names and types of columns returned with rows_type=columnar.
+
+    Args:
+        description (sequence) -- Value of the cursor.description attribute.
+
+    Returns a list of dictionaries containing the name and the type of each column,
+    the type is None if it is not in TYPE_NAMES.
+    """
+    if description is None:
+        return []
+
+    return [dict(name=column[0], type=TYPE_NAMES.get(column[1])) for column in description]
+
+
+def get_converters(description):
+    """Get converters for columns which values need to be converted.
+
+    Args:
+        description (sequence) -- Value of the cursor.description attribute.
+
+    Returns a list of (column index, converter function) tuples
+    containing only the columns that need conversion.
+    """
+    converters = []
+    for i, column in enumerate(description):
+        convert = CONVERTERS.get(column[1])
+        if convert is not None:
+            converters.append((i, convert))
+
+    return converters
+
+
+def convert_rows(rows, converters):
+    """Apply converters returned by get_converters() to rows.
+
+    Args:
+        rows (iterable) -- Rows fetched from cursor.
+        converters (list) -- List of (column index, converter function) tuples.
+
+    Returns the passed rows as is when there is nothing to convert,
+    otherwise a generator of lists containing converted values.
+    """
+    if not converters:
+        return rows
+
+    def generate():
+        for row in rows:
+            row = list(row)
+            for i, convert in converters:
+                val = row[i]
+                if val is not None:
+                    row[i] = convert(val)
+
+            yield row
+
+    return generate()
+
+
+def fetch_from_cursor_dict(cursor, description=None):
     """Fetch rows from cursor handling unsupported types.
 
     Args:
         cursor (cursor): Cursor object of a database Python connector.
 
+    Kwargs:
+        description (sequence) -- Value of the cursor.description attribute.
+            If passed, values are converted according to column types,
+            otherwise every value is checked (default None).
+
     Returns query_result list containing dictionaries.
     """
+    if description is not None:
+        names = [column[0] for column in description]
+        rows = convert_rows(cursor, get_converters(description))
+        return [dict(zip(names, row)) for row in rows]
+
     query_result = []
     for row in cursor:
         # Ansible engine does not support some types like decimals and timedelta.
@@ -194,14 +939,23 @@ def fetch_from_cursor_dict(cursor):
     return query_result
 
 
-def fetch_from_cursor_tuple(cursor):
+def fetch_from_cursor_tuple(cursor, description=None):
     """Fetch rows from cursor handling unsupported types.
 
     Args:
         cursor (cursor): Cursor object of a database Python connector.
 
+    Kwargs:
+        description (sequence) -- Value of the cursor.description attribute.
+            If passed, values are converted according to column types,
+            otherwise every value is checked (default None).
+
     Returns query_result list containing tuples.
     """
+    if description is not None:
+        rows = convert_rows(cursor, get_converters(description))
+        return [tuple(row) for row in rows]
+
     query_result = []
     for row in cursor:
         # Ansible engine does not support some types like decimals and timedelta.
@@ -217,6 +971,788 @@ def fetch_from_cursor_tuple(cursor):
     return query_result
 
 
+def fetch_from_cursor_columnar(cursor, description=None):
+    """Fetch rows from cursor handling unsupported types.
+
+    Args:
+        cursor (cursor): Cursor object of a database Python connector.
+
+    Kwargs:
+        description (sequence) -- Value of the cursor.description attribute.
+            If passed, values are converted according to column types,
+            otherwise every value is checked (default None).
+
+    Returns query_result list containing lists of values,
+    the columns are returned by get_columns().
+    """
+    if description is None:
+        return [list(row) for row in fetch_from_cursor_tuple(cursor)]
+
+    converters = get_converters(description)
+    if not converters:
+        return [list(row) for row in cursor]
+
+    # convert_rows() already yields lists
+    return list(convert_rows(cursor, converters))
+
+
+def iter_cursor(cursor, fetch_size=None, max_rows=None):
+    """Iterate over rows of cursor fetching them in chunks.
+
+    Args:
+        cursor (cursor): Cursor object of a database Python connector.
+
+    Kwargs:
+        fetch_size (int) -- Number of rows to fetch at once. If not passed,
+            the cursor is iterated directly (default None).
+        max_rows (int) -- Maximum number of rows to yield (default None).
+
+    Yields rows one by one.
+    """
+    if not fetch_size:
+        rows = iter(cursor)
+        if max_rows is not None:
+            rows = islice(rows, max_rows)
+
+        for row in rows:
+            yield row
+
+        return
+
+    fetched = 0
+    while max_rows is None or fetched < max_rows:
+        size = fetch_size
+        if max_rows is not None:
+            size = min(fetch_size, max_rows - fetched)
+
+        chunk = cursor.fetchmany(size)
+        if not chunk:
+            break
+
+        for row in chunk:
+            yield row
+
+        fetched += len(chunk)
+
+
+class OutputFileWriter():
+    """File-like object writing text to a binary file.
+
+    Keeps track of the number of written bytes and their SHA1 checksum,
+    so that the file does not need to be read again to get them.
+
+    Args:
+        f (file) -- File object opened in binary mode.
+    """
+    def __init__(self, f):
+        self.f = f
+        self.size = 0
+        self.sha1 = hashlib.sha1()
+
+    def write(self, data):
+        data = to_bytes(data, errors='surrogate_or_strict')
+        self.f.write(data)
+        self.sha1.update(data)
+        self.size += len(data)
+
+
+def json_default(val):
+    """Convert a value json.dumps() cannot serialize.
+
+    Args:
+        val (any) -- Any value fetched from database.
+
+    Returns a JSON serializable value.
+    """
+    if isinstance(val, TYPES_NEED_TO_CONVERT):
+        return convert_to_supported(val)
+
+    if isinstance(val, BINARY_TYPES):
+        return convert_bytes(val)
+
+    if hasattr(val, 'isoformat'):
+        # date, time and datetime objects
+        return val.isoformat()
+
+    return to_native(val)
+
+
+def csv_value(val):
+    """Convert a value to be written to a CSV cell.
+
+    Args:
+        val (any) -- Any value fetched from database.
+
+    Returns a value csv.writer() writes the same way as it is returned in JSON.
+    """
+    if isinstance(val, bool):
+        return 'true' if val else 'false'
+
+    if isinstance(val, BINARY_TYPES):
+        return convert_bytes(val)
+
+    if isinstance(val, (dict, list)):
+        # json, jsonb and array values
+        return json.dumps(val, default=json_default)
+
+    return val
+
+
+def write_rows_to_file(module, rows, path, output_format, columns, rows_type='dict'):
+    """Write rows to a file as they come.
+
+    The rows are written to a temporary file in the destination directory
+    which is then moved to the destination path.
+
+    Args:
+        module (AnsibleModule) -- Object of ansible.module_utils.basic.AnsibleModule class.
+        rows (iterable) -- Rows to write, each of them is a sequence of column values.
+        path (str) -- Destination path.
+        output_format (str) -- Either "csv" or "jsonl".
+        columns (list) -- Column names.
+
+    Kwargs:
+        rows_type (str) -- If "dict", JSON lines contain objects,
+            otherwise arrays (default "dict").
+
+    Returns a dictionary containing the path, the number of written rows,
+    the size of the file and its checksum.
+    """
+    dest_dir = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(dest_dir):
+        module.fail_json(msg='Destination directory %s does not exist' % dest_dir)
+
+    fd, tmp_path = tempfile.mkstemp(prefix='.ansible_tmp', dir=dest_dir)
+    row_count = 0
+    try:
+        with os.fdopen(fd, 'wb', OUTPUT_BUFFER_SIZE) as f:
+            writer = OutputFileWriter(f)
+
+            if output_format == 'csv':
+                csv_writer = csv.writer(writer)
+                csv_writer.writerow(columns)
+                for row in rows:
+                    csv_writer.writerow([csv_value(val) for val in row])
+                    row_count += 1
+
+            else:
+                for row in rows:
+                    if rows_type == 'dict':
+                        row = dict(zip(columns, row))
+                    else:
+                        row = list(row)
+
+                    writer.write(json.dumps(row, default=json_default))
+                    writer.write('\n')
+                    row_count += 1
+
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+    module.atomic_move(tmp_path, path)
+
+    return dict(
+        path=path,
+        rows=row_count,
+        size=writer.size,
+        checksum=writer.sha1.hexdigest(),
+    )
+
+
+def read_rows_file(module, path, rows_format, null=None):
+    """Read rows from a file line by line.
+
+    Args:
+        module (AnsibleModule) -- Object of ansible.module_utils.basic.AnsibleModule class.
+        path (str) -- Path to the file.
+        rows_format (str) -- Either "csv" or "jsonl".
+
+    Kwargs:
+        null (str) -- String representing NULL in CSV files, if None,
+            all the fields are returned as strings (default None).
+
+    Yields rows one by one.
+    """
+    try:
+        f = io.open(path, 'r', newline='', encoding='utf-8')
+    except (IOError, OSError) as e:
+        module.fail_json(msg='Cannot open %s: %s' % (path, to_native(e)))
+
+    with f:
+        if rows_format == 'csv':
+            for row in csv.DictReader(f):
+                if null is not None:
+                    for key in row:
+                        if row[key] == null:
+                            row[key] = None
+
+                yield row
+
+            return
+
+        for num, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                module.fail_json(msg='Cannot parse line %s of %s: %s' % (num, path, to_native(e)))
+
+            yield row
+
+
+def iter_batches(rows, batch_size):
+    """Split rows into batches.
+
+    Args:
+        rows (iterable) -- Rows to split.
+        batch_size (int) -- Maximum number of rows in a batch.
+
+    Yields lists of rows.
+    """
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def get_values_template(row):
+    """Get a template of a row for psycopg2.extras.execute_values().
+
+    Args:
+        row (list|dict) -- Row to insert.
+
+    Returns None for sequences, so that execute_values() uses its default,
+    or a template containing named placeholders for dictionaries.
+    """
+    if isinstance(row, dict):
+        return '(%s)' % ', '.join('%%(%s)s' % key for key in row)
+
+    return None
+
+
+def execute_batches(module, cursor, query, rows, batch_size, fetch_from_cursor):
+    """Execute query with a multi-row VALUES list for each batch of rows.
+
+    Args:
+        module (AnsibleModule) -- Object of ansible.module_utils.basic.AnsibleModule class.
+        cursor (cursor): Cursor object of a database Python connector.
+        query (str) -- Query containing a single %s placeholder for the VALUES list.
+        rows (iterable) -- Rows to pass to the query.
+        batch_size (int) -- Number of rows to send in one statement.
+        fetch_from_cursor (function) -- Function to fetch rows from cursor
+            when the query returns any, for example, with a RETURNING clause.
+
+    Returns a tuple (
+        statusmessage (str) -- Status message of the last batch, for example, "INSERT 0 10".
+        rowcount (int) -- Total number of affected rows.
+        query_result (list) -- Rows returned by all the batches.
+        batches (list) -- List of dictionaries describing each batch.
+    )
+    """
+    statusmessage = None
+    rowcount = 0
+    query_result = []
+    batches = []
+
+    for batch in iter_batches(rows, batch_size):
+        start = default_timer()
+        try:
+            execute_values(cursor, query, batch,
+                           template=get_values_template(batch[0]),
+                           page_size=len(batch))
+
+            if cursor.description is not None:
+                query_result.extend(fetch_from_cursor(cursor, cursor.description))
+
+        except Exception as e:
+            if is_retry_error(e):
+                raise
+
+            module.fail_json(msg='Cannot execute batch %s of query "%s": %s' % (len(batches) + 1, query, to_native(e)),
+                             rowcount=rowcount, batches=batches)
+
+        statusmessage = cursor.statusmessage
+        if cursor.rowcount > 0:
+            rowcount += cursor.rowcount
+
+        batches.append(dict(
+            rows=len(batch),
+            rowcount=cursor.rowcount,
+            duration_ms=round((default_timer() - start) * 1000, 3),
+        ))
+
+    return statusmessage, rowcount, query_result, batches
+
+
+def execute_queries(module, cursor, queries, fetch_from_cursor,
+                    continue_on_error=False, transaction=False, statements=None, columns=False):
+    """Execute queries one by one.
+
+    Args:
+        module (AnsibleModule) -- Object of ansible.module_utils.basic.AnsibleModule class.
+        cursor (cursor): Cursor object of a database Python connector.
+        queries (list) -- List of dictionaries containing the query,
+            positional_args, named_args and args_list keys.
+        fetch_from_cursor (function) -- Function to fetch rows from cursor.
+
+    Kwargs:
+        continue_on_error (bool) -- Run the next queries if a query fails (default False).
+        transaction (bool) -- The queries are run in a transaction (default False).
+            When continue_on_error is True, each query is run within a savepoint
+            to roll back only the changes of the failed query.
+        statements (PreparedStatements) -- Cache of prepared statements
+            used for queries with args_list (default a new one).
+        columns (bool) -- Add the columns returned by get_columns()
+            to the results (default False).
+
+    Returns a list of dictionaries describing the executed queries.
+    The processing stops after the first failed query when continue_on_error is False.
+    Transaction retry errors are raised when transaction is True
+    as the whole transaction must be retried in this case.
+    """
+    use_savepoints = transaction and continue_on_error
+    if statements is None:
+        statements = PreparedStatements(cursor)
+
+    results = []
+    for item in queries:
+        query = item['query']
+        args = get_args(item.get('positional_args'), item.get('named_args'))
+
+        result = dict(query=query, statusmessage=None, rowcount=None, query_result=[])
+        if columns:
+            result['columns'] = []
+
+        start = default_timer()
+        try:
+            if use_savepoints:
+                cursor.execute('SAVEPOINT %s' % QUERIES_SAVEPOINT_NAME)
+
+            if item.get('args_list') is not None:
+                result.update(execute_args_list(module, cursor, statements, query,
+                                                item['args_list'], fetch_from_cursor))
+            else:
+                # Bind the arguments once to both execute and return the query
+                statement = cursor.mogrify(query, args)
+                result['query'] = render_query(module, statement)
+                cursor.execute(statement)
+                result['statusmessage'] = cursor.statusmessage
+                result['rowcount'] = cursor.rowcount
+
+                if cursor.description is not None:
+                    result['query_result'] = fetch_from_cursor(cursor, cursor.description)
+
+            if columns:
+                result['columns'] = get_columns(cursor.description)
+
+            if use_savepoints:
+                cursor.execute('RELEASE SAVEPOINT %s' % QUERIES_SAVEPOINT_NAME)
+
+        except Exception as e:
+            if transaction and is_retry_error(e):
+                raise
+
+            result['error'] = to_native(e)
+
+            if use_savepoints:
+                try:
+                    cursor.execute('ROLLBACK TO SAVEPOINT %s' % QUERIES_SAVEPOINT_NAME)
+                except Exception as e:
+                    module.fail_json(msg='Cannot roll back to savepoint after '
+                                         'query "%s" failed: %s' % (query, to_native(e)),
+                                     results=results + [result])
+
+        result['duration_ms'] = round((default_timer() - start) * 1000, 3)
+        results.append(result)
+
+        if 'error' in result and not continue_on_error:
+            break
+
+    return results
+
+
+def to_prepared_query(query):
+    """Replace psycopg2 placeholders in a query with PostgreSQL ones.
+
+    Args:
+        query (str) -- Query containing %s or %(name)s placeholders.
+
+    Returns a tuple (
+        prepared_query (str) -- Query containing $1, $2, ... placeholders.
+        names (list) -- Names of the placeholders in the order of their numbers
+            for named placeholders, None for positional ones.
+        count (int) -- Number of the parameters.
+    )
+
+    Raises ValueError if the query mixes positional and named placeholders.
+    """
+    names = []
+    positions = {}
+    styles = set()
+
+    def replace(match):
+        if match.group(0) == '%%':
+            return '%'
+
+        name = match.group(1)
+        if name is None:
+            styles.add('positional')
+            names.append(None)
+            return '$%d' % len(names)
+
+        styles.add('named')
+        if name not in positions:
+            names.append(name)
+            positions[name] = len(names)
+
+        return '$%d' % positions[name]
+
+    prepared_query = PLACEHOLDER_RE.sub(replace, query)
+    if len(styles) > 1:
+        raise ValueError('positional and named placeholders cannot be mixed')
+
+    return prepared_query, (names if 'named' in styles else None), len(names)
+
+
+class PreparedStatements():
+    """Cache of statements prepared on a connection.
+
+    Statements are keyed by the normalized text of the prepared query
+    and the names of its parameters, so queries differing only in
+    surrounding whitespace or a trailing semicolon share a statement. When there are more than size statements,
+    the least recently used one is deallocated.
+
+    Args:
+        cursor (cursor): Cursor object of a database Python connector.
+
+    Kwargs:
+        size (int) -- Maximum number of prepared statements (default 16).
+    """
+    # Number of statements prepared by all objects,
+    # so that the names are unique on the connection
+    counter = 0
+
+    def __init__(self, cursor, size=PREPARED_STATEMENTS_CACHE_SIZE):
+        self.cursor = cursor
+        self.size = size
+        # (name, names, count) tuples by (prepared query, names) keys
+        self.statements = OrderedDict()
+
+    def prepare(self, query):
+        """Prepare a query unless it has already been prepared.
+
+        Returns a tuple (
+            name (str) -- Name of the prepared statement.
+            names (list) -- Names of the parameters returned by to_prepared_query().
+            count (int) -- Number of the parameters.
+            prepared (bool) -- True if the statement was prepared now,
+                False if it was taken from the cache.
+        )
+        """
+        prepared_query, names, count = to_prepared_query(query)
+        prepared_query = prepared_query.strip().rstrip(';').strip()
+        # The same statement can be passed positional or named arguments
+        key = (prepared_query, tuple(names) if names is not None else None)
+
+        if key in self.statements:
+            # Mark the statement as the most recently used one
+            statement = self.statements.pop(key)
+            self.statements[key] = statement
+            return statement + (False,)
+
+        PreparedStatements.counter += 1
+        name = '%s%d' % (PREPARED_STATEMENT_PREFIX, PreparedStatements.counter)
+        self.cursor.execute('PREPARE %s AS %s' % (name, prepared_query))
+
+        self.statements[key] = (name, names, count)
+        if len(self.statements) > self.size:
+            evicted = self.statements.pop(next(iter(self.statements)))
+            self.cursor.execute('DEALLOCATE %s' % evicted[0])
+
+        return name, names, count, True
+
+    def execute(self, name, names, count, args):
+        """Execute a prepared statement with a set of arguments.
+
+        Args:
+            name, names, count -- Values returned by prepare().
+            args (list|dict) -- Positional or named arguments.
+        """
+        if names is None:
+            if not isinstance(args, (list, tuple)) or len(args) != count:
+                raise ValueError('expected a list of %d positional arguments, got %r' % (count, args))
+
+            values = list(args)
+        else:
+            if not isinstance(args, dict):
+                raise ValueError('expected a dictionary of named arguments, got %r' % (args,))
+
+            missing = [n for n in names if n not in args]
+            if missing:
+                raise ValueError('missing named arguments: %s' % ', '.join(missing))
+
+            values = [args[n] for n in names]
+
+        if values:
+            placeholders = ', '.join(['%s'] * len(values))
+            self.cursor.execute(self.cursor.mogrify('EXECUTE %s (%s)' % (name, placeholders), values))
+        else:
+            self.cursor.execute('EXECUTE %s' % name)
+
+
+def execute_args_list(module, cursor, statements, query, args_list, fetch_from_cursor):
+    """Execute a query with every set of arguments from a list
+    preparing it once.
+
+    Args:
+        module (AnsibleModule) -- Object of ansible.module_utils.basic.AnsibleModule class.
+        cursor (cursor): Cursor object of a database Python connector.
+        statements (PreparedStatements) -- Cache of prepared statements.
+        query (str) -- Query to execute.
+        args_list (list) -- List of positional (lists) or named (dictionaries) arguments.
+        fetch_from_cursor (function) -- Function to fetch rows from cursor.
+
+    Returns a dictionary containing the query, statusmessage of the last execution,
+    the total rowcount, query_result with the rows of all the executions,
+    executions with statusmessage, rowcount and duration_ms of each execution,
+    and execution_stats with the aggregated durations.
+
+    Exceptions are raised to let the caller handle them.
+    """
+    start = default_timer()
+    name, names, count, prepared = statements.prepare(query)
+    prepare_ms = round((default_timer() - start) * 1000, 3)
+
+    result = dict(query=render_query(module, query), statusmessage=None, rowcount=0,
+                  query_result=[], executions=[])
+
+    for args in args_list:
+        start = default_timer()
+        statements.execute(name, names, count, args)
+        if cursor.description is not None:
+            result['query_result'].extend(fetch_from_cursor(cursor, cursor.description))
+
+        result['executions'].append(dict(
+            statusmessage=cursor.statusmessage,
+            rowcount=cursor.rowcount,
+            duration_ms=round((default_timer() - start) * 1000, 3),
+        ))
+        result['statusmessage'] = cursor.statusmessage
+        if cursor.rowcount > 0:
+            result['rowcount'] += cursor.rowcount
+
+    durations = [e['duration_ms'] for e in result['executions']]
+    result['execution_stats'] = dict(
+        prepared=prepared,
+        prepare_ms=prepare_ms,
+        count=len(durations),
+        total_ms=round(sum(durations), 3),
+        min_ms=min(durations) if durations else None,
+        mean_ms=round(sum(durations) / len(durations), 3) if durations else None,
+        max_ms=max(durations) if durations else None,
+    )
+
+    return result
+
+
+def parse_duration(val):
+    """Parse a duration in the Go format returned by EXPLAIN ANALYZE.
+
+    Returns the duration in milliseconds or None if it cannot be parsed.
+    """
+    parts = DURATION_RE.findall(val)
+    if not parts:
+        return None
+
+    return round(sum(float(num) * DURATION_UNITS_MS[unit] for num, unit in parts), 6)
+
+
+def parse_size(val):
+    """Parse a size like 1.5 MiB returned by EXPLAIN ANALYZE.
+
+    Returns the size in bytes or None if it cannot be parsed.
+    """
+    match = SIZE_RE.search(val)
+    if match is None:
+        return None
+
+    return int(float(match.group(1)) * 1024 ** SIZE_UNITS.index(match.group(2)))
+
+
+def parse_explain(lines):
+    """Parse the output of EXPLAIN or EXPLAIN ANALYZE.
+
+    Args:
+        lines (list) -- Values of the info column returned by EXPLAIN.
+
+    Returns a dictionary of the plan and its statistics.
+    Statistics missing in the output, for example, because
+    the statement was not executed by EXPLAIN, are None.
+    """
+    explain = dict(
+        plan=[],
+        distribution=None,
+        vectorized=None,
+        planning_time_ms=None,
+        execution_time_ms=None,
+        total_latency_ms=None,
+        rows_read=None,
+        bytes_read=None,
+        network_bytes=None,
+        network_messages=None,
+        max_memory_bytes=None,
+        full_scans=[],
+        nodes=[],
+        regions=[],
+        diagram_urls=[],
+    )
+
+    nodes = set()
+    regions = set()
+    # Lines before the first operator of the plan tree contain
+    # the statistics of the whole statement
+    in_tree = False
+    table = None
+
+    for line in lines:
+        if line.startswith('Diagram'):
+            explain['diagram_urls'].append(line.split(': ', 1)[-1].strip())
+            continue
+
+        explain['plan'].append(line)
+
+        line = line.strip().lstrip(EXPLAIN_TREE_CHARS)
+        if line.startswith(u'\u2022'):
+            # An operator of the plan tree
+            in_tree = True
+            table = None
+            continue
+
+        key, sep, val = line.partition(': ')
+        if not sep:
+            continue
+
+        if key == 'nodes':
+            nodes.update(int(node.strip().lstrip('n')) for node in val.split(',')
+                         if node.strip().lstrip('n').isdigit())
+
+        elif key == 'regions':
+            regions.update(region.strip() for region in val.split(','))
+
+        elif key == 'table':
+            table = val
+
+        elif key == 'spans' and val.startswith('FULL SCAN'):
+            explain['full_scans'].append(table)
+
+        elif in_tree:
+            continue
+
+        elif key == 'distribution':
+            explain['distribution'] = val
+
+        elif key == 'vectorized':
+            explain['vectorized'] = val == 'true'
+
+        elif key == 'planning time':
+            explain['planning_time_ms'] = parse_duration(val)
+
+        elif key == 'execution time':
+            explain['execution_time_ms'] = parse_duration(val)
+
+        elif key in ('rows read from KV', 'rows decoded from KV'):
+            match = ROWS_READ_RE.match(val)
+            if match:
+                explain['rows_read'] = int(match.group(1).replace(',', ''))
+                explain['bytes_read'] = parse_size(match.group(2))
+
+        elif key == 'maximum memory usage':
+            explain['max_memory_bytes'] = parse_size(val)
+
+        elif key == 'network usage':
+            match = NETWORK_USAGE_RE.match(val)
+            if match:
+                explain['network_bytes'] = parse_size(match.group(1))
+                explain['network_messages'] = int(match.group(2).replace(',', ''))
+
+    if explain['planning_time_ms'] is not None and explain['execution_time_ms'] is not None:
+        explain['total_latency_ms'] = round(explain['planning_time_ms'] + explain['execution_time_ms'], 6)
+
+    explain['nodes'] = sorted(nodes)
+    explain['regions'] = sorted(regions)
+    return explain
+
+
+def explain_query(module, cursor, query, args, mode):
+    """Run EXPLAIN of a query and parse its output.
+
+    Args:
+        module (AnsibleModule) -- Object of ansible.module_utils.basic.AnsibleModule class.
+        cursor (cursor): Cursor object of a database Python connector.
+        query (str) -- Query to explain.
+        args (dict|tuple) -- Data structure to pass to cursor.execute as query parameters.
+        mode (str) -- Value of the explain option.
+
+    Returns a tuple (
+        executed_query (str) -- EXPLAIN statement containing substituted arguments.
+        explain (dict) -- Dictionary returned by parse_explain() with the mode key added.
+    )
+
+    Transaction retry errors are raised to let the caller retry the transaction.
+    """
+    statement = EXPLAIN_STATEMENTS[mode] + query
+    try:
+        statement = cursor.mogrify(statement, args)
+        executed_query = render_query(module, statement)
+        cursor.execute(statement)
+        lines = [row[0] for row in cursor.fetchall()]
+
+    except Exception as e:
+        if is_retry_error(e):
+            raise
+
+        module.fail_json(msg='Cannot explain query "%s": %s' % (query, to_native(e)))
+
+    explain = parse_explain(lines)
+    explain['mode'] = mode
+    return executed_query, explain
+
+
+def render_query(module, query):
+    """Get the text of an executed query to return to users.
+
+    Args:
+        module (AnsibleModule) -- Object of ansible.module_utils.basic.AnsibleModule class.
+        query (bytes|str) -- Query with substituted arguments returned by cursor.mogrify().
+
+    Returns None if return_query is False, otherwise the query text
+    truncated to query_max_length characters if it is longer.
+    """
+    if not module.params['return_query']:
+        return None
+
+    max_length = module.params['query_max_length']
+    if max_length and len(query) > max_length:
+        # A UTF-8 character takes up to 4 bytes, so decode only the needed part.
+        # A character cut at the end is removed when the text is truncated
+        if isinstance(query, bytes):
+            query = to_native(query[:max_length * 4], errors='surrogate_or_replace')
+
+        if len(query) > max_length:
+            return query[:max_length] + '...'
+
+    return to_native(query)
+
+
 def get_args(positional_args, named_args):
     """Get arguments to pass them to cursor.execute() later.
 
@@ -232,7 +1768,7 @@ def get_args(positional_args, named_args):
         return None
 
 
-def execute(module, cursor, query, args, fetch_from_cursor):
+def execute(module, cursor, query, args, fetch_from_cursor, fetch_size=None, max_rows=None):
     """Execute query in CockroachDB database.
 
     Args:
@@ -242,35 +1778,76 @@ def execute(module, cursor, query, args, fetch_from_cursor):
         args (dict|tuple) -- Data structure to pass to cursor.execute as query parameters.
         fetch_from_cursor (function) -- Function to fetch rows from cursor.
 
+    Kwargs:
+        fetch_size (int) -- Number of rows to fetch from cursor at once (default None).
+        max_rows (int) -- Maximum number of rows to fetch (default None).
+
     Returns a tuple (
         statusmessage (str) -- Status message returned by psycopg2, for example, "SELECT 1".
         rowcount (int) -- Number of rows fetched, for example, 1.
+        executed_query (str) -- Query returned by render_query().
         query_result (list) -- List that contains lists [[col1_val, col2_val, ...], [...]].
     )
+
+    Transaction retry errors are raised to let the caller retry the transaction.
     """
     statusmessage = None
     rowcount = None
+    executed_query = None
     query_result = []
     try:
-        mogrified_query = cursor.mogrify(query, args)
-        cursor.execute(query, args)
+        # Bind the arguments once to both execute and return the query,
+        # psycopg2 does not process the statement again without arguments
+        statement = cursor.mogrify(query, args)
+        executed_query = render_query(module, statement)
+        cursor.execute(statement)
         statusmessage = cursor.statusmessage
         rowcount = cursor.rowcount
 
         try:
-            query_result = fetch_from_cursor(cursor)
+            rows = iter_cursor(cursor, fetch_size, max_rows)
+            # Server-side cursors get description only after
+            # the first fetch, so pull the first row in advance
+            rows = chain(list(islice(rows, 1)), rows)
+            query_result = fetch_from_cursor(rows, getattr(cursor, 'description', None))
 
         except Psycopg2ProgrammingError as e:
             if to_native(e) == 'no results to fetch':
                 pass
 
         except Exception as e:
+            if is_retry_error(e):
+                raise
+
             module.fail_json(msg='Cannot fetch rows from cursor: %s' % to_native(e))
 
     except Exception as e:
+        if is_retry_error(e):
+            raise
+
         module.fail_json(msg='Cannot execute query "%s": %s' % (query, to_native(e)))
 
-    return statusmessage, rowcount, mogrified_query, query_result
+    return statusmessage, rowcount, executed_query, query_result
+
+
+def commit_transaction(module, conn, retries):
+    """Commit a transaction.
+
+    Args:
+        module (AnsibleModule) -- Object of ansible.module_utils.basic.AnsibleModule class.
+        conn (psycopg2.connection) -- Connection to commit.
+        retries (int) -- Number of retries made so far, returned on failure.
+
+    Retry errors are raised for the whole transaction to be retried,
+    the module fails on other errors.
+    """
+    try:
+        conn.commit()
+    except Exception as e:
+        if is_retry_error(e):
+            raise
+
+        module.fail_json(msg='Cannot commit transaction: %s' % to_native(e), retries=retries)
 
 
 def main():
@@ -280,13 +1857,47 @@ def main():
         query=dict(type='str'),
         positional_args=dict(type='list', elements='raw'),
         named_args=dict(type='dict'),
-        rows_type=dict(type='str', choices=['dict', 'tuple'], default='dict'),
+        args_list=dict(type='list', elements='raw'),
+        rows_type=dict(type='str', choices=['dict', 'tuple', 'columnar'], default='dict'),
+        server_side_cursor=dict(type='bool', default=False),
+        fetch_size=dict(type='int', default=1000),
+        max_rows=dict(type='int'),
+        output_file=dict(type='path'),
+        output_format=dict(type='str', choices=['csv', 'jsonl'], default='jsonl'),
+        rows=dict(type='list', elements='raw'),
+        rows_file=dict(type='path'),
+        rows_file_format=dict(type='str', choices=['csv', 'jsonl'], default='jsonl'),
+        rows_file_null=dict(type='str'),
+        batch_size=dict(type='int', default=1000),
+        queries=dict(
+            type='list',
+            elements='dict',
+            options=dict(
+                query=dict(type='str', required=True),
+                positional_args=dict(type='list', elements='raw'),
+                named_args=dict(type='dict'),
+                args_list=dict(type='list', elements='raw'),
+            ),
+            mutually_exclusive=(('positional_args', 'named_args', 'args_list'),),
+        ),
+        transaction=dict(type='bool', default=False),
+        continue_on_error=dict(type='bool', default=False),
+        max_retries=dict(type='int', default=0),
+        retry_max_time=dict(type='float', default=60),
+        explain=dict(type='str', choices=list(EXPLAIN_STATEMENTS)),
+        as_of_system_time=dict(type='str'),
+        return_query=dict(type='bool', default=True),
+        query_max_length=dict(type='int', default=0),
     )
 
     # Instantiate an object of module class
     module = AnsibleModule(
         argument_spec=argument_spec,
-        mutually_exclusive=(('positional_args', 'named_args'),),
+        mutually_exclusive=(
+            ('positional_args', 'named_args', 'args_list', 'rows', 'rows_file', 'queries'),
+            ('rows', 'rows_file', 'output_file', 'queries'),
+            ('query', 'queries'),
+        ),
         supports_check_mode=False,
     )
 
@@ -294,40 +1905,267 @@ def main():
     query = module.params['query']
     positional_args = module.params['positional_args']
     named_args = module.params['named_args']
+    args_list = module.params['args_list']
     rows_type = module.params['rows_type']
-
-    # Connect to DB, get cursor
+    server_side_cursor = module.params['server_side_cursor']
+    fetch_size = module.params['fetch_size']
+    max_rows = module.params['max_rows']
+    output_file = module.params['output_file']
+    output_format = module.params['output_format']
+    rows = module.params['rows']
+    rows_file = module.params['rows_file']
+    rows_file_format = module.params['rows_file_format']
+    batch_size = module.params['batch_size']
+    bulk = rows is not None or rows_file is not None
+    queries = module.params['queries']
+    transaction = module.params['transaction']
+    continue_on_error = module.params['continue_on_error']
+    max_retries = module.params['max_retries']
+    retry_max_time = module.params['retry_max_time']
+    explain = module.params['explain']
+    explain_only = explain in ('analyze', 'analyze_distsql')
+    as_of_system_time = module.params['as_of_system_time']
+
+    if fetch_size < 1:
+        module.fail_json(msg='fetch_size must be greater than 0')
+
+    if max_rows is not None and max_rows < 0:
+        module.fail_json(msg='max_rows must not be negative')
+
+    if batch_size < 1:
+        module.fail_json(msg='batch_size must be greater than 0')
+
+    if module.params['query_max_length'] < 0:
+        module.fail_json(msg='query_max_length must not be negative')
+
+    if max_retries < 0:
+        module.fail_json(msg='max_retries must not be negative')
+
+    if (bulk or queries) and server_side_cursor:
+        module.fail_json(msg='server_side_cursor cannot be used with rows, rows_file or queries')
+
+    if explain and (bulk or queries):
+        module.fail_json(msg='explain cannot be used with rows, rows_file or queries')
+
+    if args_list is not None and (server_side_cursor or output_file or explain):
+        module.fail_json(msg='args_list cannot be used with server_side_cursor, output_file or explain')
+
+    if explain_only and (server_side_cursor or output_file):
+        module.fail_json(msg='explain=%s cannot be used with server_side_cursor or output_file '
+                             'as the query returns no rows' % explain)
+
+    if as_of_system_time is not None:
+        if bulk:
+            module.fail_json(msg='as_of_system_time cannot be used with rows or rows_file')
+
+        for statement in [item['query'] for item in queries] if queries else [query or '']:
+            if not is_read_only_statement(statement):
+                module.fail_json(msg='as_of_system_time can be used only with read-only '
+                                     'statements, got "%s"' % statement)
+
+    if (queries or bulk or args_list is not None) and max_retries and not transaction:
+        module.fail_json(msg='max_retries requires transaction=true '
+                             'when queries, args_list, rows or rows_file is used')
+
+    # Connect to DB
     cockroachdb = CockroachDBServer(module)
-
-    if rows_type == 'dict':
-        fetch_from_cursor = fetch_from_cursor_dict
+    timings = cockroachdb.timings
+
+    def write_to_file(rows, description):
+        """Write rows to output_file as they are fetched.
+
+        Returns a dictionary describing the written file.
+        """
+        if description is None:
+            module.fail_json(msg='Query "%s" returned no rows '
+                                 'to write to %s' % (query, output_file))
+
+        columns = [column[0] for column in description]
+        rows = timings.iterate(convert_rows(rows, get_converters(description)), 'convert')
+        with timings.measure('write'):
+            return write_rows_to_file(module, rows, output_file, output_format,
+                                      columns, rows_type)
+
+    if output_file:
+        # Instead of collecting rows in query_result,
+        # write them to the file as they are fetched
+        fetch_from_cursor = write_to_file
+    elif rows_type == 'dict':
+        fetch_from_cursor = timings.timed(fetch_from_cursor_dict, 'convert')
+    elif rows_type == 'columnar':
+        fetch_from_cursor = timings.timed(fetch_from_cursor_columnar, 'convert')
     else:
-        fetch_from_cursor = fetch_from_cursor_tuple
+        fetch_from_cursor = timings.timed(fetch_from_cursor_tuple, 'convert')
 
+    # Server-side cursors can only live inside a transaction,
+    # so autocommit must be disabled when they are used.
+    # Reads as of a system time are done in a transaction too
+    in_transaction = transaction or as_of_system_time is not None
+    autocommit = not (server_side_cursor or in_transaction)
     conn = cockroachdb.connect(conn_params=get_conn_params(module.params),
-                               autocommit=True, rows_type=rows_type)
-    cursor = conn.cursor()
-
-    # Prepare args:
-    args = get_args(positional_args, named_args)
-
-    # Execute query
-    statusmsg, rowcount, query, query_result = execute(module, cursor, query,
-                                                       args, fetch_from_cursor)
-
-    # Close cursor and conn
-    cursor.close()
+                               autocommit=autocommit, rows_type=rows_type)
+
+    # Attempts of run(), to return the number of retries on commit errors
+    attempts = []
+
+    def run():
+        """Do the whole work of the module including the commit.
+
+        It is called again from scratch when the transaction must be retried.
+
+        Returns a dictionary of values to return to users.
+        """
+        attempts.append(None)
+
+        if as_of_system_time is not None:
+            # It must be the first statement of the transaction
+            aost_cursor = conn.cursor()
+            try:
+                clause = get_as_of_system_time(aost_cursor, as_of_system_time)
+                aost_cursor.execute('SET TRANSACTION %s' % clause)
+            except Exception as e:
+                if is_retry_error(e):
+                    raise
+
+                module.fail_json(msg='Cannot read as of system time '
+                                     '"%s": %s' % (as_of_system_time, to_native(e)))
+
+            aost_cursor.close()
+
+        if server_side_cursor:
+            cursor = conn.cursor(name=SERVER_SIDE_CURSOR_NAME)
+            cur_fetch_size = fetch_size
+        else:
+            # Rows are already on the client side after execution,
+            # so there is no point to fetch them in chunks
+            cursor = conn.cursor()
+            cur_fetch_size = None
+
+        # Statements prepared for args_list, a retried transaction
+        # prepares them again under new names
+        statements = PreparedStatements(cursor)
+
+        kw = {}
+        if queries:
+            results = execute_queries(module, cursor, queries, fetch_from_cursor,
+                                      continue_on_error=continue_on_error,
+                                      transaction=in_transaction, statements=statements,
+                                      columns=rows_type == 'columnar')
+
+            if results and 'error' in results[-1] and not continue_on_error:
+                if in_transaction:
+                    conn.rollback()
+
+                module.fail_json(msg='Cannot execute query "%s": %s' % (results[-1]['query'],
+                                                                        results[-1]['error']),
+                                 results=results)
+
+            last = results[-1] if results else {}
+            statusmsg = last.get('statusmessage')
+            rowcount = last.get('rowcount')
+            executed_query = last.get('query')
+            query_result = last.get('query_result', [])
+            kw['results'] = results
+            if rows_type == 'columnar':
+                kw['columns'] = last.get('columns', [])
+
+        elif bulk:
+            rows = module.params['rows']
+            if rows_file is not None:
+                rows = read_rows_file(module, rows_file, rows_file_format,
+                                      module.params['rows_file_null'])
+
+            statusmsg, rowcount, query_result, batches = execute_batches(module, cursor, query,
+                                                                         rows, batch_size,
+                                                                         fetch_from_cursor)
+            executed_query = render_query(module, query)
+            kw['batches'] = batches
+
+        elif args_list is not None:
+            try:
+                result = execute_args_list(module, cursor, statements, query,
+                                           args_list, fetch_from_cursor)
+            except Exception as e:
+                if is_retry_error(e):
+                    raise
+
+                module.fail_json(msg='Cannot execute query "%s": %s' % (query, to_native(e)))
+
+            statusmsg = result['statusmessage']
+            rowcount = result['rowcount']
+            executed_query = result['query']
+            query_result = result['query_result']
+            kw['executions'] = result['executions']
+            kw['execution_stats'] = result['execution_stats']
+
+        else:
+            # Prepare args:
+            args = get_args(positional_args, named_args)
+
+            if explain:
+                # Server-side cursors cannot be used for EXPLAIN
+                explain_cursor = conn.cursor()
+                executed_query, kw['explain'] = explain_query(module, explain_cursor, query, args, explain)
+                explain_cursor.close()
+
+            if explain_only:
+                # The query was run by EXPLAIN ANALYZE which does not return its rows
+                statusmsg, rowcount, query_result = None, None, []
+            else:
+                # Execute query
+                statusmsg, rowcount, executed_query, query_result = execute(module, cursor, query,
+                                                                            args, fetch_from_cursor,
+                                                                            fetch_size=cur_fetch_size,
+                                                                            max_rows=max_rows)
+
+        if server_side_cursor:
+            # psycopg2 sets rowcount of named cursors to the number of rows
+            # returned by the last FETCH, which is 0 after the cursor
+            # is exhausted, so count the fetched rows instead
+            rowcount = query_result['rows'] if output_file else len(query_result)
+
+        if rows_type == 'columnar' and not queries:
+            # The description is kept by the cursor until it is closed
+            kw['columns'] = get_columns(cursor.description)
+
+        cursor.close()
+        if not autocommit:
+            commit_transaction(module, conn, len(attempts) - 1)
+
+        kw.update(
+            statusmessage=statusmsg,
+            rowcount=rowcount,
+            query_result=query_result,
+            query=executed_query,
+        )
+
+        if output_file:
+            kw.update(
+                query_result=[],
+                output_file=query_result['path'],
+                output_rows=query_result['rows'],
+                output_size=query_result['size'],
+                checksum=query_result['checksum'],
+            )
+
+        return kw
+
+    kw, retries = cockroachdb.run_transaction(run, max_retries=max_retries,
+                                              max_time=retry_max_time)
+
+    # Close conn
     conn.close()
 
     # Users will get this in JSON output after execution
-    kw = dict(
+    kw.update(
         changed=True,
-        statusmessage=statusmsg,
-        rowcount=rowcount,
-        query_result=query_result,
-        query=query,
+        retries=retries,
+        connected_host=cockroachdb.host,
     )
 
+    if module.params['timings']:
+        kw['timings'] = timings.as_dict()
+
     module.exit_json(**kw)
 
 
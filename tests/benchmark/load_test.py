@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Load-test harness running the collection's modules as Ansible does,
+# in separate processes reading their arguments from stdin,
+# against the stand-in server. See tests/benchmark/README.md.
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+from timeit import default_timer
+
+from standin_server import StandInServer
+
+COLLECTION_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODULE_PACKAGE = 'ansible_collections.community.cockroachdb.plugins.modules'
+
+
+def get_env():
+    """Get environment variables making the collection importable by modules.
+
+    The directory containing ansible_collections is prepended to PYTHONPATH
+    if the collection is located in an ansible_collections/community/cockroachdb
+    directory, otherwise PYTHONPATH must already point to it.
+    """
+    env = dict(os.environ)
+
+    namespace_path = os.path.dirname(COLLECTION_ROOT)
+    if os.path.basename(os.path.dirname(namespace_path)) == 'ansible_collections':
+        collections_path = os.path.dirname(os.path.dirname(namespace_path))
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [collections_path, env.get('PYTHONPATH')]))
+
+    return env
+
+
+def run_task(module, args, port, env):
+    """Run a module against the stand-in server listening on port.
+
+    Return a tuple (latency in seconds, result dictionary).
+    """
+    args = dict(dict(login_host='127.0.0.1', login_port=port), **args)
+    stdin = json.dumps({'ANSIBLE_MODULE_ARGS': args}).encode('utf-8')
+
+    start = default_timer()
+    proc = subprocess.run([sys.executable, '-m', '%s.%s' % (MODULE_PACKAGE, module)],
+                          input=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    latency = default_timer() - start
+
+    try:
+        result = json.loads(proc.stdout.decode('utf-8'))
+    except ValueError:
+        result = dict(failed=True, msg=proc.stderr.decode('utf-8', 'replace'))
+
+    return latency, result
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(int(round(pct / 100.0 * (len(values) - 1))), len(values) - 1)]
+
+
+def run_load(server, module, args, tasks, concurrency=1):
+    """Run tasks of a module with a number of them running concurrently.
+
+    Return a dictionary of the latencies in milliseconds,
+    the throughput in tasks per second and statistics of the server.
+    """
+    env = get_env()
+
+    start = default_timer()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda i: run_task(module, args, server.port, env), range(tasks)))
+
+    elapsed = default_timer() - start
+
+    latencies = [latency * 1000 for latency, result in results]
+    failed = [result for latency, result in results if result.get('failed')]
+
+    return dict(
+        tasks=tasks,
+        concurrency=concurrency,
+        failed=len(failed),
+        first_error=failed[0].get('msg') if failed else None,
+        elapsed=round(elapsed, 3),
+        throughput=round(tasks / elapsed, 3),
+        latency_ms=dict((name, round(value, 3)) for name, value in (
+            ('min', min(latencies)),
+            ('p50', percentile(latencies, 50)),
+            ('p90', percentile(latencies, 90)),
+            ('p99', percentile(latencies, 99)),
+            ('max', max(latencies)),
+        )),
+        server=dict(server.stats),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a module of the collection repeatedly '
+                                                 'against the stand-in server.')
+    parser.add_argument('module', help='module name, for example, cockroachdb_query')
+    parser.add_argument('args', nargs='?', default='{}', help='module arguments in JSON')
+    parser.add_argument('--tasks', type=int, default=100, help='number of tasks to run')
+    parser.add_argument('--concurrency', type=int, default=1, help='number of tasks run at once')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds the server waits before answering a statement')
+    parser.add_argument('--error-pattern', default='.*',
+                        help='regular expression matching statements to inject errors into')
+    parser.add_argument('--error-code', default='40001', help='SQLSTATE of injected errors')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='probability of a matching statement to fail')
+    parser.add_argument('--region', help='region of the server')
+    options = parser.parse_args()
+
+    with StandInServer(latency=options.latency, region=options.region) as server:
+        if options.error_rate:
+            server.inject_error(options.error_pattern, code=options.error_code,
+                                rate=options.error_rate)
+
+        report = run_load(server, options.module, json.loads(options.args),
+                          options.tasks, options.concurrency)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,730 @@
+# -*- coding: utf-8 -*-
+
+# In-process stand-in for a CockroachDB server speaking enough
+# of the PostgreSQL wire protocol to run the collection's modules.
+# See tests/benchmark/README.md for how to use it.
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import datetime
+import itertools
+import random
+import re
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+PROTOCOL_VERSION = 196608
+SSL_REQUEST_CODE = 80877103
+GSSENC_REQUEST_CODE = 80877104
+CANCEL_REQUEST_CODE = 80877102
+
+# Type OIDs of result columns
+BOOL = 16
+INT8 = 20
+TEXT = 25
+FLOAT8 = 701
+TEXT_ARRAY = 1009
+TIMESTAMPTZ = 1184
+NUMERIC = 1700
+
+# Size of a buffer of data rows sent at once
+SEND_BUFFER_SIZE = 64 * 1024
+
+VERSION = ('CockroachDB CCL v21.1.6 (x86_64-unknown-linux-gnu, built 2021/07/20 15:30:39, '
+           'go1.15.11)')
+
+PARAMETER_STATUSES = (
+    ('server_version', '13.0.0'),
+    ('server_encoding', 'UTF8'),
+    ('client_encoding', 'UTF8'),
+    ('DateStyle', 'ISO, MDY'),
+    ('IntervalStyle', 'postgres'),
+    ('integer_datetimes', 'on'),
+    ('standard_conforming_strings', 'on'),
+    ('TimeZone', 'UTC'),
+)
+
+
+class QueryError(Exception):
+    """Raised by query handlers to send an error response to the client."""
+    def __init__(self, code, message):
+        super(QueryError, self).__init__(message)
+        self.code = code
+        self.message = message
+
+
+class Result():
+    """Result of a statement.
+
+    Args:
+        columns (list) -- (name, type OID) tuples, empty for statements returning no rows
+        rows (iterable) -- tuples of values, can be a generator to stream rows
+
+    Kwargs:
+        tag (str) -- command tag, 'SELECT <row count>' for statements returning rows
+    """
+    def __init__(self, columns=None, rows=None, tag=None):
+        self.columns = columns or []
+        self.rows = rows or []
+        self.tag = tag
+
+
+def encode_value(val):
+    """Encode a value to the text format."""
+    if val is None:
+        return None
+
+    if isinstance(val, bool):
+        return b't' if val else b'f'
+
+    if isinstance(val, (list, tuple)):
+        items = []
+        for item in val:
+            if item is None:
+                items.append('NULL')
+            else:
+                items.append('"%s"' % str(item).replace('\\', '\\\\').replace('"', '\\"'))
+
+        return ('{%s}' % ','.join(items)).encode('utf-8')
+
+    return str(val).encode('utf-8')
+
+
+def message(msg_type, payload=b''):
+    return msg_type + struct.pack('!I', len(payload) + 4) + payload
+
+
+def cstring(val):
+    return val.encode('utf-8') + b'\x00'
+
+
+def row_description(columns):
+    payload = struct.pack('!H', len(columns))
+    for name, oid in columns:
+        payload += cstring(name) + struct.pack('!IhIhih', 0, 0, oid, -1, -1, 0)
+
+    return message(b'T', payload)
+
+
+def data_row(row):
+    payload = struct.pack('!H', len(row))
+    for val in row:
+        val = encode_value(val)
+        if val is None:
+            payload += struct.pack('!i', -1)
+        else:
+            payload += struct.pack('!i', len(val)) + val
+
+    return message(b'D', payload)
+
+
+def error_response(code, text):
+    payload = (b'S' + cstring('ERROR') + b'V' + cstring('ERROR') + b'C' + cstring(code)
+               + b'M' + cstring(text) + b'\x00')
+    return message(b'E', payload)
+
+
+def get_tag(query):
+    """Get a command tag for a statement returning no rows."""
+    words = query.split()
+    if not words:
+        return ''
+
+    command = words[0].upper()
+    if command == 'INSERT':
+        return 'INSERT 0 1'
+
+    if command in ('UPDATE', 'DELETE', 'UPSERT'):
+        return '%s 1' % command
+
+    if command in ('CREATE', 'DROP', 'ALTER') and len(words) > 1:
+        return '%s %s' % (command, words[1].upper())
+
+    return command
+
+
+class Catalog():
+    """In-memory state of the stand-in server changed by the statements it runs."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.databases = {
+            'defaultdb': dict(owner='root', comment=None),
+            'postgres': dict(owner='root', comment=None),
+            'system': dict(owner='node', comment=None),
+        }
+        self.users = {
+            'admin': dict(member_of=[], options=''),
+            'root': dict(member_of=['admin'], options=''),
+        }
+        self.settings = {
+            'version': dict(value='21.1', setting_type='m'),
+            'sql.defaults.distsql': dict(value='auto', setting_type='e'),
+        }
+
+
+class StandInServer():
+    """PostgreSQL wire protocol server standing in for CockroachDB.
+
+    It supports the startup with SSL refused and no authentication,
+    the simple and the extended query protocols with text formats,
+    and transaction states. Results are streamed as they are generated.
+
+    Statements are matched against handlers added by add_handler
+    and then against the default ones answering the queries
+    the collection's modules run. Statements matching no handler
+    succeed returning no rows.
+
+    Kwargs:
+        latency (float) -- seconds to wait before answering each statement
+        region (str) -- region returned by crdb_internal.locality_value('region')
+        host (str) -- address to listen on, a free port is chosen
+
+    Use it as a context manager or call start and stop.
+    """
+    def __init__(self, latency=0, region=None, host='127.0.0.1'):
+        self.latency = latency
+        self.region = region
+        self.host = host
+        self.port = None
+        self.catalog = Catalog()
+        self.handlers = []
+        self.errors = []
+        self.random = random.Random(0)
+        self.lock = threading.Lock()
+        self.stats = dict(connections=0, statements=0, rows=0, errors=0)
+        self.server = None
+        self.thread = None
+        self._add_default_handlers()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        stand_in = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                Connection(stand_in, self.request).serve()
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((self.host, 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def add_handler(self, pattern, handler):
+        """Add a handler of statements.
+
+        Args:
+            pattern (str) -- regular expression matched against statements ignoring case
+            handler (callable) -- function taking the match object and query parameters
+                and returning a Result or raising QueryError
+        """
+        self.handlers.insert(0, (re.compile(pattern, re.IGNORECASE | re.DOTALL), handler))
+
+    def inject_error(self, pattern='.*', code='40001', message='restart transaction',
+                     count=None, rate=None):
+        """Make statements fail.
+
+        Kwargs:
+            pattern (str) -- regular expression matched against statements ignoring case
+            code (str) -- SQLSTATE of the error, 40001 is a serialization failure
+                CockroachDB asks clients to retry on
+            message (str) -- error message
+            count (int) -- number of statements to fail, unlimited if not passed
+            rate (float) -- probability of a matching statement to fail, 1 if not passed
+        """
+        self.errors.append(dict(pattern=re.compile(pattern, re.IGNORECASE | re.DOTALL),
+                                code=code, message=message, count=count, rate=rate))
+
+    def count(self, stat, value=1):
+        with self.lock:
+            self.stats[stat] += value
+
+    def check_errors(self, query):
+        with self.lock:
+            for error in self.errors:
+                if not error['pattern'].search(query):
+                    continue
+
+                if error['count'] is not None:
+                    if error['count'] <= 0:
+                        continue
+
+                if error['rate'] is not None and self.random.random() >= error['rate']:
+                    continue
+
+                if error['count'] is not None:
+                    error['count'] -= 1
+
+                self.stats['errors'] += 1
+                raise QueryError(error['code'], error['message'])
+
+    def run(self, query, params=None):
+        """Run a statement and return its Result."""
+        self.count('statements')
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        query = query.strip().rstrip(';').strip()
+        self.check_errors(query)
+
+        for pattern, handler in self.handlers:
+            match = pattern.search(query)
+            if match:
+                return handler(match, params)
+
+        return Result(tag=get_tag(query))
+
+    def _add_default_handlers(self):
+        catalog = self.catalog
+
+        def version(match, params):
+            return Result([('version', TEXT)], [(VERSION,)])
+
+        def show_databases(match, params):
+            columns = [('database_name', TEXT), ('owner', TEXT), ('primary_region', TEXT),
+                       ('regions', TEXT_ARRAY), ('survival_goal', TEXT)]
+            if match.group(1):
+                columns.append(('comment', TEXT))
+
+            with catalog.lock:
+                rows = [(name, d['owner'], None, [], None, d['comment'])[:len(columns)]
+                        for name, d in sorted(catalog.databases.items())]
+
+            return Result(columns, rows)
+
+        def create_database(match, params):
+            with catalog.lock:
+                if match.group(2) in catalog.databases:
+                    if match.group(1):
+                        return Result(tag='CREATE DATABASE')
+
+                    raise QueryError('42P04', 'database "%s" already exists' % match.group(2))
+
+                catalog.databases[match.group(2)] = dict(owner='root', comment=None)
+
+            return Result(tag='CREATE DATABASE')
+
+        def drop_database(match, params):
+            with catalog.lock:
+                if catalog.databases.pop(match.group(2), None) is None and not match.group(1):
+                    raise QueryError('3D000', 'database "%s" does not exist' % match.group(2))
+
+            return Result(tag='DROP DATABASE')
+
+        def alter_database_owner(match, params):
+            with catalog.lock:
+                catalog.databases[match.group(1)]['owner'] = match.group(2)
+
+            return Result(tag='ALTER DATABASE OWNER')
+
+        def comment_on_database(match, params):
+            with catalog.lock:
+                catalog.databases[match.group(1)]['comment'] = match.group(2)
+
+            return Result(tag='COMMENT ON DATABASE')
+
+        def show_users(match, params):
+            with catalog.lock:
+                rows = [(name, u['options'], u['member_of']) for name, u in sorted(catalog.users.items())]
+
+            return Result([('username', TEXT), ('options', TEXT), ('member_of', TEXT_ARRAY)], rows)
+
+        def show_settings(match, params):
+            with catalog.lock:
+                rows = [(name, s['value'], s['setting_type'], '')
+                        for name, s in sorted(catalog.settings.items())]
+
+            return Result([('variable', TEXT), ('value', TEXT), ('setting_type', TEXT),
+                           ('description', TEXT)], rows)
+
+        def show_regions(match, params):
+            return Result([('region', TEXT), ('zones', TEXT_ARRAY)], [])
+
+        def locality_value(match, params):
+            return Result([('crdb_internal.locality_value', TEXT)], [(self.region,)])
+
+        def now(match, params):
+            return Result([('now', TIMESTAMPTZ)], [(datetime.datetime.utcnow().isoformat(' ') + '+00',)])
+
+        def explain(match, params):
+            lines = ['distribution: local', 'vectorized: true']
+            if match.group(1):
+                lines = ['planning time: 100\u00b5s', 'execution time: 1ms'] + lines + [
+                    'rows read from KV: 1 (8 B)', 'maximum memory usage: 10 KiB',
+                    'network usage: 0 B (0 messages)']
+
+            lines += ['', '\u2022 scan', '  nodes: n1', '  table: t@primary', '  spans: FULL SCAN']
+            if match.group(2):
+                lines.append('Diagram: https://cockroachdb.github.io/distsqlplan/decode.html#standin')
+
+            return Result([('info', TEXT)], [(line,) for line in lines])
+
+        def generate_series(match, params):
+            start, stop = int(match.group(1)), int(match.group(2))
+            name = match.group(3) or 'generate_series'
+            return Result([(name, INT8)], ((i,) for i in range(start, stop + 1)))
+
+        # The first handler matching a statement is used
+        for pattern, handler in reversed([
+            (r'^SELECT VERSION\(\)', version),
+            (r'^SHOW DATABASES( WITH COMMENT)?$', show_databases),
+            (r'^CREATE DATABASE (IF NOT EXISTS )?"?([^"\s]+)"?', create_database),
+            (r'^DROP DATABASE (IF EXISTS )?"?([^"\s]+)"?', drop_database),
+            (r'^ALTER DATABASE "?([^"\s]+)"? OWNER TO "?([^"\s]+)"?', alter_database_owner),
+            (r"^COMMENT ON DATABASE \"?([^\"\s]+)\"? IS '(.*)'$", comment_on_database),
+            (r'^SHOW USERS$', show_users),
+            (r'^SHOW ALL CLUSTER SETTINGS$', show_settings),
+            (r'^SHOW REGIONS FROM CLUSTER$', show_regions),
+            (r"crdb_internal\.locality_value\('region'\)", locality_value),
+            (r'^SELECT now\(\)', now),
+            (r'^EXPLAIN( ANALYZE( \(DISTSQL\))?)? ', explain),
+            (r'generate_series\((\d+),\s*(\d+)\)(?:\s+AS\s+(\w+))?', generate_series),
+        ]):
+            self.add_handler(pattern, handler)
+
+
+# Statements of server-side cursors as psycopg2 runs them
+CURSOR_RE = re.compile(r'^\s*(?:(DECLARE)\s+"?(\w+)"?\s+.*?CURSOR.*?\s+FOR\s+(.*)'
+                       r'|(?:(FETCH|CLOSE))\s+(?:FORWARD\s+)?(?:(\d+|ALL)\s+)?(?:FROM\s+)?"?(\w+)"?)\s*;?\s*$',
+                       re.IGNORECASE | re.DOTALL)
+
+# Statements of prepared statements as cockroachdb_query runs them
+PREPARED_RE = re.compile(r'^\s*(?:(PREPARE)\s+(\w+)(?:\s*\([^)]*\))?\s+AS\s+(.*)'
+                         r'|(EXECUTE)\s+(\w+)\s*(\(.*\))?'
+                         r'|(DEALLOCATE)\s+(?:PREPARE\s+)?(\w+))\s*;?\s*$',
+                         re.IGNORECASE | re.DOTALL)
+
+
+class Connection():
+    """Client connection to the stand-in server."""
+    def __init__(self, server, sock):
+        self.server = server
+        self.sock = sock
+        self.buffer = b''
+        self.output = []
+        self.output_size = 0
+        # Transaction status sent in ReadyForQuery: idle, in a transaction, failed transaction
+        self.status = b'I'
+        self.statements = {}
+        self.portals = {}
+        # Results of server-side cursors by names
+        self.cursors = {}
+        # Statements prepared with PREPARE by names
+        self.prepared = {}
+        # Skip extended query messages till Sync after an error
+        self.skip_till_sync = False
+
+    def serve(self):
+        self.server.count('connections')
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            if not self.startup():
+                return
+
+            while True:
+                msg_type = self.recv(1)
+                payload = self.recv(struct.unpack('!I', self.recv(4))[0] - 4)
+                if msg_type == b'X':
+                    return
+
+                self.handle(msg_type, payload)
+                self.flush()
+
+        except (EOFError, socket.error):
+            return
+
+        finally:
+            self.sock.close()
+
+    def recv(self, size):
+        while len(self.buffer) < size:
+            data = self.sock.recv(max(size - len(self.buffer), 65536))
+            if not data:
+                raise EOFError()
+
+            self.buffer += data
+
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def send(self, data):
+        self.output.append(data)
+        self.output_size += len(data)
+        if self.output_size >= SEND_BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.output:
+            self.sock.sendall(b''.join(self.output))
+            self.output = []
+            self.output_size = 0
+
+    def startup(self):
+        while True:
+            length = struct.unpack('!I', self.recv(4))[0]
+            payload = self.recv(length - 4)
+            code = struct.unpack('!I', payload[:4])[0]
+
+            if code in (SSL_REQUEST_CODE, GSSENC_REQUEST_CODE):
+                self.sock.sendall(b'N')
+                continue
+
+            if code != PROTOCOL_VERSION:
+                return False
+
+            break
+
+        self.send(message(b'R', struct.pack('!I', 0)))
+        for name, value in PARAMETER_STATUSES:
+            self.send(message(b'S', cstring(name) + cstring(value)))
+
+        self.send(message(b'K', struct.pack('!II', threading.current_thread().ident % 2 ** 31, 0)))
+        self.ready()
+        self.flush()
+        return True
+
+    def ready(self):
+        self.send(message(b'Z', self.status))
+
+    def handle(self, msg_type, payload):
+        if msg_type == b'Q':
+            self.simple_query(payload[:-1].decode('utf-8'))
+            return
+
+        if msg_type == b'S':
+            self.skip_till_sync = False
+            self.ready()
+            return
+
+        if msg_type == b'H' or self.skip_till_sync:
+            return
+
+        try:
+            if msg_type == b'P':
+                self.parse(payload)
+            elif msg_type == b'B':
+                self.bind(payload)
+            elif msg_type == b'D':
+                self.describe(payload)
+            elif msg_type == b'E':
+                self.execute(payload)
+            elif msg_type == b'C':
+                self.send(message(b'3'))
+            else:
+                raise QueryError('08P01', 'unsupported message type %r' % msg_type)
+
+        except QueryError as e:
+            self.error(e)
+            self.skip_till_sync = True
+
+    def simple_query(self, query):
+        try:
+            result = self.run(query)
+            if query.strip():
+                self.send_result(result)
+            else:
+                self.send(message(b'I'))
+
+        except QueryError as e:
+            self.error(e)
+
+        self.ready()
+
+    def run(self, query, params=None):
+        """Run a statement keeping track of the transaction status."""
+        command = query.strip().split(None, 1)[0].upper() if query.strip() else ''
+
+        if self.status == b'E' and command not in ('ROLLBACK', 'COMMIT', 'ABORT'):
+            if not re.match(r'\s*ROLLBACK\s+TO', query, re.IGNORECASE):
+                raise QueryError('25P02', 'current transaction is aborted, '
+                                          'commands ignored until end of transaction block')
+
+        cursor = CURSOR_RE.match(query)
+        prepared = PREPARED_RE.match(query)
+        if cursor:
+            result = self.run_cursor(cursor)
+        elif prepared:
+            result = self.run_prepared(prepared)
+        else:
+            try:
+                result = self.server.run(query, params)
+            except QueryError:
+                # A failed commit ends the transaction
+                if command in ('COMMIT', 'END'):
+                    self.status = b'I'
+                raise
+
+        if command in ('BEGIN', 'START'):
+            self.status = b'T'
+        elif command in ('COMMIT', 'ROLLBACK', 'ABORT', 'END'):
+            if re.match(r'\s*ROLLBACK\s+TO', query, re.IGNORECASE):
+                self.status = b'T'
+            else:
+                self.status = b'I'
+
+        return result
+
+    def run_cursor(self, match):
+        """Run DECLARE, FETCH, or CLOSE of a server-side cursor."""
+        command = (match.group(1) or match.group(4)).upper()
+        name = match.group(2) or match.group(6)
+
+        if command == 'DECLARE':
+            result = self.server.run(match.group(3))
+            self.cursors[name] = (result.columns, iter(result.rows))
+            return Result(tag='DECLARE CURSOR')
+
+        if name not in self.cursors:
+            raise QueryError('34000', 'cursor "%s" does not exist' % name)
+
+        if command == 'CLOSE':
+            del self.cursors[name]
+            return Result(tag='CLOSE CURSOR')
+
+        columns, rows = self.cursors[name]
+        count = match.group(5)
+        if count is None or count.upper() == 'ALL':
+            fetched = list(rows)
+        else:
+            fetched = list(itertools.islice(rows, int(count)))
+
+        return Result(columns, fetched, tag='FETCH %s' % len(fetched))
+
+    def run_prepared(self, match):
+        """Run PREPARE, EXECUTE, or DEALLOCATE of a prepared statement.
+
+        Parameters of EXECUTE are split by commas and substituted
+        for the placeholders as is.
+        """
+        command = (match.group(1) or match.group(4) or match.group(7)).upper()
+        name = match.group(2) or match.group(5) or match.group(8)
+
+        if command == 'PREPARE':
+            if name in self.prepared:
+                raise QueryError('42P05', 'prepared statement "%s" already exists' % name)
+
+            self.server.count('statements')
+            self.prepared[name] = match.group(3)
+            return Result(tag='PREPARE')
+
+        if command == 'DEALLOCATE':
+            if name.upper() == 'ALL':
+                self.prepared.clear()
+            elif self.prepared.pop(name, None) is None:
+                raise QueryError('26000', 'prepared statement "%s" does not exist' % name)
+
+            return Result(tag='DEALLOCATE')
+
+        if name not in self.prepared:
+            raise QueryError('26000', 'prepared statement "%s" does not exist' % name)
+
+        query = self.prepared[name]
+        if match.group(6):
+            args = [a.strip() for a in match.group(6).strip()[1:-1].split(',')]
+            for i in reversed(range(len(args))):
+                query = query.replace('$%s' % (i + 1), args[i])
+
+        return self.server.run(query)
+
+    def send_result(self, result, described=False):
+        if result.columns:
+            if not described:
+                self.send(row_description(result.columns))
+
+            count = 0
+            for row in result.rows:
+                self.send(data_row(row))
+                count += 1
+
+            self.server.count('rows', count)
+            self.send(message(b'C', cstring(result.tag or 'SELECT %s' % count)))
+        else:
+            self.send(message(b'C', cstring(result.tag or '')))
+
+    def error(self, e):
+        if self.status == b'T':
+            self.status = b'E'
+
+        self.send(error_response(e.code, e.message))
+
+    def parse(self, payload):
+        name, rest = payload.split(b'\x00', 1)
+        query = rest.split(b'\x00', 1)[0]
+        self.statements[name] = query.decode('utf-8')
+        self.send(message(b'1'))
+
+    def bind(self, payload):
+        portal, rest = payload.split(b'\x00', 1)
+        statement, rest = rest.split(b'\x00', 1)
+        if statement not in self.statements:
+            raise QueryError('26000', 'unknown prepared statement %r' % statement)
+
+        def unpack(fmt, pos):
+            return struct.unpack_from(fmt, rest, pos), pos + struct.calcsize(fmt)
+
+        (formats,), pos = unpack('!H', 0)
+        codes, pos = unpack('!%sH' % formats, pos)
+        if any(codes):
+            raise QueryError('0A000', 'only the text format of parameters is supported')
+
+        (count,), pos = unpack('!H', pos)
+        params = []
+        for dummy in range(count):
+            (length,), pos = unpack('!i', pos)
+            if length < 0:
+                params.append(None)
+            else:
+                params.append(rest[pos:pos + length].decode('utf-8'))
+                pos += length
+
+        self.portals[portal] = dict(query=self.statements[statement], params=params, result=None)
+        self.send(message(b'2'))
+
+    def describe(self, payload):
+        kind, name = payload[:1], payload[1:-1]
+        if kind == b'S':
+            # Parameter types are left to be inferred
+            self.send(message(b't', struct.pack('!H', 0)))
+            self.send(message(b'n'))
+            return
+
+        portal = self.portals.get(name)
+        if portal is None:
+            raise QueryError('34000', 'unknown portal %r' % name)
+
+        # The statement has to be run to know its columns
+        portal['result'] = self.run(portal['query'], portal['params'])
+        if portal['result'].columns:
+            self.send(row_description(portal['result'].columns))
+        else:
+            self.send(message(b'n'))
+
+    def execute(self, payload):
+        name = payload.split(b'\x00', 1)[0]
+        portal = self.portals.get(name)
+        if portal is None:
+            raise QueryError('34000', 'unknown portal %r' % name)
+
+        described = portal['result'] is not None
+        if not described:
+            portal['result'] = self.run(portal['query'], portal['params'])
+
+        self.send_result(portal['result'], described=described)
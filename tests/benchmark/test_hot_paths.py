@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+# Benchmarks of the row-fetch and connection-parameter hot paths.
+# See tests/benchmark/README.md for how to run them and compare with baselines.
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import datetime
+import decimal
+import json
+import tracemalloc
+
+import pytest
+
+from ansible_collections.community.cockroachdb.plugins.module_utils.cockroachdb import (
+    get_conn_params,
+)
+from ansible_collections.community.cockroachdb.plugins.modules.cockroachdb_info import (
+    extract_server_ver,
+    get_info,
+)
+from ansible_collections.community.cockroachdb.plugins.modules.cockroachdb_query import (
+    convert_to_supported,
+    fetch_from_cursor_columnar,
+    fetch_from_cursor_dict,
+    fetch_from_cursor_tuple,
+    get_columns,
+)
+
+pytest.importorskip('pytest_benchmark')
+
+# Values and type OIDs of columns by type mixes. The plain mix needs
+# no conversion, the convert mix has numeric and interval columns
+# and the text mix has wide strings
+COLUMN_TYPES = {
+    'plain': [(1, 20), ('value', 25), (True, 16), (None, 25)],
+    'convert': [(decimal.Decimal('1.01'), 1700), (datetime.timedelta(minutes=80), 1186),
+                (1, 20), ('value', 25)],
+    'text': [('x' * 1024, 25), ('y' * 256, 25), (1, 20), ('z' * 4096, 25)],
+}
+
+ROW_COUNTS = [100, 10000]
+COLUMN_COUNTS = [4, 32]
+
+
+class FakeCursor():
+    """Fake cursor returning the same row a configured number of times.
+
+    The rows are tuples as returned by a regular psycopg2 cursor,
+    or dictionaries as returned by a RealDictCursor if rows_type is dict.
+    """
+    def __init__(self, rows, columns, mix, rows_type='tuple'):
+        types = COLUMN_TYPES[mix]
+        self.description = [('col%s' % i, types[i % len(types)][1]) for i in range(columns)]
+        row = tuple(types[i % len(types)][0] for i in range(columns))
+        if rows_type == 'dict':
+            row = dict(zip([column[0] for column in self.description], row))
+
+        self.rows = [row] * rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def execute(self, query):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+
+def measure_memory(benchmark, func, *args):
+    """Record the peak memory allocated by one call of func in extra_info."""
+    tracemalloc.start()
+    try:
+        func(*args)
+        benchmark.extra_info['peak_memory'] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize('rows', ROW_COUNTS)
+@pytest.mark.parametrize('columns', COLUMN_COUNTS)
+@pytest.mark.parametrize('mix', sorted(COLUMN_TYPES))
+@pytest.mark.parametrize('description', [True, False], ids=['description', 'legacy'])
+def test_fetch_from_cursor_dict(benchmark, rows, columns, mix, description):
+    cursor = FakeCursor(rows, columns, mix, rows_type='tuple' if description else 'dict')
+    args = (cursor, cursor.description if description else None)
+
+    measure_memory(benchmark, fetch_from_cursor_dict, *args)
+    result = benchmark(fetch_from_cursor_dict, *args)
+
+    assert len(result) == rows
+
+
+@pytest.mark.parametrize('rows', ROW_COUNTS)
+@pytest.mark.parametrize('columns', COLUMN_COUNTS)
+@pytest.mark.parametrize('mix', sorted(COLUMN_TYPES))
+@pytest.mark.parametrize('description', [True, False], ids=['description', 'legacy'])
+def test_fetch_from_cursor_tuple(benchmark, rows, columns, mix, description):
+    cursor = FakeCursor(rows, columns, mix)
+    args = (cursor, cursor.description if description else None)
+
+    measure_memory(benchmark, fetch_from_cursor_tuple, *args)
+    result = benchmark(fetch_from_cursor_tuple, *args)
+
+    assert len(result) == rows
+
+
+@pytest.mark.parametrize('rows', ROW_COUNTS)
+@pytest.mark.parametrize('columns', COLUMN_COUNTS)
+@pytest.mark.parametrize('mix', sorted(COLUMN_TYPES))
+def test_fetch_from_cursor_columnar(benchmark, rows, columns, mix):
+    cursor = FakeCursor(rows, columns, mix)
+
+    measure_memory(benchmark, fetch_from_cursor_columnar, cursor, cursor.description)
+    result = benchmark(fetch_from_cursor_columnar, cursor, cursor.description)
+
+    assert len(result) == rows
+
+
+@pytest.mark.parametrize('rows_type', ['dict', 'columnar'])
+@pytest.mark.parametrize('columns', COLUMN_COUNTS)
+def test_serialize_query_result(benchmark, rows_type, columns):
+    # Modules serialize their results to JSON, which the controller parses,
+    # so the size of the JSON is recorded along with the time it takes
+    cursor = FakeCursor(10000, columns, 'plain')
+    if rows_type == 'dict':
+        result = dict(query_result=fetch_from_cursor_dict(cursor, cursor.description))
+    else:
+        result = dict(query_result=fetch_from_cursor_columnar(cursor, cursor.description),
+                      columns=get_columns(cursor.description))
+
+    data = benchmark(json.dumps, result)
+    benchmark.extra_info['size'] = len(data)
+
+
+@pytest.mark.parametrize('val', [
+    decimal.Decimal('12345.6789'),
+    datetime.timedelta(hours=1, minutes=20),
+    'value',
+], ids=['decimal', 'timedelta', 'str'])
+def test_convert_to_supported(benchmark, val):
+    benchmark(convert_to_supported, val)
+
+
+@pytest.mark.parametrize('login_host', [
+    ['localhost'],
+    ['node1:26258'],
+    ['node1', 'node2', 'node3'],
+], ids=['localhost', 'host_port', 'several_hosts'])
+def test_get_conn_params(benchmark, login_host):
+    params = {
+        'login_host': login_host,
+        'login_port': 26257,
+        'login_user': 'root',
+        'login_password': None,
+        'login_db': 'defaultdb',
+        'login_unix_socket': None,
+        'connect_timeout': 5,
+        'ssl_mode': 'verify-full',
+        'ssl_root_cert': '/tmp/certs/ca.crt',
+        'ssl_cert': '/tmp/certs/client.root.crt',
+        'ssl_key': '/tmp/certs/client.root.key',
+        'query': 'SELECT 1',
+    }
+
+    benchmark(get_conn_params, params)
+
+
+def test_extract_server_ver(benchmark):
+    ver_str = ('CockroachDB CCL v21.1.6 (x86_64-unknown-linux-gnu, built 2021/07/20 15:30:39, '
+               'go1.15.11)')
+
+    version_info, ok = benchmark(extract_server_ver, ver_str)
+
+    assert ok
+
+
+@pytest.mark.parametrize('rows', [10, 10000])
+def test_get_info(benchmark, rows):
+    cursor = FakeCursor(rows, 4, 'plain', rows_type='dict')
+    # Make the root keys distinct
+    cursor.rows = [dict(row, col0=i) for i, row in enumerate(cursor.rows)]
+
+    measure_memory(benchmark, get_info, None, cursor, 'SHOW USERS', 'col0', ['col1', 'col2', 'col3'])
+    info = benchmark(get_info, None, cursor, 'SHOW USERS', 'col0', ['col1', 'col2', 'col3'])
+
+    assert len(info) == rows
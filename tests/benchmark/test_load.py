@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+
+# End-to-end runs of the modules against the stand-in server
+# and benchmarks of their task latency.
+# See tests/benchmark/README.md for how to run them.
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import pytest
+
+from load_test import get_env, run_load, run_task
+from standin_server import TEXT, Result, StandInServer
+
+pytest.importorskip('psycopg2')
+
+
+@pytest.fixture
+def server():
+    with StandInServer() as server:
+        yield server
+
+
+@pytest.fixture(scope='module')
+def env():
+    return get_env()
+
+
+def test_query_streams_rows_with_server_side_cursor(server, env):
+    args = dict(query='SELECT * FROM generate_series(1, 2500) AS id',
+                server_side_cursor=True, fetch_size=1000)
+    latency, result = run_task('cockroachdb_query', args, server.port, env)
+
+    assert not result.get('failed'), result
+    assert result['rowcount'] == 2500
+    assert result['query_result'][-1] == {'id': 2500}
+    assert server.stats['rows'] == 2500
+
+
+def test_query_retries_transaction(server, env):
+    server.inject_error('^CREATE DATABASE', code='40001', count=2)
+
+    args = dict(queries=[dict(query='CREATE DATABASE test')], transaction=True, max_retries=5)
+    latency, result = run_task('cockroachdb_query', args, server.port, env)
+
+    assert not result.get('failed'), result
+    assert result['retries'] == 2
+    assert 'test' in server.catalog.databases
+
+
+def test_query_fails_on_commit_error(server, env):
+    server.inject_error('^COMMIT', code='40001', count=1)
+    server.inject_error('^COMMIT', code='XX000', message='injected')
+
+    args = dict(queries=[dict(query='SELECT 1')], transaction=True, max_retries=5)
+    latency, result = run_task('cockroachdb_query', args, server.port, env)
+
+    assert result['failed']
+    assert result['msg'] == 'Cannot commit transaction: injected\n'
+    assert result['retries'] == 1
+
+
+def test_info_gathers_subsets(server, env):
+    args = dict(gather_subset=['version', 'databases', 'users', 'settings'], parallelism=2)
+    latency, result = run_task('cockroachdb_info', args, server.port, env)
+
+    assert not result.get('failed'), result
+    assert result['version']['year'] == 21
+    assert 'defaultdb' in result['databases']
+
+
+def test_db_is_idempotent(server, env):
+    args = dict(name='test', owner='root')
+
+    latency, result = run_task('cockroachdb_db', args, server.port, env)
+    assert result['changed'] is True, result
+
+    latency, result = run_task('cockroachdb_db', args, server.port, env)
+    assert result['changed'] is False, result
+
+
+@pytest.mark.parametrize('explain,expected_rows', [('plan', 10), ('analyze_distsql', 0)])
+def test_query_explain(server, env, explain, expected_rows):
+    args = dict(query='SELECT * FROM generate_series(1, 10) AS id', explain=explain)
+    latency, result = run_task('cockroachdb_query', args, server.port, env)
+
+    assert not result.get('failed'), result
+    assert len(result['query_result']) == expected_rows
+    assert result['explain']['mode'] == explain
+    assert result['explain']['full_scans'] == ['t@primary']
+    assert len(result['explain']['diagram_urls']) == (explain == 'analyze_distsql')
+
+
+@pytest.mark.parametrize('args', [
+    dict(query='SELECT * FROM generate_series(1, 3) AS id'),
+    dict(query='SELECT * FROM generate_series(1, 3) AS id', server_side_cursor=True, fetch_size=2),
+    dict(queries=[dict(query='CREATE DATABASE test'), dict(query='SELECT * FROM generate_series(1, 3) AS id')]),
+])
+def test_query_columnar(server, env, args):
+    latency, result = run_task('cockroachdb_query', dict(args, rows_type='columnar'), server.port, env)
+
+    assert not result.get('failed'), result
+    assert result['columns'] == [{'name': 'id', 'type': 'int8'}]
+    assert result['query_result'] == [[1], [2], [3]]
+    if 'queries' in args:
+        assert [r['columns'] for r in result['results']] == [[], result['columns']]
+
+
+def test_query_args_list_prepares_once(server, env):
+    args = dict(queries=[
+        dict(query='SELECT * FROM generate_series(1, %s) AS id', args_list=[[2], [3]]),
+        dict(query='SELECT * FROM generate_series(1, %(n)s) AS id;', args_list=[dict(n=1)]),
+        dict(query='SELECT * FROM generate_series(1, %s) AS id', args_list=[[4]]),
+    ])
+    latency, result = run_task('cockroachdb_query', args, server.port, env)
+
+    assert not result.get('failed'), result
+    results = result['results']
+    assert [r['rowcount'] for r in results] == [5, 1, 4]
+    assert [r['execution_stats']['prepared'] for r in results] == [True, True, False]
+    assert results[0]['query_result'][-1] == {'id': 3}
+    assert [e['rowcount'] for e in results[0]['executions']] == [2, 3]
+
+
+@pytest.mark.parametrize('module,args,expected', [
+    ('cockroachdb_query', dict(query='SELECT * FROM generate_series(1, 3) AS id'),
+     "SET TRANSACTION AS OF SYSTEM TIME '-10s'"),
+    ('cockroachdb_info', dict(gather_subset=['databases']), "BEGIN AS OF SYSTEM TIME '-10s'"),
+])
+def test_as_of_system_time(server, env, module, args, expected):
+    statements = []
+
+    def record(match, params):
+        statements.append(match.string)
+        return Result(tag=match.string.split()[0].upper())
+
+    server.add_handler(r'AS OF SYSTEM TIME', record)
+
+    latency, result = run_task(module, dict(args, as_of_system_time='-10s'), server.port, env)
+
+    assert not result.get('failed'), result
+    assert statements == [expected]
+
+
+@pytest.mark.parametrize('module,args', [
+    ('cockroachdb_db', dict(name='test')),
+    ('cockroachdb_info', dict(gather_subset=['version'])),
+    ('cockroachdb_query', dict(query='SELECT 1')),
+    ('cockroachdb_query', dict(query='SELECT 1', as_of_system_time='-10s')),
+])
+def test_login_region(env, module, args):
+    statements = []
+
+    def record(match, params):
+        statements.append(match.string)
+        return Result(tag=match.string.split()[0].upper())
+
+    def locality_value(match, params):
+        statements.append(match.string)
+        return Result([('crdb_internal.locality_value', TEXT)], [('us-east1',)])
+
+    with StandInServer() as server:
+        server.add_handler(r'^(BEGIN|COMMIT|ROLLBACK|SET TRANSACTION)', record)
+        server.add_handler(r'locality_value', locality_value)
+
+        # Several hosts are needed for the region to be probed
+        hosts = ['127.0.0.1:%s' % server.port] * 2
+        args = dict(args, login_host=hosts, login_host_selection='order', login_region='us-east1')
+        latency, result = run_task(module, args, server.port, env)
+
+    assert not result.get('failed'), result
+    assert 'warnings' not in result, result
+    # The region probe must not leave the connection inside a transaction,
+    # AS OF SYSTEM TIME must be set by the first statement of a transaction
+    assert statements[:3] == ['BEGIN', "SELECT crdb_internal.locality_value('region')", 'ROLLBACK']
+    if 'as_of_system_time' in args:
+        assert statements[3:5] == ['BEGIN', "SET TRANSACTION AS OF SYSTEM TIME '-10s'"]
+
+
+def test_as_of_system_time_rejects_writes(server, env):
+    args = dict(query='INSERT INTO t VALUES (1)', as_of_system_time='follower_read_timestamp()')
+    latency, result = run_task('cockroachdb_query', args, server.port, env)
+
+    assert result['failed']
+    assert result['msg'] == 'as_of_system_time can be used only with read-only statements, ' \
+                            'got "INSERT INTO t VALUES (1)"'
+    assert server.stats['statements'] == 0
+
+
+@pytest.mark.parametrize('module,args', [
+    ('cockroachdb_query', dict(query='SELECT * FROM generate_series(1, 100) AS id')),
+    ('cockroachdb_query', dict(query='SELECT * FROM generate_series(1, 100) AS id', rows_type='tuple')),
+    ('cockroachdb_query', dict(query='SELECT * FROM generate_series(1, 100) AS id', rows_type='tuple',
+                               output_file='rows.jsonl')),
+    ('cockroachdb_query', dict(query='SELECT * FROM generate_series(1, 100) AS id',
+                               server_side_cursor=True, fetch_size=30)),
+    ('cockroachdb_info', dict(gather_subset=['version', 'databases'], parallelism=2)),
+    ('cockroachdb_db', dict(name='test')),
+])
+def test_timings(server, env, tmpdir, module, args):
+    if 'output_file' in args:
+        args = dict(args, output_file=str(tmpdir.join(args['output_file'])))
+
+    latency, result = run_task(module, dict(args, timings=True), server.port, env)
+
+    assert not result.get('failed'), result
+    timings = result['timings']
+    assert timings['connect_ms'] > 0
+    assert timings['execute_ms'] > 0
+    assert timings['rows'] >= server.stats['rows']
+    assert timings['connections'] == server.stats['connections']
+    if timings['bytes_received'] is not None:
+        assert timings['bytes_received'] > 0
+
+
+def test_run_load_reports_failures(server):
+    server.inject_error('^SELECT 1', code='XX000', message='injected', rate=1)
+
+    report = run_load(server, 'cockroachdb_query', dict(query='SELECT 1'), tasks=2, concurrency=2)
+
+    assert report['failed'] == 2
+    assert 'injected' in report['first_error']
+    assert report['server']['errors'] == 2
+
+
+@pytest.mark.parametrize('latency', [0, 0.01])
+def test_query_task_latency(benchmark, env, latency):
+    pytest.importorskip('pytest_benchmark')
+
+    with StandInServer(latency=latency) as server:
+        args = dict(query='SELECT * FROM generate_series(1, 1000) AS id')
+        latency, result = benchmark.pedantic(run_task, args=('cockroachdb_query', args, server.port, env),
+                                             rounds=5)
+
+    assert not result.get('failed'), result
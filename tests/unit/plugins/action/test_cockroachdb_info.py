@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import time
+
+import pytest
+
+from ansible_collections.community.cockroachdb.plugins.action.cockroachdb_info import (
+    ActionModule,
+    get_cache_key,
+    read_cache,
+    write_cache,
+)
+
+ARGS = {
+    'login_host': ['node1', 'node2'],
+    'login_port': 26257,
+    'login_user': 'root',
+    'gather_subset': ['all'],
+}
+
+
+@pytest.mark.parametrize('host,args,same', [
+    ('host1', dict(ARGS), True),
+    # Options not identifying the cluster must not affect the key
+    ('host1', dict(ARGS, parallelism=3, login_password='secret'), True),
+    ('host2', dict(ARGS), False),
+    ('host1', dict(ARGS, login_user='django'), False),
+    ('host1', dict(ARGS, gather_subset=['!settings']), False),
+    # The order of hosts and subsets must not affect the key
+    ('host1', dict(ARGS, login_host=['node2', 'node1']), True),
+    ('host1', dict(ARGS, login_host_selection='order'), True),
+    ('host1', dict(ARGS, gather_subset=['version', 'users']), False),
+])
+def test_get_cache_key(host, args, same):
+    assert (get_cache_key(host, args) == get_cache_key('host1', ARGS)) is same
+
+
+def test_read_write_cache(tmpdir):
+    cache_dir = str(tmpdir.join('cache'))
+    result = {'changed': False, 'version': {'raw': 'CockroachDB CCL v21.1.6'}}
+
+    assert read_cache(cache_dir, 'key', 60) is None
+
+    write_cache(cache_dir, 'key', result, 10)
+
+    assert read_cache(cache_dir, 'key', 60) == result
+    assert read_cache(cache_dir, 'other', 60) is None
+    # Only the cache entry must be left in the directory
+    assert os.listdir(cache_dir) == ['key']
+
+
+def test_read_cache_expired(tmpdir, monkeypatch):
+    cache_dir = str(tmpdir)
+    write_cache(cache_dir, 'key', {'changed': False}, 10)
+
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 61)
+
+    assert read_cache(cache_dir, 'key', 60) is None
+
+
+def test_write_cache_eviction(tmpdir):
+    cache_dir = str(tmpdir)
+
+    for i in range(5):
+        write_cache(cache_dir, 'key%s' % i, {'i': i}, 3)
+        # Make modification times distinct
+        os.utime(os.path.join(cache_dir, 'key%s' % i), (i, i))
+
+    write_cache(cache_dir, 'key5', {'i': 5}, 3)
+
+    assert sorted(os.listdir(cache_dir)) == ['key3', 'key4', 'key5']
+
+
+class FakeTask():
+    """Fake task class"""
+    async_val = 0
+    check_mode = False
+    delegate_to = None
+    action = 'community.cockroachdb.cockroachdb_info'
+
+    def __init__(self, args):
+        self.args = args
+
+
+class FakeShell():
+    """Fake shell class"""
+    tmpdir = '/tmp'
+
+
+class FakeConnection():
+    """Fake connection class"""
+    _shell = FakeShell()
+
+
+def run_action(args, results):
+    """Run the action plugin returning results of the module in turn.
+
+    Return a tuple (result of the plugin, number of module runs).
+    """
+    calls = []
+
+    def execute_module(task_vars=None):
+        calls.append(task_vars)
+        return dict(results[len(calls) - 1])
+
+    action = ActionModule(FakeTask(args), FakeConnection(), None, None, None)
+    action._execute_module = execute_module
+
+    return action.run(task_vars={'inventory_hostname': 'host1'}), len(calls)
+
+
+def test_run_cache(tmpdir):
+    args = dict(ARGS, cache_ttl=60, cache_dir=str(tmpdir))
+    results = [{'changed': False, 'version': {'year': 21}}]
+
+    result, calls = run_action(args, results)
+    assert result == dict(results[0], cache_hit=False)
+    assert calls == 1
+
+    result, calls = run_action(args, results)
+    assert result == dict(results[0], cache_hit=True)
+    assert calls == 0
+
+
+def test_run_cache_disabled(tmpdir):
+    args = dict(ARGS, cache_dir=str(tmpdir))
+    results = [{'changed': False}, {'changed': False}]
+
+    for dummy in range(2):
+        result, calls = run_action(args, results)
+        assert result['cache_hit'] is False
+        assert calls == 1
+
+    assert os.listdir(str(tmpdir)) == []
+
+
+def test_run_cache_expired(tmpdir, monkeypatch):
+    args = dict(ARGS, cache_ttl=60, cache_dir=str(tmpdir))
+    results = [{'changed': False, 'i': 0}, {'changed': False, 'i': 1}]
+
+    run_action(args, results)
+
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 61)
+
+    result, calls = run_action(args, results[1:])
+    assert result == dict(results[1], cache_hit=False)
+    assert calls == 1
+
+
+def test_run_cache_failed(tmpdir):
+    args = dict(ARGS, cache_ttl=60, cache_dir=str(tmpdir))
+    results = [{'failed': True, 'msg': 'unable to connect'}]
+
+    for dummy in range(2):
+        result, calls = run_action(args, results)
+        assert result['failed'] is True
+        assert calls == 1
+
+    # Failed results must not be cached
+    assert os.listdir(str(tmpdir)) == []
+
+
+def test_run_cache_max_entries(tmpdir):
+    cache_dir = str(tmpdir)
+    subsets = [['version'], ['users'], ['settings']]
+
+    for i, subset in enumerate(subsets):
+        args = dict(ARGS, gather_subset=subset, cache_ttl=60, cache_dir=cache_dir, cache_max_entries=2)
+        run_action(args, [{'changed': False, 'i': i}])
+        # Make modification times distinct
+        path = os.path.join(cache_dir, get_cache_key('host1', args))
+        os.utime(path, (i, i))
+
+    assert len(os.listdir(cache_dir)) == 2
+
+    # The oldest entry must be evicted
+    args = dict(ARGS, gather_subset=subsets[0], cache_ttl=60, cache_dir=cache_dir, cache_max_entries=2)
+    result, calls = run_action(args, [{'changed': False, 'i': 3}])
+    assert calls == 1
+
+    args = dict(args, gather_subset=subsets[2])
+    result, calls = run_action(args, [])
+    assert result == {'changed': False, 'i': 2, 'cache_hit': True}
@@ -3,12 +3,25 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
+import socket
+
 import pytest
 
+from ansible_collections.community.cockroachdb.plugins.module_utils import cockroachdb
 from ansible_collections.community.cockroachdb.plugins.module_utils.cockroachdb import (
+    CockroachDBServer,
+    Timings,
     common_argument_spec,
+    get_as_of_system_time,
     get_conn_params,
     get_params_map,
+    get_retry_delay,
+    get_socket_bytes,
+    is_read_only_statement,
+    is_retry_error,
+    order_hosts_by_latency,
+    parse_host,
+    probe_hosts,
 )
 
 
@@ -17,8 +30,12 @@ def test_common_argument_spec():
         'login_db': {'type': 'str'},
         'login_port': {'default': 26257, 'type': 'int'},
         'login_user': {'default': 'root', 'type': 'str'},
-        'login_host': {'default': 'localhost', 'type': 'str'},
+        'login_host': {'default': ['localhost'], 'type': 'list', 'elements': 'str'},
+        'login_host_selection': {'default': 'latency', 'type': 'str', 'choices': ['latency', 'order']},
+        'login_region': {'type': 'str'},
         'login_unix_socket': {'type': 'path'},
+        'connect_timeout': {'type': 'int'},
+        'timings': {'type': 'bool', 'default': False},
         'login_password': {'type': 'str', 'no_log': True},
         'ssl_mode': {
             'type': 'str',
@@ -51,6 +68,7 @@ def test_get_params_map():
         'ssl_root_cert': 'sslrootcert',
         'ssl_cert': 'sslcert',
         'ssl_key': 'sslkey',
+        'connect_timeout': 'connect_timeout',
     }
 
     assert get_params_map() == EXPECTED
@@ -129,8 +147,425 @@ def test_get_params_map():
             {'host': '192.168.0.1',
              'user': 'root',
              'password': 'blah'}
-        )
+        ),
+        (   # input dict
+            {'login_host': ['localhost'],
+             'login_unix_socket': '/path',
+             'login_user': 'root'},
+            # expected dict
+            {'host': '/path',
+             'user': 'root'}
+        ),
+        (   # input dict
+            {'login_host': ['192.168.0.1:26258'],
+             'login_port': 26257,
+             'login_unix_socket': None,
+             'connect_timeout': 5},
+            # expected dict
+            {'host': '192.168.0.1',
+             'port': 26258,
+             'connect_timeout': 5}
+        ),
+        (   # input dict
+            {'login_host': ['192.168.0.1', '192.168.0.2:26258'],
+             'login_unix_socket': '/path',  # should be ignored
+             'login_port': 26257},
+            # expected dict
+            {'host': ['192.168.0.1', '192.168.0.2:26258'],
+             'port': 26257}
+        ),
     ]
 )
 def test_get_conn_params(input_, expected):
     assert get_conn_params(input_) == expected
+
+
+class RetryError(Exception):
+    """Fake psycopg2 error class"""
+    pgcode = '40001'
+
+
+class OtherError(Exception):
+    """Fake psycopg2 error class"""
+    pgcode = '23505'
+
+
+@pytest.mark.parametrize('error,expected', [
+    (RetryError('restart transaction'), True),
+    (OtherError('duplicate key value'), False),
+    (ValueError('blah'), False),
+])
+def test_is_retry_error(error, expected):
+    assert is_retry_error(error) is expected
+
+
+class QuoteCursor():
+    """Fake cursor class quoting arguments"""
+    def mogrify(self, query, args):
+        return (query % tuple("'%s'" % arg for arg in args)).encode('utf-8')
+
+
+@pytest.mark.parametrize('value,expected', [
+    ('follower_read_timestamp()', 'AS OF SYSTEM TIME follower_read_timestamp()'),
+    (' Experimental_Follower_Read_Timestamp() ', 'AS OF SYSTEM TIME experimental_follower_read_timestamp()'),
+    ('-10s', "AS OF SYSTEM TIME '-10s'"),
+    ('2021-08-01 10:00:00', "AS OF SYSTEM TIME '2021-08-01 10:00:00'"),
+])
+def test_get_as_of_system_time(value, expected):
+    assert get_as_of_system_time(QuoteCursor(), value) == expected
+
+
+@pytest.mark.parametrize('query,expected', [
+    ('SELECT 1', True),
+    ('  show databases', True),
+    ('-- report\n/* daily */ (SELECT 1) UNION (SELECT 2)', True),
+    ('WITH t AS (SELECT 1) SELECT * FROM t', True),
+    ('INSERT INTO t VALUES (1)', False),
+    ('/* SELECT */ DELETE FROM t', False),
+    ('', False),
+])
+def test_is_read_only_statement(query, expected):
+    assert is_read_only_statement(query) is expected
+
+
+@pytest.mark.parametrize('attempt,upper_bound', [
+    (1, 0.1),
+    (2, 0.2),
+    (4, 0.8),
+    (100, 5.0),
+])
+def test_get_retry_delay(attempt, upper_bound):
+    for dummy in range(100):
+        assert 0 <= get_retry_delay(attempt) <= upper_bound
+
+
+class FailModule():
+    """Fake module class"""
+    def __init__(self):
+        self.fail_kwargs = None
+        self.params = {}
+
+    def fail_json(self, **kwargs):
+        self.fail_kwargs = kwargs
+        raise SystemExit(1)
+
+
+class Connection():
+    """Fake connection class"""
+    def __init__(self):
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def get_server(monkeypatch):
+    monkeypatch.setattr(cockroachdb, 'ensure_required_libs', lambda module: None)
+    monkeypatch.setattr(cockroachdb.time, 'sleep', lambda delay: None)
+
+    server = CockroachDBServer(FailModule())
+    server.connection = Connection()
+    return server
+
+
+def failing_func(failures):
+    """Return a function raising RetryError the first failures times."""
+    calls = []
+
+    def func():
+        calls.append(None)
+        if len(calls) <= failures:
+            raise RetryError('restart transaction')
+
+        return 'done'
+
+    return func
+
+
+def test_run_transaction(monkeypatch):
+    server = get_server(monkeypatch)
+
+    assert server.run_transaction(failing_func(0)) == ('done', 0)
+    assert server.run_transaction(failing_func(3), max_retries=3) == ('done', 3)
+    assert server.connection.rollbacks == 3
+
+
+def test_run_transaction_exhausted(monkeypatch):
+    server = get_server(monkeypatch)
+
+    with pytest.raises(SystemExit):
+        server.run_transaction(failing_func(3), max_retries=2)
+
+    assert server.module.fail_kwargs == {
+        'msg': 'transaction failed after 3 attempt(s): restart transaction',
+        'retries': 2,
+    }
+
+
+def test_run_transaction_max_time(monkeypatch):
+    server = get_server(monkeypatch)
+
+    with pytest.raises(SystemExit):
+        server.run_transaction(failing_func(3), max_retries=10, max_time=-1)
+
+    assert server.module.fail_kwargs['retries'] == 0
+
+
+def test_run_transaction_other_error(monkeypatch):
+    server = get_server(monkeypatch)
+
+    def func():
+        raise OtherError('duplicate key value')
+
+    with pytest.raises(OtherError):
+        server.run_transaction(func, max_retries=3)
+
+    assert server.connection.rollbacks == 0
+
+
+@pytest.mark.parametrize('host,expected', [
+    ('node1', ('node1', 26257)),
+    ('node1:26258', ('node1', 26258)),
+    ('192.168.0.1:1234', ('192.168.0.1', 1234)),
+    ('[::1]', ('::1', 26257)),
+    ('[::1]:1234', ('::1', 1234)),
+    ('::1', ('::1', 26257)),
+])
+def test_parse_host(host, expected):
+    assert parse_host(host, 26257) == expected
+
+
+def test_order_hosts_by_latency():
+    hosts = [('a', 1), ('b', 1), ('c', 1), ('d', 1)]
+    latencies = [None, 0.3, None, 0.1]
+
+    assert order_hosts_by_latency(hosts, latencies) == [('d', 1), ('b', 1), ('a', 1), ('c', 1)]
+
+
+def test_probe_hosts(monkeypatch):
+    fake_latencies = {'a': 0.2, 'b': None, 'c': 0.1}
+    monkeypatch.setattr(cockroachdb, 'probe_host',
+                        lambda host, port, timeout: fake_latencies[host])
+
+    assert probe_hosts([('a', 1), ('b', 1), ('c', 1)], 1) == [0.2, None, 0.1]
+
+
+class FakeCursor():
+    """Fake psycopg2 cursor class"""
+    regions = {'a': 'us-east1', 'b': 'us-west1', 'c': 'us-west1'}
+
+    def __init__(self, host):
+        self.host = host
+
+    def execute(self, query):
+        pass
+
+    def fetchone(self):
+        return (self.regions[self.host],)
+
+    def close(self):
+        pass
+
+
+class FakeConnection():
+    """Fake psycopg2 connection class"""
+    def __init__(self, host):
+        self.host = host
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self.host)
+
+    def close(self):
+        self.closed = True
+
+
+class FakePsycopg2():
+    """Fake psycopg2 module class"""
+    def __init__(self, down):
+        self.down = down
+        self.connections = []
+
+    def connect(self, cursor_factory=None, **kwargs):
+        if kwargs['host'] in self.down:
+            raise Exception('connection refused')
+
+        conn = FakeConnection(kwargs['host'])
+        self.connections.append(conn)
+        return conn
+
+
+class ConnectModule(FailModule):
+    """Fake module class"""
+    def __init__(self, params):
+        super(ConnectModule, self).__init__()
+        self.params = params
+        self.warnings = []
+
+    def warn(self, msg):
+        self.warnings.append(msg)
+
+
+@pytest.mark.parametrize('params,down,expected_host,expected_warnings', [
+    ({'login_host_selection': 'order'}, [], 'a:26257', 0),
+    ({'login_host_selection': 'order'}, ['a'], 'b:1', 0),
+    ({'login_host_selection': 'latency'}, [], 'c:26257', 0),
+    ({'login_host_selection': 'order', 'login_region': 'us-west1'}, [], 'b:1', 0),
+    ({'login_host_selection': 'order', 'login_region': 'eu-west1'}, [], 'a:26257', 1),
+])
+def test_connect_to_any(monkeypatch, params, down, expected_host, expected_warnings):
+    fake_psycopg2 = FakePsycopg2(down)
+    monkeypatch.setattr(cockroachdb, 'psycopg2', fake_psycopg2)
+    monkeypatch.setattr(cockroachdb, 'ensure_required_libs', lambda module: None)
+    monkeypatch.setattr(cockroachdb, 'probe_hosts', lambda hosts, timeout: [0.3, None, 0.1])
+
+    server = CockroachDBServer(ConnectModule(params))
+    conn = server.connect({'host': ['a', 'b:1', 'c'], 'port': 26257}, rows_type='tuple')
+
+    assert server.host == expected_host
+    assert conn.host == expected_host.split(':')[0]
+    assert server.conn_params['host'] == conn.host
+    assert len(server.module.warnings) == expected_warnings
+    # Connections that are not used must be closed
+    assert [c for c in fake_psycopg2.connections if not c.closed] == [conn]
+
+
+def test_connect_to_any_all_down(monkeypatch):
+    monkeypatch.setattr(cockroachdb, 'psycopg2', FakePsycopg2(['a', 'b']))
+    monkeypatch.setattr(cockroachdb, 'ensure_required_libs', lambda module: None)
+
+    server = CockroachDBServer(ConnectModule({'login_host_selection': 'order'}))
+
+    with pytest.raises(SystemExit):
+        server.connect({'host': ['a', 'b']}, rows_type='tuple')
+
+    assert server.module.fail_kwargs['msg'] == ('unable to connect to database: all the hosts '
+                                                'are unavailable: a:26257: connection refused; '
+                                                'b:26257: connection refused')
+
+
+class Clock():
+    """Fake timer returning the passed times one by one"""
+    def __init__(self, times):
+        self.times = iter(times)
+
+    def __call__(self):
+        return next(self.times)
+
+
+def test_timings_nested_phases_are_exclusive(monkeypatch):
+    monkeypatch.setattr(cockroachdb, 'default_timer', Clock([0, 1, 2, 4, 7, 10]))
+
+    timings = Timings()
+    with timings.measure('convert'):
+        with timings.measure('fetch'):
+            pass
+
+    result = timings.as_dict()
+    assert result['fetch_ms'] == 2000
+    assert result['convert_ms'] == 4000
+    assert result['execute_ms'] == 0
+    assert result['total_ms'] == 10000
+
+
+def test_timings_iterate_and_timed(monkeypatch):
+    monkeypatch.setattr(cockroachdb, 'default_timer', Clock(range(100)))
+
+    timings = Timings()
+    assert list(timings.iterate([1, 2], 'fetch')) == [1, 2]
+    # Getting each of the two items and the end of the iteration take 1 second
+    assert timings.phases['fetch'] == 3
+
+    assert timings.timed(lambda x: x * 2, 'convert')(2) == 4
+    assert timings.phases['convert'] == 1
+
+
+def test_timings_disabled():
+    timings = Timings(enabled=False)
+    rows = [1, 2]
+    func = len
+
+    with timings.measure('execute'):
+        pass
+
+    assert timings.iterate(rows, 'fetch') is rows
+    assert timings.timed(func, 'convert') is func
+    assert all(seconds == 0 for seconds in timings.phases.values())
+
+
+class BaseCursor(object):
+    """Fake psycopg2 cursor class"""
+    def __init__(self, rows):
+        self.rows = rows
+        self.connection = Connection()
+
+    def execute(self, query, vars=None):
+        self.query = query
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchmany(self, size=None):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def __iter__(self):
+        # psycopg2 cursors are iterators themselves
+        return self
+
+    def __next__(self):
+        if not self.rows:
+            raise StopIteration
+
+        return self.rows.pop(0)
+
+    next = __next__
+
+
+def test_timed_cursor():
+    timings = Timings()
+    cursor = timings.cursor_factory(BaseCursor)(list(range(10)))
+
+    cursor.execute('SELECT 1')
+    assert cursor.query == 'SELECT 1'
+    assert cursor.fetchone() == 0
+    assert cursor.fetchmany(2) == [1, 2]
+    assert next(iter(cursor)) == 3
+    assert cursor.fetchmany(2) == [4, 5]
+    assert list(cursor) == list(range(6, 10))
+    assert cursor.fetchone() is None
+
+    result = timings.as_dict()
+    assert result['rows'] == 10
+    assert result['execute_ms'] > 0
+    assert result['fetch_ms'] > 0
+    # The fake connection has no socket
+    assert result['bytes_sent'] is None
+
+
+def test_get_socket_bytes():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    client = socket.create_connection(server.getsockname())
+    conn, dummy = server.accept()
+
+    try:
+        client.sendall(b'x' * 100)
+        conn.recv(100)
+        conn.sendall(b'y' * 50)
+        client.recv(50)
+
+        socket_bytes = get_socket_bytes(client.fileno())
+        if socket_bytes is None:
+            pytest.skip('TCP_INFO is not supported')
+
+        assert socket_bytes == (100, 50)
+    finally:
+        client.close()
+        conn.close()
+        server.close()
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import re
+
+import pytest
+
+from ansible_collections.community.cockroachdb.plugins.modules import cockroachdb_db
+from ansible_collections.community.cockroachdb.plugins.modules.cockroachdb_db import (
+    CockroachDBDatabase,
+    fetch_catalog,
+    find_jobs,
+    get_name_pattern,
+    wait_for_jobs,
+)
+
+
+CATALOG_ROWS = [
+    {'database_name': 'defaultdb', 'owner': 'root', 'primary_region': None,
+     'regions': [], 'survival_goal': None},
+    {'database_name': 'tenant_1', 'owner': 'alice', 'primary_region': None,
+     'regions': [], 'survival_goal': None},
+    {'database_name': 'global', 'owner': 'root', 'primary_region': 'us-east1',
+     'regions': ['europe-west1', 'us-east1', 'us-west1'], 'survival_goal': 'region'},
+]
+
+PLACEMENT_ROWS = [
+    {'name': 'defaultdb', 'placement_policy': None},
+    {'name': 'tenant_1', 'placement_policy': 'DEFAULT'},
+    {'name': 'global', 'placement_policy': 'DEFAULT'},
+]
+
+
+class FakeCursor():
+    def __init__(self):
+        self.queries = []
+
+    def execute(self, query):
+        self.queries.append(query)
+
+    def fetchall(self):
+        if 'placement_policy' in self.queries[-1]:
+            return PLACEMENT_ROWS
+
+        return [dict(row) for row in CATALOG_ROWS]
+
+
+class FailJson(Exception):
+    pass
+
+
+class FakeModule():
+    def __init__(self, check_mode=False):
+        self.check_mode = check_mode
+
+    def fail_json(self, msg, **kwargs):
+        e = FailJson(msg)
+        e.kwargs = kwargs
+        raise e
+
+
+def test_fetch_catalog():
+    cursor = FakeCursor()
+
+    catalog = fetch_catalog(cursor)
+
+    assert sorted(catalog) == ['defaultdb', 'global', 'tenant_1']
+    assert catalog['tenant_1']['owner'] == 'alice'
+    assert 'placement' not in catalog['tenant_1']
+    assert cursor.queries == ['SHOW DATABASES']
+
+
+def test_fetch_catalog_placement():
+    cursor = FakeCursor()
+
+    catalog = fetch_catalog(cursor, placement=True)
+
+    assert catalog['defaultdb']['placement'] == 'default'
+    assert catalog['global']['placement'] == 'default'
+    assert len(cursor.queries) == 2
+
+
+@pytest.mark.parametrize('name,state,owner,check_mode,expected_changed,expected_statements', [
+    ('tenant_2', 'present', None, False, True, ['CREATE DATABASE "tenant_2"']),
+    ('tenant_2', 'present', 'bob', False, True,
+     ['CREATE DATABASE "tenant_2"', 'ALTER DATABASE "tenant_2" OWNER TO bob']),
+    ('tenant_2', 'present', 'bob', True, True,
+     ['CREATE DATABASE "tenant_2"', 'ALTER DATABASE "tenant_2" OWNER TO bob']),
+    ('tenant_1', 'present', 'alice', False, False, []),
+    ('tenant_1', 'present', None, False, False, []),
+    ('tenant_1', 'present', 'bob', False, True, ['ALTER DATABASE "tenant_1" OWNER TO bob']),
+    ('tenant_1', 'absent', None, False, True, ['DROP DATABASE "tenant_1"']),
+    ('tenant_1', 'absent', None, True, True, ['DROP DATABASE "tenant_1"']),
+    ('tenant_2', 'absent', None, False, False, []),
+])
+def test_ensure(name, state, owner, check_mode, expected_changed, expected_statements):
+    cursor = FakeCursor()
+    catalog = fetch_catalog(cursor)
+    cursor.queries = []
+
+    database = CockroachDBDatabase(FakeModule(check_mode), cursor, name, catalog)
+
+    assert database.ensure(state, owner) is expected_changed
+    assert database.executed_statements == ([] if check_mode else expected_statements)
+    assert database.planned_statements == expected_statements
+    # The catalog passed must be used instead of fetching it again
+    assert cursor.queries == database.executed_statements
+
+
+def test_fetch_info_without_catalog():
+    cursor = FakeCursor()
+
+    database = CockroachDBDatabase(FakeModule(), cursor, 'tenant_1')
+
+    assert database.exists
+    assert database.owner == 'alice'
+    assert cursor.queries == ['SHOW DATABASES']
+
+
+@pytest.mark.parametrize('name,options,expected', [
+    # Making a database multi-region
+    ('tenant_1', dict(primary_region='us-east1'), ['SET PRIMARY REGION "us-east1"']),
+    (
+        'tenant_1',
+        dict(primary_region='us-east1', regions=['us-west1', 'europe-west1'], survival_goal='region'),
+        [
+            'SET PRIMARY REGION "us-east1"',
+            'ADD REGION "us-west1"',
+            'ADD REGION "europe-west1"',
+            'SURVIVE REGION FAILURE',
+        ],
+    ),
+    ('tenant_1', dict(regions=[], survival_goal='zone', placement='default'), []),
+    # Nothing to change
+    ('global', dict(primary_region='us-east1'), []),
+    ('global', dict(regions=['us-west1', 'us-east1', 'europe-west1'], survival_goal='region'), []),
+    # Moving the primary region to a new region
+    ('global', dict(primary_region='asia-east1'), ['ADD REGION "asia-east1"', 'SET PRIMARY REGION "asia-east1"']),
+    ('global', dict(primary_region='us-west1'), ['SET PRIMARY REGION "us-west1"']),
+    # The survival goal must be lowered before regions are dropped
+    (
+        'global',
+        dict(primary_region='us-west1', regions=['us-west1', 'asia-east1'], survival_goal='zone'),
+        [
+            'ADD REGION "asia-east1"',
+            'SET PRIMARY REGION "us-west1"',
+            'SURVIVE ZONE FAILURE',
+            'DROP REGION "europe-west1"',
+            'DROP REGION "us-east1"',
+        ],
+    ),
+    # The primary region must be dropped last
+    (
+        'global',
+        dict(regions=[]),
+        [
+            'SURVIVE ZONE FAILURE',
+            'DROP REGION "europe-west1"',
+            'DROP REGION "us-west1"',
+            'DROP REGION "us-east1"',
+        ],
+    ),
+    # Placement must be restricted after the survival goal is lowered
+    ('global', dict(survival_goal='zone', placement='restricted'), ['SURVIVE ZONE FAILURE', 'PLACEMENT RESTRICTED']),
+])
+def test_get_region_plan(name, options, expected):
+    catalog = fetch_catalog(FakeCursor(), placement=True)
+    database = CockroachDBDatabase(FakeModule(), FakeCursor(), name, catalog)
+
+    prefix = 'ALTER DATABASE "%s" ' % name
+    assert database.get_region_plan(**options) == [prefix + q for q in expected]
+
+
+@pytest.mark.parametrize('name,options,expected', [
+    ('tenant_1', dict(regions=['us-east1']), 'primary_region is required to add regions to database "tenant_1"'),
+    ('global', dict(regions=['us-west1']), 'primary_region is required to drop the primary region of database "global"'),
+    ('tenant_1', dict(survival_goal='region'), 'survival_goal=region and placement=restricted require database "tenant_1" to have regions'),
+    ('global', dict(regions=['us-east1', 'us-west1']), 'survival_goal=region requires database "global" to have at least 3 regions'),
+])
+def test_get_region_plan_fail(name, options, expected):
+    database = CockroachDBDatabase(FakeModule(), FakeCursor(), name, fetch_catalog(FakeCursor()))
+
+    with pytest.raises(FailJson) as e:
+        database.get_region_plan(**options)
+
+    assert str(e.value) == expected
+
+
+@pytest.mark.parametrize('options,expected', [
+    (dict(), 'CREATE DATABASE "new"'),
+    (dict(primary_region='us-east1'), 'CREATE DATABASE "new" PRIMARY REGION "us-east1"'),
+    (
+        dict(primary_region='us-east1', regions=['us-west1', 'us-east1', 'europe-west1'],
+             survival_goal='region', placement='default'),
+        'CREATE DATABASE "new" PRIMARY REGION "us-east1" REGIONS "us-east1", "us-west1", "europe-west1" '
+        'SURVIVE REGION FAILURE PLACEMENT DEFAULT',
+    ),
+])
+def test_create_multi_region(options, expected):
+    cursor = FakeCursor()
+    database = CockroachDBDatabase(FakeModule(), cursor, 'new', {})
+
+    assert database.ensure('present', **options) is True
+    assert cursor.queries == [expected]
+
+
+def test_create_multi_region_fail():
+    database = CockroachDBDatabase(FakeModule(), FakeCursor(), 'new', {})
+
+    with pytest.raises(FailJson) as e:
+        database.ensure('present', regions=['us-east1'])
+
+    assert str(e.value) == 'primary_region is required to create multi-region database "new"'
+
+
+class DictRow(list):
+    """Fake psycopg2.extras.DictRow class, a list accessible by column names"""
+    def __init__(self, row):
+        super(DictRow, self).__init__(row.values())
+        self._index = dict((key, i) for i, key in enumerate(row))
+
+    def __getitem__(self, key):
+        if not isinstance(key, int):
+            key = self._index[key]
+
+        return super(DictRow, self).__getitem__(key)
+
+    def keys(self):
+        return list(self._index)
+
+
+class JobsCursor():
+    """Fake cursor returning the next item of polls on every execution."""
+    def __init__(self, polls):
+        self.polls = list(polls)
+        self.executed = []
+        self.rows = None
+
+    def execute(self, query, args):
+        self.executed.append((query, args))
+        self.rows = self.polls.pop(0)
+
+    def fetchall(self):
+        return [DictRow(row) for row in self.rows]
+
+
+def job(job_id, status, fraction_completed=1.0, error=''):
+    return dict(job_id=job_id, job_type='SCHEMA CHANGE', status=status,
+                fraction_completed=fraction_completed, error=error, elapsed=1.5)
+
+
+def test_find_jobs():
+    cursor = JobsCursor([[{'job_id': 1}, {'job_id': 2}]])
+
+    assert find_jobs(cursor, 'test_db', 'since') == [1, 2]
+    assert cursor.executed[0][1] == ('since', get_name_pattern('test_db'))
+
+
+@pytest.mark.parametrize('name,description,matched', [
+    ('tenant_1', "ALTER DATABASE tenant_1 ADD REGION 'us-east1'", True),
+    ('tenant_1', 'ALTER DATABASE tenant_1', True),
+    ('tenant_1', 'DROP TABLE tenant_1.public.t', True),
+    ('tenant_1', 'ALTER DATABASE "tenant_1" SURVIVE REGION FAILURE', True),
+    # Other databases whose names contain the name must not match
+    ('tenant_1', "ALTER DATABASE tenant_10 ADD REGION 'us-east1'", False),
+    ('tenant_1', "ALTER DATABASE my_tenant_1 ADD REGION 'us-east1'", False),
+    ('tenant_1', 'ALTER DATABASE "tenant_1x" SURVIVE REGION FAILURE', False),
+    ('test.db', 'ALTER DATABASE "test.db" SURVIVE REGION FAILURE', True),
+    ('test.db', 'ALTER DATABASE "testxdb" SURVIVE REGION FAILURE', False),
+    ('Test', 'ALTER DATABASE "Test" SURVIVE REGION FAILURE', True),
+    ('a"b', 'ALTER DATABASE "a""b" SURVIVE REGION FAILURE', True),
+    ('b', 'ALTER DATABASE "a""b" SURVIVE REGION FAILURE', False),
+])
+def test_get_name_pattern(name, description, matched):
+    # The pattern uses the syntax common to Python and the ~ operator
+    assert bool(re.search(get_name_pattern(name), description)) is matched
+
+
+def test_wait_for_jobs(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(cockroachdb_db.time, 'sleep', lambda delay: sleeps.append(delay))
+
+    cursor = JobsCursor([
+        [job(1, 'running', 0.1), job(2, 'pending', 0.0)],
+        [job(1, 'running', 0.5), job(2, 'succeeded')],
+        [job(1, 'running', 0.9), job(2, 'succeeded')],
+        [job(1, 'succeeded'), job(2, 'succeeded')],
+    ])
+
+    jobs = wait_for_jobs(FakeModule(), cursor, [1, 2], 300)
+
+    # The jobs must be returned as dictionaries to keep the keys
+    assert [type(j) for j in jobs] == [dict, dict]
+    assert jobs == [job(1, 'succeeded'), job(2, 'succeeded')]
+    assert cursor.executed[0][1] == ([1, 2],)
+    # Exponential backoff
+    assert sleeps == [0.5, 1.0, 2.0]
+
+
+def test_wait_for_jobs_nothing():
+    cursor = JobsCursor([])
+
+    assert wait_for_jobs(FakeModule(), cursor, [], 300) == []
+    assert cursor.executed == []
+
+
+@pytest.mark.parametrize('polls,timeout,expected', [
+    ([[job(1, 'failed', 0.3, 'boom')]], 300, 'Job 1 is failed: boom'),
+    ([[job(1, 'running', 0.3)], [job(1, 'running', 0.3)]], 0, 'Timed out after 0 seconds waiting for jobs to finish'),
+])
+def test_wait_for_jobs_fail(monkeypatch, polls, timeout, expected):
+    monkeypatch.setattr(cockroachdb_db.time, 'sleep', lambda delay: None)
+
+    with pytest.raises(FailJson) as e:
+        wait_for_jobs(FakeModule(), JobsCursor(polls), [1], timeout)
+
+    assert str(e.value) == expected
+    assert type(e.value.kwargs['jobs'][0]) is dict
@@ -6,11 +6,16 @@ __metaclass__ = type
 import pytest
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.community.cockroachdb.plugins.module_utils.cockroachdb import Timings
+from ansible_collections.community.cockroachdb.plugins.modules import cockroachdb_info
 from ansible_collections.community.cockroachdb.plugins.modules.cockroachdb_info import (
+    collect_subsets,
     exec_query,
     extract_server_ver,
     get_server_version,
     get_info,
+    get_subset_info,
+    get_subsets,
 )
 
 
@@ -79,6 +84,7 @@ def test_exec_query(monkeypatch):
 # Method for monkeypatching AnsibleModule.__init__ method
 def mock__init__(self):
     self.fail_msg = None
+    self.params = {'as_of_system_time': None}
 
 
 # Method for monkeypatching AnsibleModule.fail_json method
@@ -221,3 +227,380 @@ def test_get_server_version_fail(monkeypatch, fetchall_out, expected):
 
     get_server_version(module, cursor)
     assert module.fail_msg == expected
+
+
+@pytest.mark.parametrize('gather_subset,expected', [
+    (['all'], ['version', 'databases', 'users', 'settings', 'regions']),
+    (['!settings'], ['version', 'databases', 'users', 'regions']),
+    (['!settings', '!users'], ['version', 'databases', 'regions']),
+    (['users', 'databases'], ['databases', 'users']),
+    (['all', '!version'], ['databases', 'users', 'settings', 'regions']),
+    (['statements'], ['statements']),
+    (['nodes', 'all'], ['version', 'databases', 'users', 'settings', 'regions', 'nodes']),
+    (['statements', 'all'], ['version', 'databases', 'users', 'settings', 'regions', 'statements']),
+    (['hot_ranges', 'all'], ['version', 'databases', 'users', 'settings', 'regions', 'hot_ranges']),
+    (['hot_ranges', 'version'], ['version', 'hot_ranges']),
+    (['sizes', 'hot_ranges', 'statements'], ['statements', 'hot_ranges', 'sizes']),
+    (['!version'], ['databases', 'users', 'settings', 'regions']),
+    (['users', '!users'], []),
+    (['!all'], []),
+])
+def test_get_subsets(monkeypatch, gather_subset, expected):
+    monkeypatch.setattr(AnsibleModule, '__init__', mock__init__)
+    monkeypatch.setattr(AnsibleModule, 'fail_json', mock_fail_json)
+
+    module = AnsibleModule()
+
+    assert get_subsets(module, gather_subset) == expected
+    assert module.fail_msg is None
+
+
+def test_get_subsets_fail(monkeypatch):
+    monkeypatch.setattr(AnsibleModule, '__init__', mock__init__)
+    monkeypatch.setattr(AnsibleModule, 'fail_json', mock_fail_json)
+
+    module = AnsibleModule()
+    get_subsets(module, ['users', '!blah'])
+
+    assert module.fail_msg == ('Unknown subset "blah", possible values are: '
+                               'all, version, databases, users, settings, regions, nodes, statements, hot_ranges, sizes')
+
+
+def test_get_subset_info(monkeypatch):
+    queries = []
+    monkeypatch.setattr(Cursor, 'execute', lambda self, x: queries.append(x))
+    monkeypatch.setattr(Cursor, 'fetchall',
+                        lambda self: [{'variable': 'version', 'value': '21.1', 'setting_type': 'm'}])
+    monkeypatch.setattr(AnsibleModule, '__init__', mock__init__)
+    monkeypatch.setattr(AnsibleModule, 'fail_json', mock_fail_json)
+
+    module = AnsibleModule()
+
+    assert get_subset_info(module, Cursor(), 'settings') == {'version': {'value': '21.1', 'setting_type': 'm'}}
+    assert queries == ['SHOW ALL CLUSTER SETTINGS']
+
+
+def test_get_subset_info_nodes(monkeypatch):
+    queries = []
+    monkeypatch.setattr(Cursor, 'execute', lambda self, x: queries.append(x))
+    monkeypatch.setattr(Cursor, 'fetchall', lambda self: [
+        {'node_id': 1, 'address': 'node1:26257', 'locality': 'region=us-east1', 'server_version': '21.1',
+         'is_live': True, 'draining': False, 'membership': 'active', 'stores': 1,
+         'capacity': 1000, 'available': 800, 'used': 150, 'ranges': 52, 'leases': 18,
+         'queries_per_second': 13.4, 'writes_per_second': 2.1},
+    ])
+    monkeypatch.setattr(AnsibleModule, '__init__', mock__init__)
+    monkeypatch.setattr(AnsibleModule, 'fail_json', mock_fail_json)
+
+    module = AnsibleModule()
+
+    assert get_subset_info(module, Cursor(), 'nodes') == {
+        1: {'address': 'node1:26257', 'locality': 'region=us-east1', 'server_version': '21.1',
+            'is_live': True, 'draining': False, 'membership': 'active', 'stores': 1,
+            'capacity': 1000, 'available': 800, 'used': 150, 'ranges': 52, 'leases': 18,
+            'queries_per_second': 13.4, 'writes_per_second': 2.1},
+    }
+    # Store figures must be aggregated per node on the server
+    assert 'GROUP BY n.node_id' in queries[0]
+
+
+@pytest.mark.parametrize('row,expected', [
+    # CockroachDB 22.1 and 22.2
+    ({'range_id': 73, 'qps': 1520.4, 'database_name': 'bank', 'table_name': 'accounts',
+      'index_name': 'primary', 'replica_node_ids': [1, 2, 3], 'leaseholder_node_id': 2},
+     {'qps': 1520.4, 'database_name': 'bank', 'table_name': 'accounts',
+      'index_name': 'primary', 'leaseholder': 2, 'replicas': [1, 2, 3]}),
+    # CockroachDB 23.1 and later
+    ({'range_id': 73, 'qps': 1520.4, 'cpu_time': 0.5, 'databases': ['bank'], 'tables': ['accounts'],
+      'indexes': ['primary'], 'replicas': [1, 2, 3], 'leaseholder': 2},
+     {'qps': 1520.4, 'database_name': ['bank'], 'table_name': ['accounts'],
+      'index_name': ['primary'], 'leaseholder': 2, 'replicas': [1, 2, 3]}),
+])
+def test_get_subset_info_hot_ranges(monkeypatch, row, expected):
+    executed = []
+    monkeypatch.setattr(Cursor, 'execute', lambda self, query, args: executed.append((query, args)))
+    monkeypatch.setattr(Cursor, 'fetchall', lambda self: [row])
+    monkeypatch.setattr(AnsibleModule, '__init__', mock__init__)
+    monkeypatch.setattr(AnsibleModule, 'fail_json', mock_fail_json)
+
+    module = AnsibleModule()
+    module.params = {'hot_ranges_limit': 5, 'hot_ranges_min_qps': 100.0}
+
+    assert get_subset_info(module, Cursor(), 'hot_ranges') == {73: expected}
+    # The threshold and the limit must be applied on the server
+    # without reading leaseholders of all the ranges
+    assert executed[0][0].endswith('WHERE qps >= %s ORDER BY qps DESC LIMIT %s')
+    assert 'crdb_internal.ranges' not in executed[0][0]
+    assert executed[0][1] == (100.0, 5)
+
+
+SIZES_ROWS = [
+    {'database_name': 'bank', 'schema_name': 'public', 'table_name': 'accounts',
+     'bytes': 1000, 'live_bytes': 800, 'rows': 100, 'ranges': 2},
+    {'database_name': 'bank', 'schema_name': 'public', 'table_name': 'history',
+     'bytes': 500, 'live_bytes': 500, 'rows': None, 'ranges': 1},
+    {'database_name': 'test', 'schema_name': 's1', 'table_name': 't',
+     'bytes': 10, 'live_bytes': 10, 'rows': 1, 'ranges': 1},
+]
+
+EXPECTED_SIZES = {
+    'bank': {
+        'bytes': 1500, 'live_bytes': 1300, 'rows': 100, 'ranges': 3,
+        'tables': {
+            'public.accounts': {'bytes': 1000, 'live_bytes': 800, 'rows': 100, 'ranges': 2},
+            'public.history': {'bytes': 500, 'live_bytes': 500, 'rows': None, 'ranges': 1},
+        },
+    },
+    'test': {
+        'bytes': 10, 'live_bytes': 10, 'rows': 1, 'ranges': 1,
+        'tables': {
+            's1.t': {'bytes': 10, 'live_bytes': 10, 'rows': 1, 'ranges': 1},
+        },
+    },
+}
+
+
+def sizes_fetchall(version):
+    """Return a fake cursor.fetchall method returning the server version
+    or sizes depending on the executed query"""
+    def fetchall(self):
+        if self.query.startswith('SELECT VERSION()'):
+            return [{'version': 'CockroachDB CCL %s (x86_64-unknown-linux-gnu)' % version}]
+
+        return SIZES_ROWS
+
+    return fetchall
+
+
+@pytest.mark.parametrize('databases,expected_args', [
+    (None, ()),
+    (['bank', 'test'], ((['bank', 'test'],),)),
+])
+def test_get_subset_info_sizes(monkeypatch, databases, expected_args):
+    executed = []
+
+    def execute(self, query, *args):
+        self.query = query
+        executed.append((query, args))
+
+    monkeypatch.setattr(Cursor, 'execute', execute)
+    monkeypatch.setattr(Cursor, 'fetchall', sizes_fetchall('v22.2.10'))
+    monkeypatch.setattr(AnsibleModule, '__init__', mock__init__)
+    monkeypatch.setattr(AnsibleModule, 'fail_json', mock_fail_json)
+
+    module = AnsibleModule()
+    module.params = {'sizes_databases': databases}
+
+    assert get_subset_info(module, Cursor(), 'sizes') == EXPECTED_SIZES
+    assert module.fail_msg is None
+
+    query, args = executed[1]
+    assert args == expected_args
+    assert ('ANY(%s)' in query) is bool(databases)
+    if databases:
+        # The ranges must be filtered before their statistics are computed
+        subquery = query[query.index('FROM (SELECT'):query.index(') AS r ')]
+        assert 'crdb_internal.ranges_no_leases WHERE table_id IN (' in subquery
+        assert 'database_name = ANY(%s)' in subquery
+    # Ranges must be aggregated per table on the server
+    assert 'GROUP BY t.database_name, t.schema_name, t.name' in query
+
+
+def test_get_subset_info_sizes_unsupported_version(monkeypatch):
+    monkeypatch.setattr(Cursor, 'execute', lambda self, query, *args: setattr(self, 'query', query))
+    monkeypatch.setattr(Cursor, 'fetchall', sizes_fetchall('v23.1.2'))
+    monkeypatch.setattr(AnsibleModule, '__init__', mock__init__)
+    monkeypatch.setattr(AnsibleModule, 'fail_json', mock_fail_json)
+
+    module = AnsibleModule()
+    module.params = {'sizes_databases': None}
+
+    get_subset_info(module, Cursor(), 'sizes')
+
+    assert module.fail_msg == ('The sizes subset requires CockroachDB earlier than 23.1, '
+                               'the server version is 23.1.2')
+
+
+def test_get_subset_info_statements(monkeypatch):
+    executed = []
+    rows = [
+        [
+            {'fingerprint': 'SELECT * FROM t WHERE id = _', 'count': 10, 'total_latency': 0.5,
+             'mean_latency': 0.05, 'rows_read': 10.0, 'contention_time': 0.0},
+            {'fingerprint': 'UPDATE t SET v = _ WHERE id = _', 'count': 2, 'total_latency': 0.2,
+             'mean_latency': 0.1, 'rows_read': 2.0, 'contention_time': 0.1},
+        ],
+        [
+            {'name': 'test.t@primary', 'num_contention_events': 3, 'contention_time': 0.1},
+        ],
+    ]
+    monkeypatch.setattr(Cursor, 'execute', lambda self, query, args: executed.append((query, args)))
+    monkeypatch.setattr(Cursor, 'fetchall', lambda self: rows.pop(0))
+    monkeypatch.setattr(AnsibleModule, '__init__', mock__init__)
+    monkeypatch.setattr(AnsibleModule, 'fail_json', mock_fail_json)
+
+    module = AnsibleModule()
+    module.params = {'statements_limit': 2, 'statements_order_by': 'mean_latency'}
+
+    info = get_subset_info(module, Cursor(), 'statements')
+
+    assert list(info['fingerprints']) == ['SELECT * FROM t WHERE id = _', 'UPDATE t SET v = _ WHERE id = _']
+    assert info['fingerprints']['UPDATE t SET v = _ WHERE id = _'] == {
+        'count': 2, 'total_latency': 0.2, 'mean_latency': 0.1, 'rows_read': 2.0, 'contention_time': 0.1,
+    }
+    assert info['contention'] == {'test.t@primary': {'num_contention_events': 3, 'contention_time': 0.1}}
+
+    # Ranking and limiting must be done on the server
+    assert executed[0][0].endswith('ORDER BY mean_latency DESC LIMIT %s')
+    assert executed[0][1] == (2,)
+    assert 'crdb_internal.cluster_contention_events' in executed[1][0]
+    assert executed[1][1] == (2,)
+    assert module.fail_msg is None
+
+
+# Rows returned by the fake connections below for each query
+FAKE_ROWS = {
+    'SELECT VERSION() AS version': [{'version': 'CockroachDB CCL v21.1.6 blah'}],
+    'SHOW DATABASES WITH COMMENT': [{'database_name': 'test', 'comment': 'test'}],
+    'SHOW USERS': [{'username': 'root', 'member_of': ['admin'], 'options': ''}],
+    'SHOW ALL CLUSTER SETTINGS': [{'variable': 'version', 'value': '21.1', 'setting_type': 'm'}],
+    'SHOW REGIONS FROM CLUSTER': [],
+}
+
+
+class FakeCursor():
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = None
+
+    def execute(self, query):
+        self.connection.queries.append(query)
+        self.rows = FAKE_ROWS.get(query)
+
+    def mogrify(self, query, args):
+        return query % tuple("'%s'" % arg for arg in args)
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection():
+    def __init__(self):
+        self.queries = []
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeServer():
+    """Fake CockroachDBServer class"""
+    connections = []
+    fail = False
+
+    def __init__(self, module, timings=None):
+        self.module = module
+        self.connection = None
+        self.conn_params = {'host': 'localhost'}
+        self.timings = timings if timings is not None else Timings()
+
+    def connect(self, conn_params=None, autocommit=False, fail_on_conn=True):
+        if FakeServer.fail:
+            self.module.warn('CockroachDB server is unavailable')
+            return None
+
+        self.connection = FakeConnection()
+        FakeServer.connections.append(self.connection)
+        return self.connection
+
+
+EXPECTED_INFO = {
+    'version': {'raw': 'CockroachDB CCL v21.1.6 blah', 'year': 21, 'release': 1, 'patch': 6},
+    'databases': {'test': {'comment': 'test'}},
+    'users': {'root': {'member_of': ['admin'], 'options': ''}},
+    'settings': {'version': {'value': '21.1', 'setting_type': 'm'}},
+    'regions': {},
+}
+
+
+@pytest.mark.parametrize('parallelism,fail,expected_connections', [
+    (1, False, 1),
+    (3, False, 3),
+    (10, False, 5),
+    (3, True, 1),
+])
+def test_collect_subsets(monkeypatch, parallelism, fail, expected_connections):
+    monkeypatch.setattr(cockroachdb_info, 'CockroachDBServer', FakeServer)
+    monkeypatch.setattr(FakeServer, 'connections', [])
+    monkeypatch.setattr(AnsibleModule, '__init__', mock__init__)
+    monkeypatch.setattr(AnsibleModule, 'fail_json', mock_fail_json)
+    monkeypatch.setattr(AnsibleModule, 'warn', lambda self, msg: None, raising=False)
+
+    module = AnsibleModule()
+    cockroachdb = FakeServer(module)
+    main_connection = cockroachdb.connect()
+    # Make connections of the workers fail if needed
+    monkeypatch.setattr(FakeServer, 'fail', fail)
+
+    subsets = ['version', 'databases', 'users', 'settings', 'regions']
+    info, timings = collect_subsets(module, cockroachdb, subsets, parallelism)
+
+    assert info == EXPECTED_INFO
+    assert list(timings) == subsets
+    assert all(timing >= 0 for timing in timings.values())
+
+    connections = [c for c in FakeServer.connections if c.queries]
+    assert len(FakeServer.connections) == expected_connections
+    assert sum(len(c.queries) for c in connections) == len(subsets)
+    # Connections opened by workers must be closed, the main one must not
+    assert not main_connection.closed
+    assert all(c.closed for c in FakeServer.connections if c is not main_connection)
+    assert module.fail_msg is None
+
+
+def test_collect_subsets_fail(monkeypatch):
+    monkeypatch.setattr(cockroachdb_info, 'CockroachDBServer', FakeServer)
+    monkeypatch.setattr(FakeServer, 'connections', [])
+    monkeypatch.setattr(FakeCursor, 'fetchall',
+                        lambda self: raise_(ValueError('Fake cursor.fetchall() failing.')))
+    monkeypatch.setattr(AnsibleModule, '__init__', mock__init__)
+    monkeypatch.setattr(AnsibleModule, 'fail_json', lambda self, msg: raise_(SystemExit(msg)))
+
+    module = AnsibleModule()
+    cockroachdb = FakeServer(module)
+    cockroachdb.connect()
+
+    # The error raised in a worker thread must make the module fail
+    with pytest.raises(SystemExit) as e:
+        collect_subsets(module, cockroachdb, ['databases', 'users'], 2)
+
+    assert 'Fake cursor.fetchall() failing.' in str(e.value)
+
+
+@pytest.mark.parametrize('value,expected', [
+    ('follower_read_timestamp()', 'BEGIN AS OF SYSTEM TIME follower_read_timestamp()'),
+    ('-10s', "BEGIN AS OF SYSTEM TIME '-10s'"),
+])
+def test_collect_subsets_as_of_system_time(monkeypatch, value, expected):
+    monkeypatch.setattr(FakeServer, 'connections', [])
+    monkeypatch.setattr(AnsibleModule, '__init__', mock__init__)
+    monkeypatch.setattr(AnsibleModule, 'fail_json', mock_fail_json)
+
+    module = AnsibleModule()
+    module.params['as_of_system_time'] = value
+    cockroachdb = FakeServer(module)
+    connection = cockroachdb.connect()
+
+    info, timings = collect_subsets(module, cockroachdb, ['databases', 'settings'])
+
+    assert info == {'databases': EXPECTED_INFO['databases'], 'settings': EXPECTED_INFO['settings']}
+    # Only the subsets read from the system catalog are read as of the system time
+    assert connection.queries == [expected, 'SHOW DATABASES WITH COMMENT', 'COMMIT',
+                                  'SHOW ALL CLUSTER SETTINGS']
+    assert module.fail_msg is None
@@ -3,20 +3,65 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
-from datetime import timedelta
+import hashlib
+import os
+
+from datetime import date, timedelta
 from decimal import Decimal
 
+from uuid import UUID
+
 import pytest
 
+from ansible_collections.community.cockroachdb.plugins.modules import cockroachdb_query
 from ansible_collections.community.cockroachdb.plugins.modules.cockroachdb_query import (
+    commit_transaction,
+    convert_rows,
     convert_to_supported,
+    csv_value,
     execute,
+    execute_args_list,
+    execute_batches,
+    execute_queries,
+    explain_query,
+    fetch_from_cursor_columnar,
     fetch_from_cursor_dict,
     fetch_from_cursor_tuple,
     get_args,
+    get_columns,
+    get_converters,
+    get_values_template,
+    iter_batches,
+    iter_cursor,
+    json_default,
+    parse_duration,
+    parse_explain,
+    parse_size,
+    PreparedStatements,
+    read_rows_file,
+    render_query,
+    to_prepared_query,
+    write_rows_to_file,
 )
 
 
+class ChunkCursor():
+    """Fake cursor class supporting fetchmany()"""
+    def __init__(self, sequence):
+        self.sequence = list(sequence)
+        self.fetch_calls = []
+
+    def fetchmany(self, size):
+        self.fetch_calls.append(size)
+        chunk = self.sequence[:size]
+        self.sequence = self.sequence[size:]
+        return chunk
+
+    def __iter__(self):
+        for item in self.sequence:
+            yield item
+
+
 @pytest.mark.parametrize('positional_args,named_args,expected', [
     (('not_empty'), None, ('not_empty')),
     (None, ('not_empty'), ('not_empty')),
@@ -30,6 +75,24 @@ def test_get_args(positional_args, named_args, expected):
     assert get_args(positional_args, named_args) == expected
 
 
+@pytest.mark.parametrize('rows,fetch_size,max_rows,expected,expected_calls', [
+    (range(5), None, None, [0, 1, 2, 3, 4], []),
+    (range(5), None, 2, [0, 1], []),
+    (range(5), 2, None, [0, 1, 2, 3, 4], [2, 2, 2, 2]),
+    (range(5), 2, 3, [0, 1, 2], [2, 1]),
+    (range(4), 2, None, [0, 1, 2, 3], [2, 2, 2]),
+    (range(5), 10, 0, [], []),
+    ([], 3, None, [], [3]),
+])
+def test_iter_cursor(rows, fetch_size, max_rows, expected, expected_calls):
+    # When fetch_size is passed, the function must fetch rows
+    # in chunks never asking for more than max_rows in total
+    cursor = ChunkCursor(rows)
+
+    assert list(iter_cursor(cursor, fetch_size, max_rows)) == expected
+    assert cursor.fetch_calls == expected_calls
+
+
 @pytest.mark.parametrize('input_, expected', [
     (timedelta(0, 43200), '12:00:00'),
     (Decimal('1.01'), 1.01),
@@ -113,12 +176,12 @@ def test_execute(sequence, expected, fetch_func):
             self.query = None
             self.args = None
 
-        def execute(self, query, args):
+        def execute(self, query, args=None):
             self.query = query
             self.args = args
 
         def mogrify(self, query, args):
-            return query, args
+            return (query % args).encode('utf-8')
 
         def __iter__(self):
             for item in self.sequence:
@@ -126,6 +189,8 @@ def test_execute(sequence, expected, fetch_func):
 
     class Module():
         """Fake module class"""
+        params = {'return_query': True, 'query_max_length': 0}
+
         def fail_json(self, msg=None):
             # For debugging. Also comment out PsycopgProgrammingError
             # exception in the module's file
@@ -133,7 +198,7 @@ def test_execute(sequence, expected, fetch_func):
 
     module = Module()
     cursor = Cursor(sequence)
-    query = 'SELECT 1'
+    query = 'SELECT %s, %s, %s'
     args = (1, 2, 3)
 
     # Invoke the function
@@ -144,6 +209,601 @@ def test_execute(sequence, expected, fetch_func):
     assert statusmessage == 'blahblah'
     assert rowcount == len(sequence)
     assert res == expected
-    assert cursor.query == 'SELECT 1'
-    assert cursor.args == (1, 2, 3)
-    assert query == ('SELECT 1', (1, 2, 3))
+    # The arguments are bound once by mogrify
+    assert cursor.query == b'SELECT 1, 2, 3'
+    assert cursor.args is None
+    assert query == 'SELECT 1, 2, 3'
+
+
+@pytest.mark.parametrize('input_, expected', [
+    (Decimal('1.01'), 1.01),
+    (timedelta(0, 43200), '12:00:00'),
+    (date(2021, 7, 20), '2021-07-20'),
+    (memoryview(b'abc'), '\\x616263'),
+    (b'abc', '\\x616263'),
+])
+def test_json_default(input_, expected):
+    assert json_default(input_) == expected
+
+
+@pytest.mark.parametrize('input_, expected', [
+    (True, 'true'),
+    (False, 'false'),
+    (memoryview(b'abc'), '\\x616263'),
+    ({'a': [1, None]}, '{"a": [1, null]}'),
+    ([Decimal('1.5'), memoryview(b'a')], '[1.5, "\\\\x61"]'),
+    (1, 1),
+    (None, None),
+])
+def test_csv_value(input_, expected):
+    assert csv_value(input_) == expected
+
+
+class FileModule():
+    """Fake module class"""
+    params = {'return_query': True, 'query_max_length': 0}
+
+    def atomic_move(self, src, dest):
+        os.rename(src, dest)
+
+    def fail_json(self, msg=None):
+        raise AssertionError(msg)
+
+
+@pytest.mark.parametrize('output_format,rows_type,expected', [
+    ('csv', 'dict', 'id,val\r\n1,1.01\r\n2,\r\n'),
+    ('jsonl', 'dict', '{"id": 1, "val": 1.01}\n{"id": 2, "val": null}\n'),
+    ('jsonl', 'tuple', '[1, 1.01]\n[2, null]\n'),
+])
+def test_write_rows_to_file(tmpdir, output_format, rows_type, expected):
+    path = str(tmpdir.join('out'))
+    rows = iter([(1, Decimal('1.01')), (2, None)])
+
+    res = write_rows_to_file(FileModule(), rows, path, output_format,
+                             ['id', 'val'], rows_type)
+
+    with open(path, 'rb') as f:
+        content = f.read()
+
+    assert content.decode('utf-8') == expected
+    assert res == {
+        'path': path,
+        'rows': 2,
+        'size': len(content),
+        'checksum': hashlib.sha1(content).hexdigest(),
+    }
+    # Temporary files must not be left in the destination directory
+    assert os.listdir(str(tmpdir)) == ['out']
+
+
+# cursor.description consists of sequences whose first two
+# elements are a column name and a column type OID
+DESCRIPTION = [
+    ('id', 20),  # int8
+    ('dec', 1700),  # numeric
+    ('ti', 1186),  # interval
+    ('data', 17),  # bytea
+    ('uid', 2950),  # uuid
+    ('decs', 1231),  # numeric[]
+    ('story', 25),  # text
+]
+
+ROW = (
+    1,
+    Decimal('1.01'),
+    timedelta(0, 43200),
+    memoryview(b'abc'),
+    UUID('a7d1c6b4-1a32-4d3a-9f6c-7a1f1b6d1e01'),
+    [[Decimal('1.5'), None], [Decimal('2'), Decimal('3')]],
+    'hello',
+)
+
+CONVERTED_ROW = (
+    1,
+    1.01,
+    '12:00:00',
+    '\\x616263',
+    'a7d1c6b4-1a32-4d3a-9f6c-7a1f1b6d1e01',
+    [[1.5, None], [2.0, 3.0]],
+    'hello',
+)
+
+
+def test_get_converters():
+    # Only columns of types needing conversion must be in the plan
+    assert [i for i, dummy in get_converters(DESCRIPTION)] == [1, 2, 3, 4, 5]
+    assert get_converters([('id', 20), ('story', 25)]) == []
+
+
+def test_convert_rows():
+    rows = [ROW, (2, None, None, None, None, None, None)]
+
+    assert list(convert_rows(rows, get_converters(DESCRIPTION))) == [
+        list(CONVERTED_ROW),
+        [2, None, None, None, None, None, None],
+    ]
+
+    # Nothing to convert, the rows must be returned as is
+    assert convert_rows(rows, []) is rows
+
+
+def test_fetch_from_cursor_tuple_description():
+    assert fetch_from_cursor_tuple([ROW], DESCRIPTION) == [CONVERTED_ROW]
+
+
+def test_fetch_from_cursor_dict_description():
+    names = [column[0] for column in DESCRIPTION]
+
+    assert fetch_from_cursor_dict([ROW], DESCRIPTION) == [dict(zip(names, CONVERTED_ROW))]
+
+
+@pytest.mark.parametrize('rows,description,expected', [
+    ([ROW], DESCRIPTION, [list(CONVERTED_ROW)]),
+    ([(1, 'a'), (2, None)], [('id', 20), ('story', 25)], [[1, 'a'], [2, None]]),
+    ([(1, Decimal('1.01'))], None, [[1, 1.01]]),
+])
+def test_fetch_from_cursor_columnar(rows, description, expected):
+    assert fetch_from_cursor_columnar(rows, description) == expected
+
+
+def test_get_columns():
+    assert get_columns([('id', 20), ('balance', 1700), ('point', 600)]) == [
+        {'name': 'id', 'type': 'int8'},
+        {'name': 'balance', 'type': 'numeric'},
+        {'name': 'point', 'type': None},
+    ]
+    assert get_columns(None) == []
+
+
+@pytest.mark.parametrize('rows,batch_size,expected', [
+    ([], 2, []),
+    ([1, 2, 3], 2, [[1, 2], [3]]),
+    ([1, 2, 3, 4], 2, [[1, 2], [3, 4]]),
+    ([1, 2, 3], 5, [[1, 2, 3]]),
+])
+def test_iter_batches(rows, batch_size, expected):
+    assert list(iter_batches(iter(rows), batch_size)) == expected
+
+
+@pytest.mark.parametrize('row,expected', [
+    ([1, 'hello'], None),
+    ((1, 'hello'), None),
+    ({'id': 1, 'story': 'hello'}, '(%(id)s, %(story)s)'),
+])
+def test_get_values_template(row, expected):
+    assert get_values_template(row) == expected
+
+
+@pytest.mark.parametrize('content,rows_format,null,expected', [
+    ('[1, "hello"]\n\n{"id": 2, "story": "bye"}\n', 'jsonl', None, [[1, 'hello'], {'id': 2, 'story': 'bye'}]),
+    ('id,story\r\n1,hello\r\n2,bye\r\n', 'csv', None, [{'id': '1', 'story': 'hello'}, {'id': '2', 'story': 'bye'}]),
+    # Without a NULL marker, empty fields are empty strings
+    ('id,story\r\n1,\r\n2,NULL\r\n', 'csv', None, [{'id': '1', 'story': ''}, {'id': '2', 'story': 'NULL'}]),
+    ('id,story\r\n1,\r\n2,NULL\r\n', 'csv', '', [{'id': '1', 'story': None}, {'id': '2', 'story': 'NULL'}]),
+    ('id,story\r\n1,\r\n2,NULL\r\n', 'csv', 'NULL', [{'id': '1', 'story': ''}, {'id': '2', 'story': None}]),
+])
+def test_read_rows_file(tmpdir, content, rows_format, null, expected):
+    path = tmpdir.join('rows')
+    path.write(content)
+
+    assert list(read_rows_file(FileModule(), str(path), rows_format, null)) == expected
+
+
+def test_execute_batches(monkeypatch):
+    class Cursor():
+        """Fake cursor class"""
+        def __init__(self):
+            self.description = None
+            self.statusmessage = None
+            self.rowcount = -1
+
+    executed = []
+
+    def fake_execute_values(cursor, query, batch, template=None, page_size=100):
+        executed.append((query, batch, template, page_size))
+        cursor.statusmessage = 'INSERT 0 %s' % len(batch)
+        cursor.rowcount = len(batch)
+
+    monkeypatch.setattr(cockroachdb_query, 'execute_values', fake_execute_values, raising=False)
+
+    query = 'INSERT INTO acme (id, story) VALUES %s'
+    rows = [[1, 'a'], [2, 'b'], {'id': 3, 'story': 'c'}]
+
+    statusmessage, rowcount, query_result, batches = execute_batches(
+        FileModule(), Cursor(), query, rows, 2, fetch_from_cursor_tuple)
+
+    assert executed == [
+        (query, [[1, 'a'], [2, 'b']], None, 2),
+        (query, [{'id': 3, 'story': 'c'}], '(%(id)s, %(story)s)', 1),
+    ]
+    assert statusmessage == 'INSERT 0 1'
+    assert rowcount == 3
+    assert query_result == []
+    assert [(b['rows'], b['rowcount']) for b in batches] == [(2, 2), (1, 1)]
+    assert all(b['duration_ms'] >= 0 for b in batches)
+
+
+class QueriesCursor():
+    """Fake cursor class failing on queries containing FAIL"""
+    def __init__(self):
+        self.executed = []
+        self.description = None
+        self.statusmessage = None
+        self.rowcount = -1
+
+    def mogrify(self, query, args):
+        return query if args is None else query % tuple(args)
+
+    def execute(self, query, args=None):
+        self.executed.append(query)
+        if 'FAIL' in query:
+            raise ValueError('fake error')
+
+        self.statusmessage = query.split()[0]
+        self.rowcount = 1
+        self.description = [('?column?', 20)] if query.startswith('SELECT') else None
+
+    def __iter__(self):
+        yield (1,)
+
+
+QUERIES = [
+    {'query': 'CREATE TABLE t', 'positional_args': None, 'named_args': None},
+    {'query': 'FAIL', 'positional_args': None, 'named_args': None},
+    {'query': 'SELECT %s', 'positional_args': [1], 'named_args': None},
+]
+
+
+def test_execute_queries_stop_on_error():
+    cursor = QueriesCursor()
+
+    results = execute_queries(FileModule(), cursor, QUERIES, fetch_from_cursor_tuple)
+
+    assert [r['query'] for r in results] == ['CREATE TABLE t', 'FAIL']
+    assert results[0]['statusmessage'] == 'CREATE'
+    assert 'error' not in results[0]
+    assert results[1]['error'] == 'fake error'
+    assert cursor.executed == ['CREATE TABLE t', 'FAIL']
+
+
+def test_execute_queries_columns():
+    results = execute_queries(FileModule(), QueriesCursor(), [QUERIES[0], QUERIES[2]],
+                              fetch_from_cursor_columnar, columns=True)
+
+    assert [r['columns'] for r in results] == [[], [{'name': '?column?', 'type': 'int8'}]]
+    assert results[1]['query_result'] == [[1]]
+
+
+def test_execute_queries_continue_on_error():
+    cursor = QueriesCursor()
+
+    results = execute_queries(FileModule(), cursor, QUERIES, fetch_from_cursor_tuple,
+                              continue_on_error=True, transaction=True)
+
+    assert [r['query'] for r in results] == ['CREATE TABLE t', 'FAIL', 'SELECT 1']
+    assert [r.get('error') for r in results] == [None, 'fake error', None]
+    assert results[2]['query_result'] == [(1,)]
+    assert all(r['duration_ms'] >= 0 for r in results)
+    assert cursor.executed == [
+        'SAVEPOINT ansible_cockroachdb_query',
+        'CREATE TABLE t',
+        'RELEASE SAVEPOINT ansible_cockroachdb_query',
+        'SAVEPOINT ansible_cockroachdb_query',
+        'FAIL',
+        'ROLLBACK TO SAVEPOINT ansible_cockroachdb_query',
+        'SAVEPOINT ansible_cockroachdb_query',
+        'SELECT 1',
+        'RELEASE SAVEPOINT ansible_cockroachdb_query',
+    ]
+
+
+class RetryError(Exception):
+    """Fake psycopg2 error class"""
+    pgcode = '40001'
+
+
+def test_execute_queries_retry_error():
+    # In a transaction, retry errors must be raised
+    # for the whole transaction to be retried
+    class Cursor(QueriesCursor):
+        def execute(self, query, args=None):
+            if query == 'FAIL':
+                raise RetryError('restart transaction')
+
+            super(Cursor, self).execute(query, args)
+
+    with pytest.raises(RetryError):
+        execute_queries(FileModule(), Cursor(), QUERIES, fetch_from_cursor_tuple,
+                        continue_on_error=True, transaction=True)
+
+    results = execute_queries(FileModule(), Cursor(), QUERIES, fetch_from_cursor_tuple,
+                              continue_on_error=True)
+    assert results[1]['error'] == 'restart transaction'
+
+
+class CommitConnection():
+    """Fake connection class failing to commit"""
+    def __init__(self, error):
+        self.error = error
+
+    def commit(self):
+        raise self.error
+
+
+class CommitModule():
+    """Fake module class"""
+    def fail_json(self, **kwargs):
+        e = AssertionError(kwargs['msg'])
+        e.kwargs = kwargs
+        raise e
+
+
+def test_commit_transaction_error():
+    with pytest.raises(AssertionError) as e:
+        commit_transaction(CommitModule(), CommitConnection(Exception('fake error')), 2)
+
+    assert e.value.kwargs == {'msg': 'Cannot commit transaction: fake error', 'retries': 2}
+
+
+def test_commit_transaction_retry_error():
+    # Retry errors must be raised for the whole transaction to be retried
+    with pytest.raises(RetryError):
+        commit_transaction(CommitModule(), CommitConnection(RetryError('restart transaction')), 0)
+
+
+@pytest.mark.parametrize('val,expected', [
+    ('12ms', 12),
+    (u'345\u00b5s', 0.345),
+    ('1m2.5s', 62500),
+    ('100ns', 0.0001),
+    ('unknown', None),
+])
+def test_parse_duration(val, expected):
+    assert parse_duration(val) == expected
+
+
+@pytest.mark.parametrize('val,expected', [
+    ('24 B', 24),
+    ('10 KiB', 10240),
+    ('1.5 MiB', 1572864),
+    ('unknown', None),
+])
+def test_parse_size(val, expected):
+    assert parse_size(val) == expected
+
+
+# Output of EXPLAIN ANALYZE (DISTSQL) of CockroachDB 21.1
+EXPLAIN_ANALYZE_21_1 = [
+    u'planning time: 345\u00b5s',
+    u'execution time: 2.1ms',
+    u'distribution: full',
+    u'vectorized: true',
+    u'rows read from KV: 1,000 (41 KiB)',
+    u'cumulative time spent in KV: 1.5ms',
+    u'maximum memory usage: 20 KiB',
+    u'network usage: 1.5 KiB (4 messages)',
+    u'',
+    u'\u2022 group',
+    u'\u2502 nodes: n1, n2',
+    u'\u2502 actual row count: 3',
+    u'\u2502',
+    u'\u2514\u2500\u2500 \u2022 scan',
+    u'      nodes: n1',
+    u'      actual row count: 1,000',
+    u'      KV rows read: 1,000',
+    u'      KV bytes read: 41 KiB',
+    u'      estimated row count: 1,000 (100% of the table; stats collected 2 minutes ago)',
+    u'      table: orders@primary',
+    u'      spans: FULL SCAN',
+    u'Diagram: https://cockroachdb.github.io/distsqlplan/decode.html#eJy',
+]
+
+# Output of EXPLAIN ANALYZE of CockroachDB 23.1
+EXPLAIN_ANALYZE_23_1 = [
+    u'planning time: 1ms',
+    u'execution time: 3ms',
+    u'distribution: local',
+    u'vectorized: true',
+    u'rows decoded from KV: 1 (8 B, 1 gRPC calls)',
+    u'cumulative time spent in KV: 1ms',
+    u'maximum memory usage: 10 KiB',
+    u'network usage: 0 B (0 messages)',
+    u'regions: us-east1',
+    u'',
+    u'\u2022 scan',
+    u'  nodes: n1',
+    u'  regions: us-east1',
+    u'  actual row count: 1',
+    u'  table: orders@orders_pkey',
+    u'  spans: [/1 - /1]',
+]
+
+# Output of EXPLAIN
+EXPLAIN_PLAN = [
+    u'distribution: local',
+    u'vectorized: true',
+    u'',
+    u'\u2022 index join',
+    u'\u2502 table: orders@orders_pkey',
+    u'\u2502',
+    u'\u2514\u2500\u2500 \u2022 scan',
+    u'      table: orders@orders_region_idx',
+    u'      spans: FULL SCAN (SOFT LIMIT)',
+]
+
+
+def test_parse_explain_analyze_21_1():
+    explain = parse_explain(EXPLAIN_ANALYZE_21_1)
+
+    assert explain['plan'] == EXPLAIN_ANALYZE_21_1[:-1]
+    assert explain['diagram_urls'] == ['https://cockroachdb.github.io/distsqlplan/decode.html#eJy']
+    assert explain['distribution'] == 'full'
+    assert explain['vectorized'] is True
+    assert explain['planning_time_ms'] == 0.345
+    assert explain['execution_time_ms'] == 2.1
+    assert explain['total_latency_ms'] == 2.445
+    # Statistics of operators must not override the ones of the statement
+    assert explain['rows_read'] == 1000
+    assert explain['bytes_read'] == 41984
+    assert explain['network_bytes'] == 1536
+    assert explain['network_messages'] == 4
+    assert explain['max_memory_bytes'] == 20480
+    assert explain['full_scans'] == ['orders@primary']
+    assert explain['nodes'] == [1, 2]
+    assert explain['regions'] == []
+
+
+def test_parse_explain_analyze_23_1():
+    explain = parse_explain(EXPLAIN_ANALYZE_23_1)
+
+    assert explain['rows_read'] == 1
+    assert explain['bytes_read'] == 8
+    assert explain['network_bytes'] == 0
+    assert explain['full_scans'] == []
+    assert explain['nodes'] == [1]
+    assert explain['regions'] == ['us-east1']
+
+
+def test_parse_explain_plan():
+    explain = parse_explain(EXPLAIN_PLAN)
+
+    assert explain['distribution'] == 'local'
+    assert explain['full_scans'] == ['orders@orders_region_idx']
+    assert explain['planning_time_ms'] is None
+    assert explain['total_latency_ms'] is None
+    assert explain['rows_read'] is None
+    assert explain['nodes'] == []
+
+
+def test_explain_query():
+    class Cursor(QueriesCursor):
+        def fetchall(self):
+            return [(line,) for line in EXPLAIN_PLAN]
+
+    cursor = Cursor()
+    executed_query, explain = explain_query(FileModule(), cursor, 'SELECT %s', [1], 'analyze_distsql')
+
+    assert executed_query == 'EXPLAIN ANALYZE (DISTSQL) SELECT 1'
+    assert cursor.executed == ['EXPLAIN ANALYZE (DISTSQL) SELECT 1']
+    assert explain['mode'] == 'analyze_distsql'
+    assert explain['full_scans'] == ['orders@orders_region_idx']
+
+
+@pytest.mark.parametrize('query,return_query,max_length,expected', [
+    (b'SELECT 1', True, 4096, 'SELECT 1'),
+    (b'SELECT 1', False, 4096, None),
+    (b'SELECT 12345', True, 8, 'SELECT 1...'),
+    (b'SELECT 12345', True, 0, 'SELECT 12345'),
+    (u"SELECT '\u00e9\u00e9\u00e9'".encode('utf-8'), True, 10, u"SELECT '\u00e9\u00e9..."),
+    (u"SELECT '\u00e9'".encode('utf-8'), True, 10, u"SELECT '\u00e9'"),
+    ('INSERT INTO t VALUES %s', True, 6, 'INSERT...'),
+])
+def test_render_query(query, return_query, max_length, expected):
+    module = FileModule()
+    module.params = {'return_query': return_query, 'query_max_length': max_length}
+
+    assert render_query(module, query) == expected
+
+
+@pytest.mark.parametrize('query,expected', [
+    ('SELECT 1', ('SELECT 1', None, 0)),
+    ('SELECT %s, %s', ('SELECT $1, $2', None, 2)),
+    ("SELECT %(a)s, %(b)s, %(a)s LIKE 'x%%'", ("SELECT $1, $2, $1 LIKE 'x%'", ['a', 'b'], 2)),
+])
+def test_to_prepared_query(query, expected):
+    assert to_prepared_query(query) == expected
+
+
+def test_to_prepared_query_mixed_placeholders():
+    with pytest.raises(ValueError):
+        to_prepared_query('SELECT %s, %(a)s')
+
+
+class PrepareCursor(QueriesCursor):
+    """Fake cursor class executing prepared statements"""
+    def mogrify(self, query, args):
+        return query % tuple(repr(arg) for arg in args)
+
+    def execute(self, query, args=None):
+        self.executed.append(query)
+        self.statusmessage = 'SELECT 1'
+        self.rowcount = 1
+        self.description = [('?column?', 20)] if query.startswith('EXECUTE') else None
+
+    def fetchall(self):
+        return [(1,)]
+
+
+def test_prepared_statements_lru(monkeypatch):
+    monkeypatch.setattr(PreparedStatements, 'counter', 0)
+    cursor = PrepareCursor()
+    statements = PreparedStatements(cursor, size=2)
+
+    assert statements.prepare('SELECT %s') == ('ansible_cockroachdb_query_1', None, 1, True)
+    assert statements.prepare(' SELECT %s; ') == ('ansible_cockroachdb_query_1', None, 1, False)
+    assert statements.prepare('SELECT %(a)s')[3] is True
+    # The first statement was used more recently than the second one
+    assert statements.prepare('SELECT %s')[3] is False
+    assert statements.prepare('SELECT 3')[3] is True
+
+    assert cursor.executed == [
+        'PREPARE ansible_cockroachdb_query_1 AS SELECT $1',
+        'PREPARE ansible_cockroachdb_query_2 AS SELECT $1',
+        'PREPARE ansible_cockroachdb_query_3 AS SELECT 3',
+        'DEALLOCATE ansible_cockroachdb_query_2',
+    ]
+
+
+def test_prepared_statements_execute():
+    cursor = PrepareCursor()
+    statements = PreparedStatements(cursor)
+
+    statements.execute('s', ['b', 'a'], 2, {'a': 1, 'b': 2, 'c': 3})
+    statements.execute('s', None, 0, [])
+    assert cursor.executed == ['EXECUTE s (2, 1)', 'EXECUTE s']
+
+    with pytest.raises(ValueError, match='missing named arguments: b'):
+        statements.execute('s', ['a', 'b'], 2, {'a': 1})
+
+    with pytest.raises(ValueError, match='expected a list of 1 positional arguments'):
+        statements.execute('s', None, 1, [1, 2])
+
+
+def test_execute_args_list(monkeypatch):
+    monkeypatch.setattr(PreparedStatements, 'counter', 0)
+    cursor = PrepareCursor()
+    statements = PreparedStatements(cursor)
+
+    result = execute_args_list(FileModule(), cursor, statements, 'SELECT %s',
+                               [[1], [2], [3]], fetch_from_cursor_tuple)
+
+    assert cursor.executed == [
+        'PREPARE ansible_cockroachdb_query_1 AS SELECT $1',
+        'EXECUTE ansible_cockroachdb_query_1 (1)',
+        'EXECUTE ansible_cockroachdb_query_1 (2)',
+        'EXECUTE ansible_cockroachdb_query_1 (3)',
+    ]
+    assert result['query'] == 'SELECT %s'
+    assert result['rowcount'] == 3
+    assert result['query_result'] == [(1,), (1,), (1,)]
+    assert [e['statusmessage'] for e in result['executions']] == ['SELECT 1'] * 3
+
+    stats = result['execution_stats']
+    assert stats['prepared'] is True
+    assert stats['count'] == 3
+    assert stats['min_ms'] <= stats['mean_ms'] <= stats['max_ms'] <= stats['total_ms']
+
+
+def test_execute_queries_args_list():
+    cursor = PrepareCursor()
+    queries = [
+        {'query': 'SELECT %s', 'positional_args': None, 'named_args': None, 'args_list': [[1], [2]]},
+        {'query': 'SELECT %s', 'positional_args': None, 'named_args': None, 'args_list': [[3]]},
+    ]
+
+    results = execute_queries(FileModule(), cursor, queries, fetch_from_cursor_tuple)
+
+    # The statement is prepared once for both queries
+    assert [q.split()[0] for q in cursor.executed] == ['PREPARE', 'EXECUTE', 'EXECUTE', 'EXECUTE']
+    assert [r['execution_stats']['prepared'] for r in results] == [True, False]
+    assert [len(r['executions']) for r in results] == [2, 1]